@@ -0,0 +1,245 @@
+import os
+import sys
+import time
+import uuid
+import shutil
+import tarfile
+import zipfile
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import job_queue
+import story_parser
+import search_index
+import stats_cache
+import story_manager
+import story_watcher
+
+# CONFIG
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+UPLOAD_DIR = os.path.join(DATA_DIR, "imports")  # uploaded archives while their job runs
+STORY_DIR = story_manager.STORY_DIR
+
+ARCHIVE_EXTENSIONS = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+STORY_EXTENSIONS = (".txt", ".json")
+# Entries bigger than this are skipped; also caps what a lying zip header can make us write
+MAX_MEMBER_BYTES = 64 * 1024 * 1024
+IMPORT_WORKERS = int(os.environ.get("STORYBOX_IMPORT_WORKERS", "0")) or os.cpu_count() or 1
+REPORT_LIMIT = 200          # skipped/failed entries listed per job
+PROGRESS_INTERVAL = 0.5     # seconds between progress reports to the job queue
+
+os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+# ---------------------------------------------------------
+# PROGRESS
+# ---------------------------------------------------------
+# An import's progress dict, reported to the job queue (when run as a job)
+# at most every PROGRESS_INTERVAL seconds and on every status change.
+def _new_report(archive_name):
+    return {
+        "archive": archive_name, "status": "extracting",
+        "extracted": 0, "total": 0, "processed": 0, "imported": 0,
+        "skipped": [], "errors": [], "error": None, "updated_at": 0,
+    }
+
+def _set(report, **fields):
+    report.update(fields)
+    now = time.time()
+    if "status" in fields or now - report["updated_at"] >= PROGRESS_INTERVAL:
+        report["updated_at"] = now
+        job_queue.set_progress(report)
+
+def _note(report, key, path, reason):
+    if len(report[key]) < REPORT_LIMIT: report[key].append({"path": path, "reason": reason})
+
+# ---------------------------------------------------------
+# ARCHIVES
+# ---------------------------------------------------------
+def _members(archive_path):
+    """Yields (member path, declared size, opener) for each regular file of a zip or tar."""
+    if zipfile.is_zipfile(archive_path):
+        with zipfile.ZipFile(archive_path) as zf:
+            for info in zf.infolist():
+                if not info.is_dir(): yield info.filename, info.file_size, lambda info=info: zf.open(info)
+    elif tarfile.is_tarfile(archive_path):
+        with tarfile.open(archive_path) as tf:
+            for member in tf:
+                if member.isfile(): yield member.name, member.size, lambda member=member: tf.extractfile(member)
+    else: raise ValueError("Not a zip or tar archive")
+
+def _split_member(member_path):
+    """'./Camp/sub/log.txt' -> ('Camp/sub', 'log.txt')."""
+    parts = [p for p in member_path.replace("\\", "/").split("/") if p not in ("", ".")]
+    if not parts: return "", ""
+    return "/".join(parts[:-1]), parts[-1]
+
+def _skip_reason(folder, name, size):
+    if any(p.startswith(".") or p == "__MACOSX" for p in folder.split("/") + [name] if p): return "hidden file"
+    if not name.lower().endswith(STORY_EXTENSIONS): return "not a .txt or .json file"
+    if size > MAX_MEMBER_BYTES: return "too large"
+    return None
+
+def _copy_limited(src, dest):
+    copied = 0
+    while True:
+        chunk = src.read(1024 * 1024)
+        if not chunk: return
+        copied += len(chunk)
+        if copied > MAX_MEMBER_BYTES: raise ValueError("too large")
+        dest.write(chunk)
+
+# ---------------------------------------------------------
+# CAMPAIGN MAPPING
+# ---------------------------------------------------------
+def parse_campaign_map(lines):
+    """'folder = Campaign' lines (one string or a list) -> {folder: campaign}."""
+    if isinstance(lines, str): lines = lines.splitlines()
+    mapping = {}
+    for line in lines or []:
+        folder, sep, campaign = line.partition("=")
+        folder, campaign = folder.strip().strip("/"), campaign.strip()
+        if sep and folder and campaign: mapping[folder] = campaign
+    return mapping
+
+def _campaign_for(folder, campaign_map, default_campaign):
+    # The deepest mapped folder wins, so 'Logs = A' and 'Logs/old = B' both work
+    while folder:
+        if folder in campaign_map: return campaign_map[folder]
+        folder = folder.rpartition("/")[0]
+    return default_campaign
+
+def _campaign_dir(campaign):
+    """Folder under STORY_DIR for a campaign, created if needed; "" for Unsorted."""
+    if not campaign or campaign == "Unsorted": return ""
+    return story_manager.create_campaign(campaign)
+
+# ---------------------------------------------------------
+# IMPORT
+# ---------------------------------------------------------
+def _extract(archive_path, campaign_map, default_campaign, report, written):
+    """
+    Writes every story of the archive into STORY_DIR. Returns [(rel_path,
+    title)]; every path written to is added to written.
+    """
+    stories = []
+    campaign_dirs = {}
+    claimed = {}  # campaign dir -> filenames taken by this import
+    for member_path, size, opener in _members(archive_path):
+        folder, name = _split_member(member_path)
+        reason = _skip_reason(folder, name, size)
+        if reason:
+            _note(report, "skipped", member_path, reason)
+            continue
+        campaign = _campaign_for(folder, campaign_map, default_campaign)
+        if campaign not in campaign_dirs: campaign_dirs[campaign] = _campaign_dir(campaign)
+        camp_dir = campaign_dirs[campaign]
+        directory = os.path.join(STORY_DIR, camp_dir)
+        title = os.path.splitext(name)[0]
+        taken = claimed.setdefault(camp_dir, set())
+        filename = story_manager.unique_story_name(directory, story_manager.sanitize_filename(title), taken)
+        taken.add(filename)
+        full_path = os.path.join(directory, filename)
+        rel_path = os.path.join(camp_dir, filename) if camp_dir else filename
+        # The import indexes its stories itself; the watcher only records them
+        story_watcher.claim([rel_path])
+        written.append(rel_path)
+        try:
+            with opener() as src, open(full_path, "wb") as dest: _copy_limited(src, dest)
+        except Exception as e:
+            try: os.remove(full_path)
+            except OSError: pass
+            _note(report, "skipped", member_path, str(e))
+            continue
+        stories.append((rel_path, title))
+        _set(report, extracted=len(stories))
+    return stories
+
+def _prepare_story(full_path):
+    """Runs in a pool process: (mtime, size, stats, speakers, search postings) of one story."""
+    st = os.stat(full_path)
+    speakers = {}
+    stats = story_parser.get_file_stats(full_path, speakers)
+    return st.st_mtime, st.st_size, stats, speakers, search_index.scan_file(full_path)
+
+def _prepare_all(stories, report, workers):
+    prepared = {}
+    if not stories: return prepared
+    workers = max(1, min(workers or IMPORT_WORKERS, len(stories)))
+    # spawn, not fork: the server has threads (and their locks) a forked child would inherit
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        futures = {pool.submit(_prepare_story, os.path.join(STORY_DIR, rel_path)): rel_path for rel_path, _ in stories}
+        for future in as_completed(futures):
+            rel_path = futures[future]
+            # The story is imported either way; stats and search catch up lazily
+            try: prepared[rel_path] = future.result()
+            except Exception as e: _note(report, "errors", rel_path, str(e))
+            _set(report, processed=report["processed"] + 1)
+    return prepared
+
+def run_import(archive_path, campaign_map=None, default_campaign="Unsorted", workers=None):
+    """
+    Imports every .txt/.json log of a zip or tar archive. Stories go to the
+    campaign their folder maps to (default_campaign otherwise); stats and
+    search postings are computed on a process pool, and metadata, stats and
+    the search index are each written once at the end. Returns the final
+    progress report.
+    """
+    report = _new_report(os.path.basename(archive_path))
+    written = []
+    try:
+        _set(report, status="extracting")
+        stories = _extract(archive_path, campaign_map or {}, default_campaign, report, written)
+        _set(report, status="processing", total=len(stories))
+        prepared = _prepare_all(stories, report, workers)
+        _set(report, status="committing")
+        story_manager.init_story_meta_many(dict(stories))
+        stats_cache.store_many({p: ((size, mtime), stats, speakers) for p, (mtime, size, stats, speakers, _) in prepared.items()})
+        search_index.add_scanned({p: (mtime, size, postings) for p, (mtime, size, _, _, postings) in prepared.items()})
+        _set(report, status="done", imported=len(stories))
+    except Exception as e:
+        _set(report, status="failed", error=str(e))
+    finally: story_watcher.release(written)
+    return report
+
+def save_upload(file_object, original_filename):
+    """Copies an uploaded archive to UPLOAD_DIR, keeping its extension(s)."""
+    lower = original_filename.lower()
+    ext = next((e for e in sorted(ARCHIVE_EXTENSIONS, key=len, reverse=True) if lower.endswith(e)), "")
+    path = os.path.join(UPLOAD_DIR, uuid.uuid4().hex + ext)
+    with open(path, "wb") as dest: shutil.copyfileobj(file_object, dest)
+    return path
+
+def _import_job(archive_path, campaign_map, default_campaign, remove_archive):
+    try: report = run_import(archive_path, campaign_map, default_campaign)
+    finally:
+        if remove_archive:
+            try: os.remove(archive_path)
+            except OSError: pass
+    if report["status"] == "failed": raise RuntimeError(report["error"])
+
+job_queue.register("bulk_import", _import_job)
+
+def start_import_job(archive_path, campaign_map=None, default_campaign="Unsorted", remove_archive=False):
+    """Queues run_import(). Returns the job id; progress is on the job (job_queue.get_job)."""
+    # Not retried: a second run would import the already extracted files again
+    return job_queue.enqueue("bulk_import", {
+        "archive_path": archive_path, "campaign_map": campaign_map or {},
+        "default_campaign": default_campaign, "remove_archive": remove_archive,
+    }, max_attempts=1)
+
+if __name__ == "__main__":
+    # python bulk_import.py logs.zip --campaign Imported --map "Discord/2023 = Season One"
+    parser = argparse.ArgumentParser(description="Import a zip/tar archive of story logs.")
+    parser.add_argument("archive")
+    parser.add_argument("--campaign", default="Unsorted", help="campaign for files in unmapped folders")
+    parser.add_argument("--map", action="append", default=[], metavar="FOLDER=CAMPAIGN", help="send a folder of the archive to a campaign (repeatable)")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    result = run_import(args.archive, parse_campaign_map(args.map), args.campaign, workers=args.workers)
+    for entry in result["skipped"]: print(f"skipped {entry['path']}: {entry['reason']}")
+    for entry in result["errors"]: print(f"error {entry['path']}: {entry['reason']}")
+    if result["status"] == "failed": sys.exit(f"Import failed: {result['error']}")
+    print(f"Imported {result['imported']} stories ({len(result['skipped'])} skipped)")
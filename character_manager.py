@@ -5,9 +5,15 @@ import shutil
 import uuid
 import base64
 import io
+import zipfile
 from PIL import Image
 from PIL.PngImagePlugin import PngInfo
 
+import storage
+import stats_cache
+import image_manager
+import png_chunks
+
 # CONFIG
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "data")
@@ -16,103 +22,119 @@ GALLERY_DIR = os.path.join(BASE_DIR, "gallery")
 CHAR_DB_FILE = os.path.join(DATA_DIR, "characters.json")
 MAP_DB_FILE = os.path.join(DATA_DIR, "story_map.json")
 PLAYER_MAP_DB_FILE = os.path.join(DATA_DIR, "story_player_map.json")
+# Exported cards, named <char id>.<hash of what goes into the card>.png
+CARD_CACHE_DIR = os.path.join(DATA_DIR, "card_cache")
+CARD_VERSION = 1  # bump when the card format changes
 
 os.makedirs(DATA_DIR, exist_ok=True)
+os.makedirs(CARD_CACHE_DIR, exist_ok=True)
 os.makedirs(AVATAR_DIR, exist_ok=True)
 os.makedirs(GALLERY_DIR, exist_ok=True)
 
 # ---------------------------------------------------------
 # DB OPS
 # ---------------------------------------------------------
-def sanitize_data(data):
+char_store = storage.get_store("characters")
+map_store = storage.get_store("story_map")
+player_map_store = storage.get_store("story_player_map")
+
+_STORE_BY_FILE = {CHAR_DB_FILE: char_store, MAP_DB_FILE: map_store, PLAYER_MAP_DB_FILE: player_map_store}
+
+def _sanitize_character(key, val):
+    """Returns (record, dirty) with any missing fields filled in."""
     dirty = False
+    if not isinstance(val, dict): 
+        val = {"name": key, "description": "", "attributes": {}}
+        dirty = True
+    
+    if "name" not in val or not val["name"]: val["name"] = key; dirty = True
+    if "attributes" not in val: val["attributes"] = {}; dirty = True
+    if "gallery" not in val: val["gallery"] = []; dirty = True
+    if "bubble_color" not in val: val["bubble_color"] = "#1e293b"; dirty = True
+    return val, dirty
+
+def sanitize_data(data):
     cleaned_data = {}
     for key, val in data.items():
-        if not isinstance(val, dict): 
-            val = {"name": key, "description": "", "attributes": {}}
-            dirty = True
-        
-        if "name" not in val or not val["name"]: val["name"] = key; dirty = True
-        if "attributes" not in val: val["attributes"] = {}; dirty = True
-        if "gallery" not in val: val["gallery"] = []; dirty = True
-        if "bubble_color" not in val: val["bubble_color"] = "#1e293b"; dirty = True
-            
+        val, dirty = _sanitize_character(key, val)
+        if dirty: char_store.put(key, val)
         cleaned_data[key] = val
-        
-    if dirty: save_json(CHAR_DB_FILE, cleaned_data)
     return cleaned_data
 
 def load_json(filepath):
+    if filepath in _STORE_BY_FILE:
+        data = _STORE_BY_FILE[filepath].all()
+        if filepath == CHAR_DB_FILE: return sanitize_data(data)
+        return data
     if not os.path.exists(filepath): return {}
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            if filepath == CHAR_DB_FILE: return sanitize_data(data)
-            return data
+        with open(filepath, 'r', encoding='utf-8') as f: return json.load(f)
     except: return {}
 
 def save_json(filepath, data):
+    if filepath in _STORE_BY_FILE:
+        _STORE_BY_FILE[filepath].replace_all(data)
+        return
     with open(filepath, 'w', encoding='utf-8') as f: json.dump(data, f, indent=4)
 
 # ---------------------------------------------------------
 # PLAYER MAPPING
 # ---------------------------------------------------------
 def get_story_player_map(filename):
-    full_map = load_json(PLAYER_MAP_DB_FILE)
-    return full_map.get(filename, {})
+    return player_map_store.get(filename)
 
 def update_story_player_map(filename, char_id, player_name):
-    full_map = load_json(PLAYER_MAP_DB_FILE)
-    if filename not in full_map: full_map[filename] = {}
     if player_name and player_name.strip():
-        full_map[filename][char_id] = player_name.strip()
+        player_map_store.set_entry(filename, char_id, player_name.strip())
     else:
-        if char_id in full_map[filename]: del full_map[filename][char_id]
-    save_json(PLAYER_MAP_DB_FILE, full_map)
+        player_map_store.delete_entry(filename, char_id)
 
 def get_players_for_character(char_id):
-    full_map = load_json(PLAYER_MAP_DB_FILE)
-    players = set()
-    for filename, char_map in full_map.items():
-        if char_id in char_map: players.add(char_map[char_id])
-    return sorted(list(players))
+    return sorted(player_map_store.values_for_subkey(char_id))
 
 # ---------------------------------------------------------
 # CHARACTER LOGIC
 # ---------------------------------------------------------
 def create_character(name):
     char_id = str(uuid.uuid4())
-    db = load_json(CHAR_DB_FILE)
-    db[char_id] = {
+    char_store.put(char_id, {
         "name": name, "description": "",
         "attributes": {"Age": "Unknown", "Gender": "Unknown", "Race": "Unknown", "Orientation": "Unknown"},
         "avatar_file": None, "gallery": [], "bubble_color": "#1e293b"
-    }
-    save_json(CHAR_DB_FILE, db)
+    })
     return char_id
 
 def get_character(char_id):
-    db = load_json(CHAR_DB_FILE)
-    return db.get(char_id)
+    val = char_store.get(char_id)
+    if val is None: return None
+    val, dirty = _sanitize_character(char_id, val)
+    if dirty: char_store.put(char_id, val)
+    return val
 
 def get_all_characters():
-    return load_json(CHAR_DB_FILE)
+    return sanitize_data(char_store.all())
+
+def get_characters(char_ids):
+    """{char_id: record} for the ids that exist, without loading the rest."""
+    return sanitize_data(char_store.get_many(char_ids))
 
 def update_character_data(char_id, name, description, attributes, bubble_color, avatar_filename=None):
-    db = load_json(CHAR_DB_FILE)
-    if char_id in db:
-        db[char_id]["name"] = name
-        db[char_id]["description"] = description
-        db[char_id]["attributes"] = attributes
-        db[char_id]["bubble_color"] = bubble_color
-        if avatar_filename: db[char_id]["avatar_file"] = avatar_filename
-        save_json(CHAR_DB_FILE, db)
+    char = get_character(char_id)
+    if char:
+        char["name"] = name
+        char["description"] = description
+        char["attributes"] = attributes
+        char["bubble_color"] = bubble_color
+        if avatar_filename: char["avatar_file"] = avatar_filename
+        char_store.put(char_id, char)
+        _drop_cached_cards(char_id)
 
 def delete_character(char_id):
-    db = load_json(CHAR_DB_FILE)
-    if char_id in db:
-        del db[char_id]
-        save_json(CHAR_DB_FILE, db)
+    char_store.delete(char_id)
+    _drop_cached_cards(char_id)
+    # Its story links and players go with it
+    map_store.delete_value(char_id)
+    player_map_store.delete_subkey(char_id)
 
 # ---------------------------------------------------------
 # IMAGES & EXPORT
@@ -127,6 +149,8 @@ def save_avatar(char_id, file_object, original_filename):
     safe_filename = f"{char_id}_avatar{ext}"
     file_location = os.path.join(AVATAR_DIR, safe_filename)
     with open(file_location, "wb+") as dest: shutil.copyfileobj(file_object, dest)
+    image_manager.schedule_derivatives("avatars", safe_filename)
+    _drop_cached_cards(char_id)
     return safe_filename
 
 def add_gallery_image(char_id, file_object, original_filename):
@@ -135,55 +159,142 @@ def add_gallery_image(char_id, file_object, original_filename):
     safe_filename = f"{char_id}_{img_id}{ext}"
     file_location = os.path.join(GALLERY_DIR, safe_filename)
     with open(file_location, "wb+") as dest: shutil.copyfileobj(file_object, dest)
-    db = load_json(CHAR_DB_FILE)
-    if char_id in db:
-        if "gallery" not in db[char_id]: db[char_id]["gallery"] = []
-        db[char_id]["gallery"].append(safe_filename)
-        save_json(CHAR_DB_FILE, db)
+    image_manager.schedule_derivatives("gallery", safe_filename)
+    char = get_character(char_id)
+    if char:
+        char["gallery"].append(safe_filename)
+        char_store.put(char_id, char)
 
-def export_character_card(char_id):
-    try:
-        char_data = get_character(char_id)
-        if not char_data: return None
-        img = None
-        if char_data.get("avatar_file"):
-            path = os.path.join(AVATAR_DIR, char_data["avatar_file"])
-            if os.path.exists(path):
-                try: img = Image.open(path).convert("RGBA")
-                except: img = None
-        if not img: img = Image.new('RGB', (400, 600), color=get_avatar_color(char_data.get('name')))
-        name = char_data.get('name', 'Unknown')
-        desc = char_data.get('description') or ""
-        attrs = char_data.get('attributes') or {}
-        bubble_color = char_data.get('bubble_color', '#1e293b')
-        
-        attr_text = "\n".join([f"{k}: {v}" for k, v in attrs.items()])
-        full_desc = f"{desc}\n\n[Attributes]\n{attr_text}"
-        
-        card_data = {
-            "spec": "chara_card_v2", "spec_version": "2.0",
-            "data": {
-                "name": name, "description": full_desc, "creator_notes": "Exported from StoryStash",
-                "extensions": {"storystash": {"raw_attributes": attrs, "raw_description": desc, "bubble_color": bubble_color}}
-            }
+def _card_fields(char_data):
+    return {
+        "name": char_data.get('name', 'Unknown'), "description": char_data.get('description') or "",
+        "attributes": char_data.get('attributes') or {}, "bubble_color": char_data.get('bubble_color', '#1e293b'),
+    }
+
+def _card_key(char_data):
+    """Hash of everything that ends up in the card, including the avatar file's size and mtime."""
+    avatar_sig = None
+    if char_data.get("avatar_file"):
+        try:
+            st = os.stat(os.path.join(AVATAR_DIR, char_data["avatar_file"]))
+            avatar_sig = [char_data["avatar_file"], st.st_size, st.st_mtime_ns]
+        except OSError: pass
+    raw = json.dumps([CARD_VERSION, _card_fields(char_data), avatar_sig], sort_keys=True)
+    return hashlib.md5(raw.encode("utf-8")).hexdigest()[:16]
+
+def _render_card(char_data):
+    img = None
+    if char_data.get("avatar_file"):
+        path = os.path.join(AVATAR_DIR, char_data["avatar_file"])
+        if os.path.exists(path):
+            try:
+                with Image.open(path) as src: img = src.convert("RGBA")
+            except: img = None
+    if not img: img = Image.new('RGB', (400, 600), color=get_avatar_color(char_data.get('name')))
+    fields = _card_fields(char_data)
+    name, desc, attrs = fields["name"], fields["description"], fields["attributes"]
+
+    attr_text = "\n".join([f"{k}: {v}" for k, v in attrs.items()])
+    full_desc = f"{desc}\n\n[Attributes]\n{attr_text}"
+
+    card_data = {
+        "spec": "chara_card_v2", "spec_version": "2.0",
+        "data": {
+            "name": name, "description": full_desc, "creator_notes": "Exported from StoryStash",
+            "extensions": {"storystash": {"raw_attributes": attrs, "raw_description": desc, "bubble_color": fields["bubble_color"]}}
         }
-        json_str = json.dumps(card_data)
-        base64_str = base64.b64encode(json_str.encode('utf-8')).decode('utf-8')
-        metadata = PngInfo()
-        metadata.add_text("chara", base64_str)
-        output_buffer = io.BytesIO()
-        img.save(output_buffer, format="PNG", pnginfo=metadata)
-        output_buffer.seek(0)
-        return output_buffer
+    }
+    json_str = json.dumps(card_data)
+    base64_str = base64.b64encode(json_str.encode('utf-8')).decode('utf-8')
+    metadata = PngInfo()
+    metadata.add_text("chara", base64_str)
+    return img, metadata
+
+def _drop_cached_cards(char_id):
+    with os.scandir(CARD_CACHE_DIR) as entries:
+        for entry in entries:
+            if entry.name.startswith(f"{char_id}."):
+                try: os.remove(entry.path)
+                except OSError: pass
+
+def _card_path(char_id, char_data):
+    try:
+        path = os.path.join(CARD_CACHE_DIR, f"{char_id}.{_card_key(char_data)}.png")
+        if os.path.exists(path): return path
+        _drop_cached_cards(char_id)
+        img, metadata = _render_card(char_data)
+        tmp_path = f"{path}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+        img.save(tmp_path, format="PNG", pnginfo=metadata)
+        os.replace(tmp_path, path)
+        return path
     except Exception as e:
         print(f"Export Error: {e}")
         return None
 
-def import_character_card(file_bytes):
+def export_character_card(char_id):
+    """
+    Path of the character's card (PNG with the JSON embedded), rendered
+    on first use and cached until the character or its avatar changes.
+    None if the character doesn't exist or can't be exported.
+    """
+    char_data = get_character(char_id)
+    return _card_path(char_id, char_data) if char_data else None
+
+def card_filename(char_data):
+    safe_name = "".join(c for c in char_data.get("name", "character") if c.isalnum() or c in " _-").strip()
+    return f"{safe_name or 'character'}.png"
+
+class _ZipStream(io.RawIOBase):
+    """Write-only, unseekable sink for zipfile; take() hands over what was written so far."""
+    def __init__(self):
+        self._chunks = []
+        self._pos = 0
+    def writable(self): return True
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._pos += len(data)
+        return len(data)
+    def tell(self): return self._pos
+    def take(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+def select_characters(char_ids=None, query=None):
+    """Ids of the given characters (or all), optionally only those whose name contains query."""
+    chars = get_all_characters() if char_ids is None else get_characters(char_ids)
+    if query: chars = {cid: c for cid, c in chars.items() if query.lower() in c.get("name", "").lower()}
+    return list(chars) if char_ids is None else [cid for cid in char_ids if cid in chars]
+
+def iter_cards_zip(char_ids):
+    """
+    Yields a ZIP of the characters' cards piece by piece, rendering cards
+    that aren't cached as it goes; only one card is in memory at a time.
+    """
+    sink = _ZipStream()
+    used = set()
+    chars = get_characters(char_ids)
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_STORED) as zf:
+        for char_id in char_ids:
+            path = _card_path(char_id, chars[char_id]) if char_id in chars else None
+            if not path: continue
+            base, ext = os.path.splitext(card_filename(chars[char_id]))
+            arcname, counter = base + ext, 1
+            while arcname in used:
+                arcname = f"{base}_{counter}{ext}"
+                counter += 1
+            used.add(arcname)
+            zf.write(path, arcname)
+            yield sink.take()
+    yield sink.take()
+
+def import_character_card(file_object):
+    """
+    Creates a character from a card PNG (a seekable binary file). Only the
+    PNG's text chunks are read; the pixels are never decoded.
+    """
     try:
-        img = Image.open(io.BytesIO(file_bytes))
-        img.load() 
-        raw_data = img.info.get("chara")
+        raw_data = png_chunks.read_text_chunks(file_object).get("chara")
         if not raw_data: return None
         decoded_json = base64.b64decode(raw_data).decode('utf-8')
         card_json = json.loads(decoded_json)
@@ -202,14 +313,15 @@ def import_character_card(file_bytes):
             bubble_color = extensions["storystash"].get("bubble_color", bubble_color)
             
         avatar_filename = f"{new_id}_avatar.png"
-        img.save(os.path.join(AVATAR_DIR, avatar_filename), format="PNG")
-        db = load_json(CHAR_DB_FILE)
-        db[new_id] = {
+        # The card is already a PNG: keep its bytes rather than re-encoding it
+        file_object.seek(0)
+        with open(os.path.join(AVATAR_DIR, avatar_filename), "wb") as dest: shutil.copyfileobj(file_object, dest)
+        image_manager.schedule_derivatives("avatars", avatar_filename)
+        char_store.put(new_id, {
             "name": name, "description": desc, "attributes": attrs,
             "avatar_file": avatar_filename, "gallery": [], 
             "bubble_color": bubble_color
-        }
-        save_json(CHAR_DB_FILE, db)
+        })
         return new_id
     except: return None
 
@@ -218,26 +330,24 @@ def import_character_card(file_bytes):
 # ---------------------------------------------------------
 def get_story_map(filename):
     filename = filename.replace("\\", "/")
-    full_map = load_json(MAP_DB_FILE)
-    return full_map.get(filename, {})
+    return map_store.get(filename)
 
 def update_story_map(filename, raw_name, char_id):
     filename = filename.replace("\\", "/")
-    full_map = load_json(MAP_DB_FILE)
-    if filename not in full_map: full_map[filename] = {}
-    full_map[filename][raw_name] = char_id
-    save_json(MAP_DB_FILE, full_map)
+    map_store.set_entry(filename, raw_name, char_id)
 
 def get_character_stories(char_id):
-    full_map = load_json(MAP_DB_FILE)
-    found_stories = []
-    for filename, mapping in full_map.items():
-        if char_id in mapping.values(): found_stories.append(filename)
-    return found_stories
+    return map_store.keys_with_value(char_id)
+
+def move_story(old_filename, new_filename):
+    """Carries a story's cast links and players over to its new path."""
+    old_filename, new_filename = old_filename.replace("\\", "/"), new_filename.replace("\\", "/")
+    map_store.rename(old_filename, new_filename)
+    player_map_store.rename(old_filename, new_filename)
 
 def get_cast_for_story(filename, local_stats):
-    char_db = load_json(CHAR_DB_FILE)
     story_map = get_story_map(filename)
+    char_db = get_characters(set(story_map.values()))
     final_cast = []
     sorted_raw_names = sorted(local_stats.keys(), key=lambda n: local_stats[n], reverse=True)
     for raw_name in sorted_raw_names:
@@ -254,6 +364,42 @@ def get_cast_for_story(filename, local_stats):
             char_obj["description"] = db_char.get("description", "")
             char_obj["attributes"] = db_char.get("attributes", {})
             char_obj["bubble_color"] = db_char.get("bubble_color", "#1e293b")
-            if db_char.get("avatar_file"): char_obj["avatar_url"] = f"/avatars/{db_char['avatar_file']}"
+            if db_char.get("avatar_file"): char_obj["avatar_url"] = image_manager.derivative_url("avatars", db_char["avatar_file"], "sm")
         final_cast.append(char_obj)
     return final_cast
+
+# ---------------------------------------------------------
+# ANALYTICS
+# ---------------------------------------------------------
+# Speaker tallies from stats_cache, summed over every raw name a character
+# is linked to in story_map. No story file is read.
+def _empty_counts():
+    return dict.fromkeys(stats_cache.FIELDS, 0)
+
+def _add_counts(totals, counts):
+    for field in stats_cache.FIELDS: totals[field] += counts[field]
+
+def get_character_analytics(char_id):
+    """{"totals": counts, "stories": {story: counts}} with counts = {"messages", "words", "actions", "ooc"}."""
+    stories = get_character_stories(char_id)
+    speakers = stats_cache.get_speakers_many(stories)
+    totals, per_story = _empty_counts(), {}
+    for story in stories:
+        counts = per_story[story] = _empty_counts()
+        for raw_name, mapped_id in get_story_map(story).items():
+            if mapped_id == char_id and raw_name in speakers[story]: _add_counts(counts, speakers[story][raw_name])
+        _add_counts(totals, counts)
+    return {"totals": totals, "stories": per_story}
+
+def get_top_characters(limit=5, field="words"):
+    """[(char_id, counts)] of the existing characters with the most of field, highest first."""
+    links = map_store.all()
+    speakers = stats_cache.get_speakers_many(links)
+    totals = {}
+    for story, story_map in links.items():
+        for raw_name, char_id in story_map.items():
+            counts = speakers[story].get(raw_name)
+            if counts: _add_counts(totals.setdefault(char_id, _empty_counts()), counts)
+    existing = get_characters(totals)
+    ranked = sorted((item for item in totals.items() if item[0] in existing), key=lambda item: item[1][field], reverse=True)
+    return ranked[:limit]
@@ -0,0 +1,243 @@
+import zlib
+import threading
+from collections import OrderedDict
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import Response
+
+# Optional encoders (brotli is in requirements.txt; zstandard: pip install zstandard)
+try: import brotli
+except ImportError: brotli = None
+try: import zstandard
+except ImportError: zstandard = None
+
+# CONFIG
+# Bodies smaller than this aren't worth the encoding overhead
+MINIMUM_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # brotli's default of 11 is meant for offline compression
+ZSTD_LEVEL = 3
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "image/svg+xml")
+
+# Compressed bodies of ETag'd responses, so an unchanged page or fragment
+# is encoded once rather than on every request
+CACHE_MAX_BYTES = 32 * 1024 * 1024
+CACHE_MAX_ENTRY_BYTES = 4 * 1024 * 1024
+
+# ---------------------------------------------------------
+# ENCODERS
+# ---------------------------------------------------------
+class _GzipEncoder:
+    def __init__(self): self._z = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    def compress(self, data): return self._z.compress(data)
+    def flush(self): return self._z.flush(zlib.Z_SYNC_FLUSH)
+    def finish(self): return self._z.flush()
+
+class _BrotliEncoder:
+    def __init__(self): self._c = brotli.Compressor(quality=BROTLI_QUALITY)
+    def compress(self, data): return self._c.process(data)
+    def flush(self): return self._c.flush()
+    def finish(self): return self._c.finish()
+
+class _ZstdEncoder:
+    def __init__(self): self._c = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+    def compress(self, data): return self._c.compress(data)
+    def flush(self): return self._c.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+    def finish(self): return self._c.flush()
+
+# In order of preference when the client accepts several equally
+ENCODERS = OrderedDict()
+if brotli: ENCODERS["br"] = _BrotliEncoder
+if zstandard: ENCODERS["zstd"] = _ZstdEncoder
+ENCODERS["gzip"] = _GzipEncoder
+
+def choose_encoding(accept_encoding):
+    """Best encoding we support from an Accept-Encoding header, or None."""
+    if not accept_encoding: return None
+    weights = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try: q = float(params[2:])
+            except ValueError: q = 0.0
+        weights[name.strip().lower()] = q
+    best, best_q = None, 0.0
+    for name in ENCODERS:
+        q = weights.get(name, weights.get("*", 0.0))
+        if q > best_q: best, best_q = name, q
+    return best
+
+# ---------------------------------------------------------
+# ETAGS
+# ---------------------------------------------------------
+# A compressed body is a different representation, so it gets its own tag:
+# "abc" -> "abc-gzip". Incoming If-None-Match values are mapped back before
+# the app sees them.
+def encoded_etag(etag, encoding):
+    if not etag.endswith('"'): return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+def _decoded_etag(etag):
+    """Returns (tag without encoding suffix, encoding or None)."""
+    for encoding in ENCODERS:
+        suffix = f'-{encoding}"'
+        if etag.endswith(suffix): return etag[:-len(suffix)] + '"', encoding
+    return etag, None
+
+def _strip_if_none_match(scope):
+    """Returns (scope with decoded If-None-Match, encoding the client's copy was in)."""
+    raw = []
+    client_encoding = None
+    for key, value in scope["headers"]:
+        if key == b"if-none-match":
+            tags = []
+            for tag in value.decode("latin-1").split(","):
+                tag, encoding = _decoded_etag(tag.strip())
+                client_encoding = client_encoding or encoding
+                tags.append(tag)
+            value = ", ".join(tags).encode("latin-1")
+        raw.append((key, value))
+    if not client_encoding: return scope, None
+    return dict(scope, headers=raw), client_encoding
+
+# ---------------------------------------------------------
+# COMPRESSED RESPONSE CACHE
+# ---------------------------------------------------------
+_cache = OrderedDict()  # (etag, encoding) -> (headers, body)
+_cache_bytes = 0
+_cache_lock = threading.Lock()
+
+def _cache_store(etag, encoding, headers, body):
+    global _cache_bytes
+    if len(body) > CACHE_MAX_ENTRY_BYTES: return
+    key = (etag, encoding)
+    with _cache_lock:
+        old = _cache.pop(key, None)
+        if old: _cache_bytes -= len(old[1])
+        _cache[key] = (headers, body)
+        _cache_bytes += len(body)
+        while _cache_bytes > CACHE_MAX_BYTES:
+            _, (_, evicted) = _cache.popitem(last=False)
+            _cache_bytes -= len(evicted)
+
+def cached_response(etag, accept_encoding):
+    """Response replaying a stored compressed copy of the page tagged etag, or None."""
+    encoding = choose_encoding(accept_encoding)
+    if not encoding: return None
+    with _cache_lock:
+        entry = _cache.get((etag, encoding))
+        if not entry: return None
+        _cache.move_to_end((etag, encoding))
+    headers, body = entry
+    return Response(body, headers=headers)
+
+# ---------------------------------------------------------
+# MIDDLEWARE
+# ---------------------------------------------------------
+class CompressionMiddleware:
+    """
+    Negotiated br/zstd/gzip for text responses of at least minimum_size.
+    Streamed responses are compressed chunk by chunk with a flush after each
+    one, so the browser can keep rendering while the rest is produced.
+    """
+    def __init__(self, app, minimum_size=MINIMUM_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        scope, client_encoding = _strip_if_none_match(scope)
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        await _Responder(self.app, encoding, self.minimum_size, client_encoding)(scope, receive, send)
+
+class _Responder:
+    def __init__(self, app, encoding, minimum_size, client_encoding=None):
+        self.app = app
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.client_encoding = client_encoding
+        self.send = None
+        self.start_message = None
+        self.passthrough = False
+        self.started = False
+        self.pending = []
+        self.pending_size = 0
+        self.encoder = None
+        self.etag = None
+        self.cached_body = []
+        self.cached_size = 0
+
+    async def __call__(self, scope, receive, send):
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    async def send_compressed(self, message):
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            headers = Headers(raw=message["headers"])
+            media_type = headers.get("content-type", "").partition(";")[0].strip().lower()
+            compressible = media_type.startswith(COMPRESSIBLE_TYPES)
+            if compressible and "accept-encoding" not in headers.get("vary", "").lower():
+                MutableHeaders(raw=message["headers"]).add_vary_header("Accept-Encoding")
+            if message["status"] == 304 and self.client_encoding and "etag" in headers:
+                # The copy being revalidated was compressed, so is the tag it knows
+                MutableHeaders(raw=message["headers"])["etag"] = encoded_etag(headers["etag"], self.client_encoding)
+            self.passthrough = (
+                not compressible or not self.encoding or message["status"] in (204, 206, 304)
+                or "content-encoding" in headers
+            )
+            if self.passthrough: await self.send(message)
+            return
+
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if not self.started:
+            self.pending.append(body)
+            self.pending_size += len(body)
+            if more_body and self.pending_size < self.minimum_size: return
+            body = b"".join(self.pending)
+            self.pending = []
+            if not more_body and len(body) < self.minimum_size:
+                self.passthrough = True
+                await self.send(self.start_message)
+                await self.send({"type": "http.response.body", "body": body})
+                return
+            await self._start(streaming=more_body)
+
+        if more_body: chunk = self.encoder.compress(body) + self.encoder.flush()
+        else: chunk = self.encoder.compress(body) + self.encoder.finish()
+        if not self.started:
+            # Whole body in one message: it gets a real Content-Length
+            self.started = True
+            MutableHeaders(raw=self.start_message["headers"])["content-length"] = str(len(chunk))
+            await self.send(self.start_message)
+        self._remember(chunk, done=not more_body)
+        await self.send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+    async def _start(self, streaming):
+        self.encoder = ENCODERS[self.encoding]()
+        headers = MutableHeaders(raw=self.start_message["headers"])
+        headers["content-encoding"] = self.encoding
+        if "content-length" in headers: del headers["content-length"]
+        if "etag" in headers:
+            self.etag = headers["etag"]
+            headers["etag"] = encoded_etag(self.etag, self.encoding)
+        if streaming:
+            self.started = True
+            await self.send(self.start_message)
+
+    def _remember(self, chunk, done):
+        if not self.etag or self.cached_size > CACHE_MAX_ENTRY_BYTES: return
+        self.cached_body.append(chunk)
+        self.cached_size += len(chunk)
+        if done and self.cached_size <= CACHE_MAX_ENTRY_BYTES:
+            headers = {k: v for k, v in Headers(raw=self.start_message["headers"]).items() if k != "content-length"}
+            _cache_store(self.etag, self.encoding, headers, b"".join(self.cached_body))
@@ -0,0 +1,188 @@
+import os
+import sys
+import hashlib
+import threading
+from PIL import Image, ImageOps, features
+
+import job_queue
+
+# CONFIG
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+THUMB_DIR = os.path.join(BASE_DIR, "thumbs")
+
+# Original uploads, by the URL prefix they are served under
+SOURCE_DIRS = {
+    "avatars": os.path.join(BASE_DIR, "avatars"),
+    "gallery": os.path.join(BASE_DIR, "gallery"),
+    "backgrounds": os.path.join(BASE_DIR, "backgrounds"),
+}
+
+# kind -> size name -> pixels. Thumbnails ("xs"/"sm") are shown with
+# object-cover, so their short side is scaled to the size; "lg" bounds the
+# long side.
+DERIVATIVE_SIZES = {
+    "avatars": {"xs": 64, "sm": 384},
+    "gallery": {"sm": 384},
+    "backgrounds": {"lg": 1920},
+}
+COVER_SIZES = ("xs", "sm")
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".gif", ".bmp")
+WEBP_QUALITY = 80
+JPEG_QUALITY = 85
+JPEG_BACKGROUND = (15, 23, 42)  # slate-900, what transparent areas sit on in the UI
+
+DERIVATIVE_FORMAT = "WEBP" if features.check("webp") else "JPEG"
+DERIVATIVE_EXT = ".webp" if DERIVATIVE_FORMAT == "WEBP" else ".jpg"
+
+for kind in DERIVATIVE_SIZES: os.makedirs(os.path.join(THUMB_DIR, kind), exist_ok=True)
+
+# kind -> source filename -> {size name: derivative filename}. Derivatives
+# are named "<source>.<content hash>.<size><ext>", so the table can be
+# rebuilt from a directory listing and a changed upload gets new URLs.
+_derivatives = None
+_generation = 0  # bumped whenever a derivative URL changes
+_lock = threading.RLock()
+
+# ---------------------------------------------------------
+# INDEX
+# ---------------------------------------------------------
+def _load():
+    global _derivatives
+    if _derivatives is not None: return _derivatives
+    table = {kind: {} for kind in DERIVATIVE_SIZES}
+    for kind, sizes in DERIVATIVE_SIZES.items():
+        with os.scandir(os.path.join(THUMB_DIR, kind)) as entries:
+            for entry in entries:
+                parts = entry.name.rsplit(".", 3)
+                if len(parts) != 4 or parts[2] not in sizes: continue
+                table[kind].setdefault(parts[0], {})[parts[2]] = entry.name
+    _derivatives = table
+    return _derivatives
+
+def version():
+    """Changes whenever derivative_url() may return something different."""
+    return _generation
+
+def derivative_url(kind, filename, size):
+    """URL of a resized copy of an upload, or of the original until one exists."""
+    if not filename: return ""
+    with _lock: derived = _load().get(kind, {}).get(filename, {}).get(size)
+    if derived: return f"/thumbs/{kind}/{derived}"
+    return f"/{kind}/{filename}"
+
+# ---------------------------------------------------------
+# RESIZING
+# ---------------------------------------------------------
+def _resize(img, size_name, pixels):
+    width, height = img.size
+    edge = min(width, height) if size_name in COVER_SIZES else max(width, height)
+    if edge <= pixels: return img
+    scale = pixels / edge
+    return img.resize((max(1, round(width * scale)), max(1, round(height * scale))), Image.LANCZOS)
+
+def _prepare(img):
+    img = ImageOps.exif_transpose(img)
+    has_alpha = img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info)
+    if DERIVATIVE_FORMAT == "WEBP": return img.convert("RGBA" if has_alpha else "RGB")
+    if not has_alpha: return img.convert("RGB")
+    flat = Image.new("RGB", img.size, JPEG_BACKGROUND)
+    rgba = img.convert("RGBA")
+    flat.paste(rgba, mask=rgba.split()[3])
+    return flat
+
+def _save(img, path):
+    # Several threads may build the same derivative at once
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    if DERIVATIVE_FORMAT == "WEBP": img.save(tmp_path, format="WEBP", quality=WEBP_QUALITY, method=4)
+    else: img.save(tmp_path, format="JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    os.replace(tmp_path, path)
+
+def remove_derivatives(kind, filename):
+    global _generation
+    with _lock:
+        _generation += 1
+        for derived in _load().get(kind, {}).pop(filename, {}).values():
+            try: os.remove(os.path.join(THUMB_DIR, kind, derived))
+            except OSError: pass
+
+def build_derivatives(kind, filename):
+    """
+    (Re)builds every size of one upload. Returns {size name: filename};
+    empty if the file is missing or isn't an image Pillow can read.
+    """
+    global _generation
+    if kind not in DERIVATIVE_SIZES: return {}
+    source_path = os.path.join(SOURCE_DIRS[kind], filename)
+    try:
+        with open(source_path, "rb") as f: digest = hashlib.md5(f.read()).hexdigest()[:10]
+        with Image.open(source_path) as img:
+            img.seek(0)
+            img = _prepare(img)
+    except Exception as e:
+        print(f"Image Error ({kind}/{filename}): {e}")
+        return {}
+
+    built = {}
+    for size_name, pixels in DERIVATIVE_SIZES[kind].items():
+        derived = f"{filename}.{digest}.{size_name}{DERIVATIVE_EXT}"
+        path = os.path.join(THUMB_DIR, kind, derived)
+        if not os.path.exists(path): _save(_resize(img, size_name, pixels), path)
+        built[size_name] = derived
+
+    with _lock:
+        _generation += 1
+        table = _load()[kind]
+        old = table.get(filename, {})
+        for derived in set(old.values()) - set(built.values()):
+            try: os.remove(os.path.join(THUMB_DIR, kind, derived))
+            except OSError: pass
+        table[filename] = built
+    return built
+
+# ---------------------------------------------------------
+# BACKFILL
+# ---------------------------------------------------------
+def _needs_build(kind, filename):
+    derived = _load()[kind].get(filename)
+    if not derived or set(derived) != set(DERIVATIVE_SIZES[kind]): return True
+    try:
+        source_mtime = os.path.getmtime(os.path.join(SOURCE_DIRS[kind], filename))
+        return any(os.path.getmtime(os.path.join(THUMB_DIR, kind, d)) < source_mtime for d in derived.values())
+    except OSError: return True
+
+def backfill(kinds=None):
+    """Builds missing or outdated derivatives for every upload. Returns how many were built."""
+    built = 0
+    for kind in kinds or DERIVATIVE_SIZES:
+        try: names = sorted(os.listdir(SOURCE_DIRS[kind]))
+        except OSError: continue
+        with _lock:
+            todo = [n for n in names if n.lower().endswith(IMAGE_EXTENSIONS) and _needs_build(kind, n)]
+            # Derivatives of uploads that no longer exist
+            for stale in set(_load()[kind]) - set(names): remove_derivatives(kind, stale)
+        for filename in todo:
+            if build_derivatives(kind, filename): built += 1
+    return built
+
+def start_backfill():
+    """Queues a backfill() job unless one is already waiting."""
+    job_queue.enqueue("thumbs.backfill", priority=job_queue.PRIORITY_LOW, dedupe_key="thumbs:backfill")
+
+def schedule_derivatives(kind, filename):
+    """
+    For a new or replaced upload: pages fall back to the original right away
+    and the derivatives are rebuilt by a job.
+    """
+    remove_derivatives(kind, filename)
+    job_queue.enqueue("thumbs.build", {"kind": kind, "filename": filename}, job_queue.PRIORITY_HIGH, dedupe_key=f"thumbs:{kind}/{filename}")
+
+job_queue.register("thumbs.build", build_derivatives)
+job_queue.register("thumbs.backfill", backfill)
+
+if __name__ == "__main__":
+    # python image_manager.py backfill  -> build thumbnails for existing uploads
+    if len(sys.argv) > 1 and sys.argv[1] == "backfill":
+        print(f"Built derivatives for {backfill()} image(s) in {THUMB_DIR}")
+    else:
+        print("Usage: python image_manager.py backfill")
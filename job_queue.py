@@ -0,0 +1,225 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+import storage
+
+# CONFIG
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+JOBS_DB_FILE = os.path.join(DATA_DIR, "jobs.db")
+
+JOB_WORKERS = int(os.environ.get("STORYBOX_JOB_WORKERS", "2"))
+MAX_ATTEMPTS = 3
+RETRY_DELAY_SECONDS = 5     # doubled after every failed attempt
+POLL_SECONDS = 1.0          # how long an idle worker sleeps between checks
+HISTORY = 500               # finished jobs kept for the /jobs page
+
+# Lower runs first
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 5
+PRIORITY_LOW = 10
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    dedupe_key TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    run_after REAL NOT NULL,
+    progress TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_next ON jobs (status, priority, id);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_dedupe ON jobs (dedupe_key) WHERE status = 'queued';
+"""
+
+os.makedirs(DATA_DIR, exist_ok=True)
+
+# kind -> function called with the job's payload as keyword arguments
+_handlers = {}
+_backend = None
+_backend_lock = threading.Lock()
+_wake = threading.Condition()
+_stopping = threading.Event()
+_workers = []
+_current = threading.local()
+
+def _db():
+    global _backend
+    with _backend_lock:
+        if _backend is None: _backend = storage.SqliteBackend(JOBS_DB_FILE, SCHEMA)
+    return _backend.connection()
+
+# ---------------------------------------------------------
+# PRODUCERS
+# ---------------------------------------------------------
+def register(kind, func):
+    """Makes `kind` runnable; modules register their handlers at import time."""
+    _handlers[kind] = func
+
+def enqueue(kind, payload=None, priority=PRIORITY_NORMAL, dedupe_key=None, max_attempts=MAX_ATTEMPTS, delay=0):
+    """
+    Persists a job and returns its id. While a job with the same dedupe_key
+    is still queued, that job's id is returned instead of adding another.
+    """
+    now = time.time()
+    with _db() as conn:
+        cur = conn.execute(
+            "INSERT OR IGNORE INTO jobs (kind, payload, priority, status, dedupe_key, max_attempts, run_after, created_at) "
+            "VALUES (?, ?, ?, 'queued', ?, ?, ?, ?)",
+            (kind, json.dumps(payload or {}), priority, dedupe_key, max_attempts, now + delay, now))
+        job_id = cur.lastrowid if cur.rowcount else None
+        if job_id is None:
+            job_id = conn.execute("SELECT id FROM jobs WHERE dedupe_key = ? AND status = 'queued'", (dedupe_key,)).fetchone()[0]
+    with _wake: _wake.notify()
+    return job_id
+
+def enqueue_many(kind, items, priority=PRIORITY_NORMAL, max_attempts=MAX_ATTEMPTS):
+    """enqueue() for [(payload, dedupe_key)] in one transaction."""
+    if not items: return
+    now = time.time()
+    with _db() as conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO jobs (kind, payload, priority, status, dedupe_key, max_attempts, run_after, created_at) "
+            "VALUES (?, ?, ?, 'queued', ?, ?, ?, ?)",
+            [(kind, json.dumps(payload or {}), priority, dedupe_key, max_attempts, now, now) for payload, dedupe_key in items])
+    with _wake: _wake.notify_all()
+
+def set_progress(progress):
+    """Called from inside a handler: stores a JSON-able progress report on the running job."""
+    job_id = getattr(_current, "job_id", None)
+    if job_id is None: return
+    with _db() as conn: conn.execute("UPDATE jobs SET progress = ? WHERE id = ?", (json.dumps(progress), job_id))
+
+# ---------------------------------------------------------
+# QUERIES
+# ---------------------------------------------------------
+COLUMNS = ("id", "kind", "payload", "priority", "status", "attempts", "max_attempts",
+           "run_after", "progress", "error", "created_at", "started_at", "finished_at")
+
+def _row_to_job(row):
+    job = dict(zip(COLUMNS, row))
+    job["payload"] = json.loads(job["payload"])
+    job["progress"] = json.loads(job["progress"]) if job["progress"] else None
+    return job
+
+def get_job(job_id):
+    row = _db().execute(f"SELECT {', '.join(COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return _row_to_job(row) if row else None
+
+def list_jobs(status=None, kind=None, limit=100):
+    """Newest first."""
+    where, args = [], []
+    if status: where.append("status = ?"); args.append(status)
+    if kind: where.append("kind = ?"); args.append(kind)
+    sql = f"SELECT {', '.join(COLUMNS)} FROM jobs"
+    if where: sql += " WHERE " + " AND ".join(where)
+    rows = _db().execute(sql + " ORDER BY id DESC LIMIT ?", args + [limit])
+    return [_row_to_job(row) for row in rows]
+
+def counts():
+    counted = dict(_db().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"))
+    return {status: counted.get(status, 0) for status in ("queued", "running", "done", "failed")}
+
+def retry(job_id):
+    """Queues a failed job again with a fresh set of attempts. Returns False if it can't be."""
+    try:
+        with _db() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET status = 'queued', attempts = 0, run_after = ?, error = NULL, finished_at = NULL "
+                "WHERE id = ? AND status = 'failed'", (time.time(), job_id))
+    except sqlite3.IntegrityError: return False  # an identical job is already queued
+    with _wake: _wake.notify()
+    return cur.rowcount > 0
+
+# ---------------------------------------------------------
+# WORKERS
+# ---------------------------------------------------------
+def _claim():
+    kinds = list(_handlers)
+    if not kinds: return None
+    # One statement, so two workers can never claim the same job
+    with _db() as conn:
+        rows = conn.execute(
+            "UPDATE jobs SET status = 'running', attempts = attempts + 1, started_at = ? WHERE id = ("
+            f"  SELECT id FROM jobs WHERE status = 'queued' AND run_after <= ? AND kind IN ({', '.join('?' * len(kinds))})"
+            "  ORDER BY priority, id LIMIT 1"
+            ") RETURNING id, kind, payload, attempts, max_attempts",
+            [time.time(), time.time()] + kinds).fetchall()
+    return rows[0] if rows else None
+
+def _finish(job_id, status, error=None):
+    with _db() as conn:
+        conn.execute("UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?", (status, error, time.time(), job_id))
+
+def _run(job_id, kind, payload, attempts, max_attempts):
+    _current.job_id = job_id
+    try: _handlers[kind](**json.loads(payload))
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        print(f"Job Error ({kind} #{job_id}, attempt {attempts}/{max_attempts}): {error}")
+        if attempts >= max_attempts:
+            _finish(job_id, "failed", error)
+            return
+        try:
+            with _db() as conn:
+                conn.execute("UPDATE jobs SET status = 'queued', error = ?, run_after = ? WHERE id = ?",
+                             (error, time.time() + RETRY_DELAY_SECONDS * 2 ** (attempts - 1), job_id))
+        # The same work was queued again meanwhile; that job replaces the retry
+        except sqlite3.IntegrityError: _finish(job_id, "failed", error + " (superseded)")
+    else: _finish(job_id, "done")
+    finally: _current.job_id = None
+
+def _worker_loop():
+    finished = 0
+    while not _stopping.is_set():
+        try: job = _claim()
+        except sqlite3.Error as e:
+            print(f"Job Queue Error: {e}")
+            job = None
+        if not job:
+            with _wake: _wake.wait(POLL_SECONDS)
+            continue
+        _run(*job)
+        finished += 1
+        if finished % 100 == 0: _prune()
+
+def _prune():
+    with _db() as conn:
+        conn.execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'failed') AND id NOT IN ("
+            "  SELECT id FROM jobs WHERE status IN ('done', 'failed') ORDER BY id DESC LIMIT ?)", (HISTORY,))
+
+def _recover():
+    """Jobs left 'running' by a previous process were interrupted: run them again."""
+    with _db() as conn:
+        conn.execute("UPDATE OR IGNORE jobs SET status = 'queued', run_after = 0 WHERE status = 'running' AND attempts < max_attempts")
+        conn.execute("UPDATE jobs SET status = 'failed', error = 'Interrupted by a restart', finished_at = ? WHERE status = 'running'", (time.time(),))
+
+def start(workers=JOB_WORKERS):
+    """Starts the worker threads (once). Queued jobs from earlier runs are picked up."""
+    if _workers: return
+    _stopping.clear()
+    _recover()
+    _prune()
+    for i in range(max(1, workers)):
+        thread = threading.Thread(target=_worker_loop, name=f"job-worker-{i}", daemon=True)
+        thread.start()
+        _workers.append(thread)
+
+def stop(timeout=5):
+    """Lets running jobs finish (up to timeout); queued ones stay for the next start."""
+    _stopping.set()
+    with _wake: _wake.notify_all()
+    for thread in _workers: thread.join(timeout)
+    _workers.clear()
@@ -1,19 +1,49 @@
 import os
 import json
+import time
+import hashlib
+import functools
+from contextlib import asynccontextmanager
 from typing import Optional, List
-from fastapi import FastAPI, HTTPException, Form, UploadFile, File, Request
-from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
+from fastapi import FastAPI, HTTPException, Form, UploadFile, File, Request, Query
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse, Response, FileResponse
 from fastapi.staticfiles import StaticFiles
-from jinja2 import Template
+from jinja2 import Environment, DictLoader, FileSystemBytecodeCache
+import anyio
 
 # MODULE IMPORTS
 import character_manager
 import story_parser
 import story_manager
+import stats_cache
 import prompt_manager
-from templates import HTML_TEMPLATE_STRING
-
-app = FastAPI()
+import storage
+import image_manager
+import compression
+import job_queue
+import story_watcher
+import bulk_import
+import tag_index
+from templates import TEMPLATES
+
+@asynccontextmanager
+async def lifespan(app):
+    # Picks up jobs queued before the last shutdown too
+    job_queue.start()
+    # Stories added or edited on disk (e.g. on the Docker host) are picked up as they change
+    story_manager.start_watching()
+    # Thumbnails for uploads that predate the image pipeline (or were copied in by hand)
+    image_manager.start_backfill()
+    # Compile (or load from the bytecode cache) every view before the first request
+    for name in TEMPLATES: jinja_env.get_template(name)
+    yield
+    story_watcher.stop()
+    job_queue.stop()
+    # Pending coalesced JSON writes must reach disk before the process exits
+    storage.flush_all()
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(compression.CompressionMiddleware)
 
 # CONFIG
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -21,133 +51,363 @@ os.makedirs(story_manager.STORY_DIR, exist_ok=True)
 os.makedirs(character_manager.AVATAR_DIR, exist_ok=True)
 os.makedirs(character_manager.GALLERY_DIR, exist_ok=True)
 os.makedirs(story_manager.BACKGROUND_DIR, exist_ok=True)
-
-app.mount("/avatars", StaticFiles(directory=character_manager.AVATAR_DIR), name="avatars")
-app.mount("/gallery", StaticFiles(directory=character_manager.GALLERY_DIR), name="gallery")
-app.mount("/backgrounds", StaticFiles(directory=story_manager.BACKGROUND_DIR), name="backgrounds")
-
-jinja_template = Template(HTML_TEMPLATE_STRING)
+TEMPLATE_CACHE_DIR = os.path.join(storage.DATA_DIR, "template_cache")
+os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles with a fixed Cache-Control header on every response."""
+    def __init__(self, *args, cache_control, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_control = cache_control
+
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = self.cache_control
+        return response
+
+# Uploads keep their name when replaced, so browsers must revalidate them
+# (StaticFiles answers that with a 304). Derivatives have the content hash
+# in their name and never change.
+REVALIDATE = "no-cache"
+IMMUTABLE = "public, max-age=31536000, immutable"
+app.mount("/avatars", CachedStaticFiles(directory=character_manager.AVATAR_DIR, cache_control=REVALIDATE), name="avatars")
+app.mount("/gallery", CachedStaticFiles(directory=character_manager.GALLERY_DIR, cache_control=REVALIDATE), name="gallery")
+app.mount("/backgrounds", CachedStaticFiles(directory=story_manager.BACKGROUND_DIR, cache_control=REVALIDATE), name="backgrounds")
+app.mount("/thumbs", CachedStaticFiles(directory=image_manager.THUMB_DIR, cache_control=IMMUTABLE), name="thumbs")
+
+# One template per view, all extending base.html. Compiled templates are
+# kept on disk so a restart doesn't recompile them.
+jinja_env = Environment(
+    loader=DictLoader(TEMPLATES),
+    autoescape=True,
+    bytecode_cache=FileSystemBytecodeCache(TEMPLATE_CACHE_DIR),
+)
+jinja_env.globals["thumb_url"] = image_manager.derivative_url
+
+def view(name):
+    return jinja_env.get_template(f"{name}.html")
+
+# Stories with more blocks than this are read in windows of this size
+READ_WINDOW_BLOCKS = 200
+STREAM_CHUNK_CHARS = 16 * 1024
+
+def _coalesce(chunks, size=STREAM_CHUNK_CHARS):
+    """Jinja yields many tiny strings; group them into reasonably sized writes."""
+    buffer = []
+    buffered = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        buffered += len(chunk)
+        if buffered >= size:
+            yield "".join(buffer)
+            buffer = []
+            buffered = 0
+    if buffer: yield "".join(buffer)
+
+def render_streamed(template, headers=None, **context):
+    """Streams a large view so the header and first blocks go out while the rest renders."""
+    return StreamingResponse(_coalesce(template.generate(**context)), media_type="text/html", headers=headers)
+
+# --- CONDITIONAL GET ---
+# Pages send a strong ETag hashed from everything they are rendered from, so
+# a reload of an unchanged page is answered with a 304 before any parsing
+# or rendering happens.
+# A restart may bring new templates or parser code, so it starts a fresh set of tags.
+RENDER_VERSION = f"{os.getpid()}-{time.time_ns()}"
+
+def page_etag(*inputs):
+    raw = json.dumps([RENDER_VERSION, image_manager.version(), inputs], sort_keys=True, default=str)
+    return '"' + hashlib.md5(raw.encode()).hexdigest() + '"'
+
+def file_signature(full_path):
+    try:
+        st = os.stat(full_path)
+        return [st.st_mtime_ns, st.st_size]
+    except OSError: return None
+
+def not_modified(if_none_match, etag):
+    if not if_none_match: return None
+    if etag not in [t.strip() for t in if_none_match.split(",")]: return None
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+def cached_page(request_headers, etag):
+    """A 304 if the client has this version, else a stored compressed copy, else None."""
+    if not request_headers: return None
+    cached = not_modified(request_headers.get("if-none-match"), etag)
+    if cached: return cached
+    return compression.cached_response(etag, request_headers.get("accept-encoding", ""))
+
+def etag_headers(etag):
+    return {"ETag": etag, "Cache-Control": "no-cache"}
+
+# Disk reads, JSON/SQLite access, parsing and Pillow work all block. Routes
+# hand it to this bounded pool so one slow request can't stall the loop.
+BLOCKING_WORKERS = int(os.environ.get("STORYBOX_BLOCKING_WORKERS", "8"))
+_blocking_limiter = None
+
+async def run_blocking(func, *args, **kwargs):
+    global _blocking_limiter
+    if _blocking_limiter is None: _blocking_limiter = anyio.CapacityLimiter(BLOCKING_WORKERS)
+    return await anyio.to_thread.run_sync(functools.partial(func, *args, **kwargs), limiter=_blocking_limiter)
 
 # --------------------------------------------------------------------------
 # ROUTES
 # --------------------------------------------------------------------------
 
-@app.get("/", response_class=HTMLResponse)
-async def dashboard(request: Request):
+def _dashboard_page():
     total_stories = story_manager.get_total_story_count()
     all_chars = character_manager.get_all_characters()
     all_prompts = prompt_manager.get_all_prompts()
     campaigns = story_manager.get_campaigns()
     recent_files = story_manager.get_recent_stories(limit=5)
+    recent_stats = stats_cache.get_stats_many(recent_files)
     recent_data = []
     for rel_path in recent_files:
-        full_path = os.path.join(story_manager.STORY_DIR, rel_path)
         recent_data.append({
             "path": rel_path,
             "meta": story_manager.get_story_meta(rel_path),
-            "stats": story_parser.get_file_stats(full_path)
+            "stats": recent_stats[rel_path]
         })
+    campaign_totals = stats_cache.get_campaign_totals()
+    campaign_stats = [(camp, campaign_totals.get("" if camp == "Unsorted" else camp, {})) for camp in campaigns]
+    top_chars = [(all_chars[cid], cid, counts) for cid, counts in character_manager.get_top_characters(limit=5)]
     stats = {
         "total_stories": total_stories,
         "total_chars": len(all_chars),
         "total_campaigns": len(campaigns) - 1,
-        "total_prompts": len(all_prompts)
+        "total_prompts": len(all_prompts),
+        "total_words": sum(totals["words"] for totals in campaign_totals.values())
     }
-    return jinja_template.render(mode="dashboard", stats=stats, recent_stories=recent_data, campaigns=campaigns)
+    return view("dashboard").render(stats=stats, recent_stories=recent_data, campaigns=campaigns, campaign_stats=campaign_stats, top_chars=top_chars)
 
-@app.get("/stories", response_class=HTMLResponse)
-async def stories_list(request: Request):
-    active_campaign = request.query_params.get("campaign", None)
-    structure = story_manager.list_stories_by_campaign()
-    target_files = []
-    if active_campaign and active_campaign in structure: target_files = structure[active_campaign]
-    else:
-        for camp_name, files in structure.items(): target_files.extend(files)
+@app.get("/", response_class=HTMLResponse)
+async def dashboard(request: Request):
+    return await run_blocking(_dashboard_page)
+
+STORIES_QUERY_DEFAULTS = {
+    "campaign": None, "sort": "date", "order": "desc", "min_rating": 0, "tag": "", "speaker": "",
+    "format": "", "page": 1, "page_size": story_manager.STORIES_PAGE_SIZE,
+}
+
+def _stories_page(query, request_headers=None):
+    campaigns = story_manager.get_campaigns()
+    active_campaign = query["campaign"] if query["campaign"] in campaigns else None
+    page_paths, total = story_manager.query_stories(
+        active_campaign, query["sort"], query["order"] != "asc", query["min_rating"],
+        query["tag"], query["speaker"], query["format"], query["page"], query["page_size"])
+    metas = {rel_path: story_manager.get_story_meta(rel_path) for rel_path in page_paths}
+    facets = story_manager.get_listing_facets()
+    # Stats may be served stale while a job recomputes them, so they are part of the tag
+    all_stats = stats_cache.get_stats_many(page_paths)
+    etag = page_etag(query, total, campaigns, facets, metas, all_stats, story_manager.get_story_signatures(page_paths))
+    cached = cached_page(request_headers, etag)
+    if cached: return cached
     stories_data = []
-    for rel_path in target_files:
-        full_path = os.path.join(story_manager.STORY_DIR, rel_path)
-        stories_data.append({"path": rel_path, "meta": story_manager.get_story_meta(rel_path), "stats": story_parser.get_file_stats(full_path)})
-    return jinja_template.render(mode="stories_list", campaigns=story_manager.get_campaigns(), active_campaign=active_campaign, stories=stories_data)
+    for rel_path in page_paths:
+        stories_data.append({"path": rel_path, "meta": metas[rel_path], "stats": all_stats[rel_path]})
+    page_size = max(1, min(query["page_size"], story_manager.MAX_PAGE_SIZE))
+    pages = {"current": max(1, query["page"]), "count": max(1, -(-total // page_size)), "total": total}
+    # Links keep every filter that isn't at its default
+    link_query = {key: value for key, value in query.items() if value and value != STORIES_QUERY_DEFAULTS[key]}
+    return render_streamed(view("stories_list"), headers=etag_headers(etag), campaigns=campaigns, active_campaign=active_campaign, stories=stories_data,
+                           query=query, link_query=link_query, pages=pages, facets=facets,
+                           sort_fields=story_manager.SORT_FIELDS, format_types=story_manager.FORMAT_TYPES)
 
-@app.get("/prompts", response_class=HTMLResponse)
-async def prompts_list(request: Request):
+@app.get("/stories", response_class=HTMLResponse)
+async def stories_list(request: Request, campaign: Optional[str] = None, sort: str = "date", order: str = "desc", min_rating: int = 0,
+                       tag: str = "", speaker: str = "", format_type: str = Query("", alias="format"), page: int = 1,
+                       page_size: int = story_manager.STORIES_PAGE_SIZE):
+    query = {"campaign": campaign, "sort": sort, "order": order, "min_rating": min_rating, "tag": tag,
+             "speaker": speaker, "format": format_type, "page": page, "page_size": page_size}
+    return await run_blocking(_stories_page, query, request.headers)
+
+def _browse_params(tags, campaigns, page=1):
+    """Query string pairs for a /browse link."""
+    return [("tag", tag) for tag in tags] + [("campaign", camp) for camp in campaigns] + ([("page", page)] if page > 1 else [])
+
+def _toggle(values, value):
+    wanted = tag_index.normalize(value)
+    kept = [v for v in values if tag_index.normalize(v) != wanted]
+    return kept if len(kept) < len(values) else values + [value]
+
+def _browse_page(tags, campaigns, page, request_headers=None):
+    tags = list(dict.fromkeys(tag.strip() for tag in tags if tag.strip()))
+    campaigns = list(dict.fromkeys(camp for camp in campaigns if camp))
+    result = story_manager.browse_stories(tags, campaigns, page=page)
+    # Prompts have no campaign, so only the tags narrow them down
+    prompts = prompt_manager.get_prompts_with_tags(tags) if tags else {}
+    prompt_counts = tag_index.counts("prompts", within=prompts.keys() if tags else None)
+    metas = {rel_path: story_manager.get_story_meta(rel_path) for rel_path in result["stories"]}
+    all_stats = stats_cache.get_stats_many(result["stories"])
+    etag = page_etag(tags, campaigns, page, result, prompts, metas, all_stats, story_manager.get_story_signatures(result["stories"]))
+    cached = cached_page(request_headers, etag)
+    if cached: return cached
+
+    selected = {tag_index.normalize(tag) for tag in tags}
+    tag_facets = {}
+    for tag, count in result["tags"]: tag_facets[tag_index.normalize(tag)] = {"label": tag, "stories": count, "prompts": 0}
+    for tag, count in prompt_counts: tag_facets.setdefault(tag_index.normalize(tag), {"label": tag, "stories": 0})["prompts"] = count
+    for tag in tags: tag_facets.setdefault(tag_index.normalize(tag), {"label": tag, "stories": 0, "prompts": 0})
+    for name, facet in tag_facets.items():
+        facet["selected"] = name in selected
+        facet["params"] = _browse_params(_toggle(tags, facet["label"]), campaigns)
+    tag_facets = sorted(tag_facets.values(), key=lambda f: (not f["selected"], -(f["stories"] + f["prompts"]), f["label"].lower()))
+    campaign_facets = [{"label": camp, "stories": count, "selected": camp in campaigns, "params": _browse_params(tags, _toggle(campaigns, camp))}
+                       for camp, count in result["campaigns"]]
+
+    stories_data = [{"path": rel_path, "meta": metas[rel_path], "stats": all_stats[rel_path]} for rel_path in result["stories"]]
+    pages = {"current": max(1, page), "count": max(1, -(-result["total"] // story_manager.STORIES_PAGE_SIZE)), "total": result["total"]}
+    return render_streamed(view("browse"), headers=etag_headers(etag), tags=tags, campaigns=campaigns, stories=stories_data, prompts=prompts,
+                           tag_facets=tag_facets, campaign_facets=campaign_facets, pages=pages,
+                           prev_params=_browse_params(tags, campaigns, pages["current"] - 1), next_params=_browse_params(tags, campaigns, pages["current"] + 1))
+
+@app.get("/browse", response_class=HTMLResponse)
+async def browse(request: Request, tag: List[str] = Query([]), campaign: List[str] = Query([]), page: int = 1):
+    return await run_blocking(_browse_page, tag, campaign, page, request.headers)
+
+def _prompts_page():
     prompts = prompt_manager.get_all_prompts()
     all_chars = character_manager.get_all_characters()
-    return jinja_template.render(mode="prompts_list", prompts=prompts, all_chars=all_chars)
+    return view("prompts_list").render(prompts=prompts, all_chars=all_chars)
+
+@app.get("/prompts", response_class=HTMLResponse)
+async def prompts_list(request: Request):
+    return await run_blocking(_prompts_page)
+
+def _search_page(q):
+    results = story_manager.search_stories(q)
+    return render_streamed(view("search"), query=q, results=results)
 
 @app.get("/search", response_class=HTMLResponse)
 async def search_results(q: str):
-    results = story_manager.search_stories(q)
-    return jinja_template.render(mode="search", query=q, results=results)
+    return await run_blocking(_search_page, q)
+
+def _char_list_page():
+    all_chars = character_manager.get_all_characters()
+    return view("char_list").render(all_chars=all_chars)
 
 @app.get("/characters", response_class=HTMLResponse)
 async def char_list():
-    all_chars = character_manager.get_all_characters()
-    return jinja_template.render(mode="char_list", all_chars=all_chars)
+    return await run_blocking(_char_list_page)
 
-@app.get("/character/{char_id}", response_class=HTMLResponse)
-async def char_profile(char_id: str):
+def _char_profile_page(char_id, request_headers=None):
     char = character_manager.get_character(char_id)
     if not char: raise HTTPException(404, "Character not found")
     char['id'] = char_id
     linked_stories = character_manager.get_character_stories(char_id)
     assigned_prompts = prompt_manager.get_prompts_for_character(char_id)
     played_by_list = character_manager.get_players_for_character(char_id)
-    return jinja_template.render(mode="char_profile", char=char, char_id=char_id, stories=linked_stories, assigned_prompts=assigned_prompts, played_by_list=played_by_list)
+    analytics = character_manager.get_character_analytics(char_id)
+    etag = page_etag(char_id, char, linked_stories, assigned_prompts, played_by_list, analytics)
+    cached = cached_page(request_headers, etag)
+    if cached: return cached
+    html = view("char_profile").render(char=char, char_id=char_id, stories=linked_stories, assigned_prompts=assigned_prompts, played_by_list=played_by_list, analytics=analytics)
+    return HTMLResponse(html, headers=etag_headers(etag))
 
-@app.get("/read/{path:path}", response_class=HTMLResponse)
-async def read_story(path: str):
+@app.get("/character/{char_id}", response_class=HTMLResponse)
+async def char_profile(char_id: str, request: Request):
+    return await run_blocking(_char_profile_page, char_id, request.headers)
+
+def _read_page(path, start, request_headers=None):
     full_path = os.path.join(story_manager.STORY_DIR, path)
-    if not os.path.exists(full_path): raise HTTPException(404, "File not found")
+    signature = file_signature(full_path)
+    if not signature: raise HTTPException(404, "File not found")
     meta = story_manager.get_story_meta(path)
+    all_db_chars = character_manager.get_all_characters()
+    story_map = character_manager.get_story_map(path)
+    player_map = character_manager.get_story_player_map(path)
+    etag = page_etag(path, start, READ_WINDOW_BLOCKS, signature, meta, story_map, player_map, all_db_chars)
+    cached = cached_page(request_headers, etag)
+    if cached: return cached
+
     format_type = meta.get("format_type", "star_rp")
     background_file = meta.get("background_file")
-    blocks, local_stats = story_parser.parse_file(full_path, format_type=format_type)
+    # The block index gives the cast stats up front, so blocks can be parsed lazily while streaming
+    block_index = story_parser.get_block_index(full_path)
+    local_stats = block_index["stats"]
+    total_blocks = len(block_index["offsets"])
+    window = None
+    if total_blocks > READ_WINDOW_BLOCKS:
+        start = max(0, min(start, total_blocks - 1))
+        end = min(start + READ_WINDOW_BLOCKS, total_blocks)
+        blocks = story_parser.iter_block_window(full_path, start, end, format_type=format_type)
+        window = {"start": start, "end": end, "total": total_blocks, "size": READ_WINDOW_BLOCKS}
+    else:
+        blocks = story_parser.iter_file_blocks_cached(full_path, format_type=format_type)
     characters = character_manager.get_cast_for_story(path, local_stats)
-    all_db_chars = character_manager.get_all_characters()
     char_map = {c['raw_name']: c for c in characters}
-    player_map = character_manager.get_story_player_map(path)
-    return jinja_template.render(mode="read", blocks=blocks, characters=characters, all_db_chars=all_db_chars, filename=path, char_map=char_map, background_file=background_file, player_map=player_map)
+    return render_streamed(view("read"), headers=etag_headers(etag), blocks=blocks, characters=characters, all_db_chars=all_db_chars, filename=path, char_map=char_map, background_file=background_file, player_map=player_map, window=window)
+
+@app.get("/read/{path:path}", response_class=HTMLResponse)
+async def read_story(path: str, request: Request, start: int = 0):
+    return await run_blocking(_read_page, path, start, request.headers)
+
+def _read_blocks_fragment(path, start, count, request_headers=None):
+    full_path = os.path.join(story_manager.STORY_DIR, path)
+    signature = file_signature(full_path)
+    if not signature: raise HTTPException(404, "File not found")
+    meta = story_manager.get_story_meta(path)
+    count = max(1, min(count, READ_WINDOW_BLOCKS))
+    story_map = character_manager.get_story_map(path)
+    bubble_colors = {cid: c.get("bubble_color") for cid, c in character_manager.get_all_characters().items()}
+    etag = page_etag("blocks", path, start, count, signature, meta.get("format_type"), story_map, bubble_colors)
+    cached = cached_page(request_headers, etag)
+    if cached: return cached
+
+    format_type = meta.get("format_type", "star_rp")
+    blocks = story_parser.iter_block_window(full_path, start, start + count, format_type=format_type)
+    block_index = story_parser.get_block_index(full_path)
+    characters = character_manager.get_cast_for_story(path, block_index["stats"])
+    char_map = {c['raw_name']: c for c in characters}
+    return render_streamed(view("read_blocks"), headers=etag_headers(etag), blocks=blocks, char_map=char_map)
+
+@app.get("/read_blocks/{path:path}", response_class=HTMLResponse)
+async def read_story_blocks(path: str, request: Request, start: int = 0, count: int = READ_WINDOW_BLOCKS):
+    return await run_blocking(_read_blocks_fragment, path, start, count, request.headers)
+
+def _edit_story_page(path):
+    if not story_manager.story_exists(path): raise HTTPException(404, "File not found")
+    content = story_manager.read_raw_story(path)
+    return view("edit_story").render(filename=path, content=content)
 
 @app.get("/edit_story/{path:path}", response_class=HTMLResponse)
 async def edit_story_view(path: str):
-    content = story_manager.read_raw_story(path)
-    return jinja_template.render(mode="edit_story", filename=path, content=content)
+    return await run_blocking(_edit_story_page, path)
 
 @app.post("/save_story_text")
 async def save_story_text(path: str = Form(...), content: str = Form(...)):
-    story_manager.overwrite_story_content(path, content)
+    await run_blocking(story_manager.overwrite_story_content, path, content)
     return RedirectResponse(url=f"/read/{path}", status_code=303)
 
 # --- ACTIONS ---
 @app.post("/create_campaign")
 async def create_campaign(name: str = Form(...)):
-    story_manager.create_campaign(name)
+    await run_blocking(story_manager.create_campaign, name)
     return RedirectResponse(url="/", status_code=303)
 
 @app.post("/update_story_meta")
 async def update_story_meta(current_path: str = Form(...), title: str = Form(...), synopsis: str = Form(""), tags: str = Form(""), campaign: str = Form(...), rating: int = Form(0), format_type: str = Form("star_rp")):
     tag_list = [t.strip() for t in tags.split(",") if t.strip()]
-    story_manager.update_story_meta(current_path, title, synopsis, tag_list, rating=rating, format_type=format_type)
+    await run_blocking(story_manager.update_story_meta, current_path, title, synopsis, tag_list, rating=rating, format_type=format_type)
     parts = current_path.replace("\\", "/").split("/")
     current_camp = parts[0] if len(parts) > 1 else "Unsorted"
-    if campaign != current_camp: story_manager.move_story_to_campaign(current_path, campaign)
+    if campaign != current_camp: await run_blocking(story_manager.move_story_to_campaign, current_path, campaign)
     return RedirectResponse(url="/", status_code=303)
 
 @app.post("/upload_story_background")
 async def upload_story_background(return_path: str = Form(...), file: UploadFile = File(...)):
-    if file.filename: story_manager.save_story_background(return_path, file.file, file.filename)
+    if file.filename: await run_blocking(story_manager.save_story_background, return_path, file.file, file.filename)
     return RedirectResponse(url=f"/read/{return_path}", status_code=303)
 
 @app.post("/create_character_quick")
 async def create_character_quick(name: str = Form(...)):
-    new_id = character_manager.create_character(name)
+    new_id = await run_blocking(character_manager.create_character, name)
     return RedirectResponse(url=f"/character/{new_id}", status_code=303)
 
 @app.post("/link_character")
 async def link_character(filename: str = Form(...), raw_name: str = Form(...), char_id: str = Form(...)):
-    if char_id == "NEW": char_id = character_manager.create_character(raw_name)
-    character_manager.update_story_map(filename, raw_name, char_id)
+    if char_id == "NEW": char_id = await run_blocking(character_manager.create_character, raw_name)
+    await run_blocking(character_manager.update_story_map, filename, raw_name, char_id)
     return RedirectResponse(url=f"/read/{filename}", status_code=303)
 
 # REVERTED TO STABLE
@@ -160,13 +420,14 @@ async def update_character_details(
 ):
     avatar_filename = None
     if avatar and avatar.filename: 
-        avatar_filename = character_manager.save_avatar(char_id, avatar.file, avatar.filename)
+        avatar_filename = await run_blocking(character_manager.save_avatar, char_id, avatar.file, avatar.filename)
     
     attributes = {}
     for k, v in zip(attr_keys, attr_values):
         if k.strip() and v.strip(): attributes[k.strip()] = v.strip()
 
-    character_manager.update_character_data(
+    await run_blocking(
+        character_manager.update_character_data,
         char_id, name, description, attributes, bubble_color, avatar_filename
     )
     
@@ -175,27 +436,33 @@ async def update_character_details(
 
 @app.post("/upload_gallery")
 async def upload_gallery(char_id: str = Form(...), image: UploadFile = File(...)):
-    if image.filename: character_manager.add_gallery_image(char_id, image.file, image.filename)
+    if image.filename: await run_blocking(character_manager.add_gallery_image, char_id, image.file, image.filename)
     return RedirectResponse(url=f"/character/{char_id}", status_code=303)
 
 @app.post("/delete_character")
 async def delete_char_endpoint(char_id: str = Form(...)):
-    character_manager.delete_character(char_id)
+    await run_blocking(character_manager.delete_character, char_id)
     return RedirectResponse(url="/characters", status_code=303)
 
 @app.get("/export_character/{char_id}")
 async def export_character(char_id: str):
-    png_buffer = character_manager.export_character_card(char_id)
-    if not png_buffer: raise HTTPException(404, "Character not found")
-    char_name = character_manager.get_character(char_id).get("name", "character")
-    safe_name = "".join(c for c in char_name if c.isalnum() or c in " _-").strip()
-    return StreamingResponse(png_buffer, media_type="image/png", headers={"Content-Disposition": f"attachment; filename={safe_name}.png"})
+    char = await run_blocking(character_manager.get_character, char_id)
+    if not char: raise HTTPException(404, "Character not found")
+    card_path = await run_blocking(character_manager.export_character_card, char_id)
+    if not card_path: raise HTTPException(500, "Export failed")
+    return FileResponse(card_path, media_type="image/png", filename=character_manager.card_filename(char))
+
+@app.get("/export_characters")
+async def export_characters(ids: List[str] = Query([]), q: Optional[str] = None):
+    # Cards are rendered (or read from the cache) while the zip streams out
+    char_ids = await run_blocking(character_manager.select_characters, ids or None, q)
+    return StreamingResponse(character_manager.iter_cards_zip(char_ids), media_type="application/zip",
+                             headers={"Content-Disposition": "attachment; filename=characters.zip"})
 
 @app.post("/import_character")
 async def import_character(file: UploadFile = File(...)):
     if not file.filename.lower().endswith(".png"): raise HTTPException(400, "Only PNG files allowed")
-    contents = await file.read()
-    new_id = character_manager.import_character_card(contents)
+    new_id = await run_blocking(character_manager.import_character_card, file.file)
     if not new_id: raise HTTPException(400, "Invalid Character Card")
     return RedirectResponse(url=f"/character/{new_id}", status_code=303)
 
@@ -203,32 +470,65 @@ async def import_character(file: UploadFile = File(...)):
 async def import_story_file(file: UploadFile = File(...), campaign: str = Form(...)):
     if not (file.filename.lower().endswith(".txt") or file.filename.lower().endswith(".json")):
         raise HTTPException(400, "Only .txt and .json files allowed")
-    filename = story_manager.save_story_from_file(file.file, file.filename)
-    if campaign != "Unsorted": story_manager.move_story_to_campaign(filename, campaign)
+    filename = await run_blocking(story_manager.save_story_from_file, file.file, file.filename)
+    if campaign != "Unsorted": await run_blocking(story_manager.move_story_to_campaign, filename, campaign)
     return RedirectResponse(url="/stories", status_code=303)
 
+@app.post("/import_archive")
+async def import_archive(file: UploadFile = File(...), campaign: str = Form("Unsorted"), campaign_map: str = Form("")):
+    if not file.filename.lower().endswith(bulk_import.ARCHIVE_EXTENSIONS):
+        raise HTTPException(400, "Only .zip and .tar(.gz/.bz2/.xz) archives allowed")
+    archive_path = await run_blocking(bulk_import.save_upload, file.file, file.filename)
+    await run_blocking(bulk_import.start_import_job, archive_path, bulk_import.parse_campaign_map(campaign_map), campaign, remove_archive=True)
+    return RedirectResponse(url="/jobs", status_code=303)
+
 @app.post("/import_story_text")
 async def import_story_text(title: str = Form(...), content: str = Form(...), campaign: str = Form(...)):
-    filename = story_manager.save_story_from_text(title, content)
-    if campaign != "Unsorted": story_manager.move_story_to_campaign(filename, campaign)
+    filename = await run_blocking(story_manager.save_story_from_text, title, content)
+    if campaign != "Unsorted": await run_blocking(story_manager.move_story_to_campaign, filename, campaign)
     return RedirectResponse(url="/stories", status_code=303)
 
 @app.post("/create_prompt")
 async def create_prompt(title: str = Form(...), content: str = Form(...), tags: str = Form(""), linked_chars: List[str] = Form([])):
     tag_list = tags.split(",")
-    prompt_manager.create_prompt(title, content, tag_list, linked_chars)
+    await run_blocking(prompt_manager.create_prompt, title, content, tag_list, linked_chars)
     return RedirectResponse(url="/prompts", status_code=303)
 
 @app.post("/delete_prompt")
 async def delete_prompt(pid: str = Form(...)):
-    prompt_manager.delete_prompt(pid)
+    await run_blocking(prompt_manager.delete_prompt, pid)
     return RedirectResponse(url="/prompts", status_code=303)
 
 @app.post("/set_story_player")
 async def set_story_player(filename: str = Form(...), char_id: str = Form(...), player_name: str = Form("")):
-    character_manager.update_story_player_map(filename, char_id, player_name)
+    await run_blocking(character_manager.update_story_player_map, filename, char_id, player_name)
     return RedirectResponse(url=f"/read/{filename}", status_code=303)
 
+# --- JOBS ---
+def _jobs_page(status, kind):
+    jobs = job_queue.list_jobs(status=status, kind=kind)
+    return view("jobs").render(jobs=jobs, counts=job_queue.counts(), status_filter=status, kind_filter=kind, now=time.time())
+
+@app.get("/jobs", response_class=HTMLResponse)
+async def jobs_page(status: Optional[str] = None, kind: Optional[str] = None):
+    return await run_blocking(_jobs_page, status, kind)
+
+@app.get("/api/jobs")
+async def jobs_api(status: Optional[str] = None, kind: Optional[str] = None, limit: int = 100):
+    jobs = await run_blocking(job_queue.list_jobs, status, kind, max(1, min(limit, 1000)))
+    return {"counts": await run_blocking(job_queue.counts), "jobs": jobs}
+
+@app.get("/api/jobs/{job_id}")
+async def job_api(job_id: int):
+    job = await run_blocking(job_queue.get_job, job_id)
+    if not job: raise HTTPException(404, "Job not found")
+    return job
+
+@app.post("/retry_job")
+async def retry_job(job_id: int = Form(...)):
+    await run_blocking(job_queue.retry, job_id)
+    return RedirectResponse(url="/jobs", status_code=303)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="127.0.0.1", port=8000, loop="asyncio")
@@ -0,0 +1,69 @@
+import os
+import zlib
+import struct
+
+# CONFIG
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+TEXT_CHUNKS = (b"tEXt", b"zTXt", b"iTXt")
+MAX_FILE_BYTES = 64 * 1024 * 1024
+MAX_TEXT_BYTES = 16 * 1024 * 1024   # per text chunk, before and after decompression
+MAX_PIXELS = 16384 * 16384          # rejects dimension bombs before anything tries to decode them
+
+def _read(f, length):
+    data = f.read(length)
+    if len(data) != length: raise ValueError("Truncated PNG")
+    return data
+
+def _inflate(data):
+    # Bounded, so a tiny chunk can't expand into gigabytes
+    d = zlib.decompressobj()
+    try: text = d.decompress(data, MAX_TEXT_BYTES)
+    except zlib.error as e: raise ValueError(f"Corrupt PNG text chunk: {e}")
+    if d.unconsumed_tail: raise ValueError("PNG text chunk too large")
+    return text
+
+def _decode_text(chunk_type, data):
+    """(keyword, text) of a tEXt/zTXt/iTXt chunk."""
+    keyword, _, rest = data.partition(b"\0")
+    keyword = keyword.decode("latin-1")
+    if chunk_type == b"tEXt": return keyword, rest.decode("latin-1")
+    if chunk_type == b"zTXt": return keyword, _inflate(rest[1:]).decode("latin-1")
+    # iTXt: compression flag, method, language tag, translated keyword, UTF-8 text
+    compressed = rest[:1] == b"\1"
+    _language, _, rest = rest[2:].partition(b"\0")
+    _translated, _, text = rest.partition(b"\0")
+    if compressed: text = _inflate(text)
+    return keyword, text.decode("utf-8")
+
+def read_text_chunks(f):
+    """
+    {keyword: text} of a PNG's tEXt/zTXt/iTXt chunks (the last wins, as in
+    Pillow), read from a seekable binary file without decoding any pixels:
+    image data is skipped with seek(). Raises ValueError for anything that
+    isn't a well-formed PNG within the limits above.
+    """
+    size = f.seek(0, os.SEEK_END)
+    f.seek(0)
+    if size > MAX_FILE_BYTES: raise ValueError("PNG too large")
+    if f.read(8) != PNG_SIGNATURE: raise ValueError("Not a PNG file")
+
+    texts = {}
+    first = True
+    while True:
+        length, chunk_type = struct.unpack(">I4s", _read(f, 8))
+        if f.tell() + length + 4 > size: raise ValueError("Truncated PNG")
+        if first:
+            if chunk_type != b"IHDR" or length != 13: raise ValueError("PNG has no IHDR")
+            width, height = struct.unpack(">II", _read(f, 8))
+            if width * height > MAX_PIXELS: raise ValueError("PNG dimensions too large")
+            f.seek(length - 8 + 4, os.SEEK_CUR)
+            first = False
+        elif chunk_type in TEXT_CHUNKS:
+            if length > MAX_TEXT_BYTES: raise ValueError("PNG text chunk too large")
+            data = _read(f, length)
+            crc, = struct.unpack(">I", _read(f, 4))
+            if zlib.crc32(chunk_type + data) != crc: raise ValueError("Corrupt PNG text chunk")
+            keyword, text = _decode_text(chunk_type, data)
+            texts[keyword] = text
+        elif chunk_type == b"IEND": return texts
+        else: f.seek(length + 4, os.SEEK_CUR)
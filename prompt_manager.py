@@ -1,8 +1,10 @@
 import os
-import json
 import uuid
 from datetime import datetime
 
+import storage
+import tag_index
+
 # CONFIG
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "data")
@@ -13,15 +15,14 @@ os.makedirs(DATA_DIR, exist_ok=True)
 # ---------------------------------------------------------
 # DB OPS
 # ---------------------------------------------------------
+prompt_store = storage.get_store("prompts")
+
 def load_db():
-    if not os.path.exists(PROMPT_DB_FILE): return {}
-    try:
-        with open(PROMPT_DB_FILE, 'r', encoding='utf-8') as f: return json.load(f)
-    except: return {}
+    return prompt_store.all()
 
 def save_db(data):
-    with open(PROMPT_DB_FILE, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=4)
+    prompt_store.replace_all(data)
+    tag_index.reset("prompts")
 
 # ---------------------------------------------------------
 # LOGIC
@@ -30,31 +31,32 @@ def create_prompt(title, content, tags, linked_chars):
     """
     linked_chars: list of character IDs
     """
-    db = load_db()
     pid = str(uuid.uuid4())
+    tags = [t.strip() for t in tags if t.strip()]
     
-    db[pid] = {
+    prompt_store.put(pid, {
         "title": title,
         "content": content,
-        "tags": [t.strip() for t in tags if t.strip()],
+        "tags": tags,
         "linked_chars": linked_chars,
         "created_at": datetime.now().strftime("%Y-%m-%d")
-    }
-    save_db(db)
+    })
+    tag_index.set_tags("prompts", pid, tags)
     return pid
 
 def get_all_prompts():
     return load_db()
 
 def get_prompt(pid):
-    db = load_db()
-    return db.get(pid)
+    return prompt_store.get(pid)
 
 def delete_prompt(pid):
-    db = load_db()
-    if pid in db:
-        del db[pid]
-        save_db(db)
+    prompt_store.delete(pid)
+    tag_index.remove("prompts", pid)
+
+def get_prompts_with_tags(tags):
+    """{pid: prompt} of the prompts carrying every one of tags."""
+    return prompt_store.get_many(tag_index.ids_with_all("prompts", tags))
 
 def get_prompts_for_character(char_id):
     """Returns a list of prompts assigned to a specific character."""
@@ -62,6 +64,5 @@ def get_prompts_for_character(char_id):
     matches = []
     for pid, data in db.items():
         if char_id in data.get("linked_chars", []):
-            data['id'] = pid
-            matches.append(data)
+            matches.append(dict(data, id=pid))
     return matches
@@ -0,0 +1,255 @@
+import os
+import re
+import json
+import threading
+
+import storage
+import job_queue
+
+# CONFIG
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STORY_DIR = os.path.join(BASE_DIR, "stories")
+DATA_DIR = os.path.join(BASE_DIR, "data")
+INDEX_DB_FILE = os.path.join(DATA_DIR, "search_index.db")
+LEGACY_INDEX_FILE = os.path.join(DATA_DIR, "search_index.json")
+INDEX_VERSION = 3
+
+TOKEN_RE = re.compile(r"\w+")
+# Lines end at "\r\n", "\r" or "\n", the way text mode reads them
+LINE_RE = re.compile(rb"[^\r\n]*(?:\r\n|\r|\n)|[^\r\n]+")
+LINE_BREAK_RE = re.compile(rb"[\r\n]")
+
+# One row per story, so a change rewrites only that story's postings
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS search_docs (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    postings TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS storage_info (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+os.makedirs(DATA_DIR, exist_ok=True)
+
+# In-memory copy of the on-disk index:
+#   docs:     rel_path -> {"mtime", "size", "terms"}
+#   postings: term -> {rel_path -> [byte offset of each line containing term]}
+# Offset lists are never changed once added, so rows can be encoded from
+# them without holding _lock.
+_index = None
+_lock = threading.RLock()
+_backend = None
+_backend_lock = threading.Lock()
+_write_lock = threading.Lock()  # keeps rows in the order their changes were made
+
+# ---------------------------------------------------------
+# PERSISTENCE
+# ---------------------------------------------------------
+def _db():
+    global _backend
+    with _backend_lock:
+        if _backend is None: _backend = storage.SqliteBackend(INDEX_DB_FILE, SCHEMA)
+    return _backend
+
+def _empty_index():
+    return {"docs": {}, "postings": {}}
+
+def _load_legacy():
+    """The whole-index JSON file of older versions, if there's a usable one."""
+    try:
+        with open(LEGACY_INDEX_FILE, 'r', encoding='utf-8') as f: data = json.load(f)
+        if data.get("version") == 1: return {"docs": data["docs"], "postings": data["postings"]}
+    except: pass
+    return None
+
+def _load():
+    global _index
+    if _index is not None: return _index
+    idx = _empty_index()
+    backend = _db()
+    if backend.get_info("version") != str(INDEX_VERSION):
+        with backend.connection() as conn: conn.execute("DELETE FROM search_docs")
+        backend.set_info("version", str(INDEX_VERSION))
+    for rel_path, mtime, size, postings in backend.connection().execute("SELECT path, mtime, size, postings FROM search_docs"):
+        _add_doc(idx, rel_path, mtime, size, json.loads(postings))
+    if not idx["docs"] and os.path.exists(LEGACY_INDEX_FILE):
+        # Moved over once; this startup pays for the write, later ones don't
+        legacy = _load_legacy()
+        if legacy:
+            idx = legacy
+            _write(*_snapshot(idx, list(idx["docs"])))
+        os.remove(LEGACY_INDEX_FILE)
+    _index = idx
+    return _index
+
+def _snapshot(idx, rel_paths):
+    """(rows to write, paths to delete) for rel_paths as idx has them now. Call with _lock held."""
+    docs, postings = idx["docs"], idx["postings"]
+    rows, gone = [], []
+    for rel_path in rel_paths:
+        doc = docs.get(rel_path)
+        if doc: rows.append((rel_path, doc["mtime"], doc["size"], {term: postings[term][rel_path] for term in doc["terms"]}))
+        else: gone.append(rel_path)
+    return rows, gone
+
+def _write(rows, gone):
+    rows = [(rel_path, mtime, size, json.dumps(doc_postings, separators=(",", ":"))) for rel_path, mtime, size, doc_postings in rows]
+    with _db().connection() as conn:
+        conn.executemany("DELETE FROM search_docs WHERE path = ?", [(rel_path,) for rel_path in gone])
+        conn.executemany("INSERT OR REPLACE INTO search_docs (path, mtime, size, postings) VALUES (?, ?, ?, ?)", rows)
+
+def _persist(rel_paths):
+    """
+    Writes the rows of rel_paths as the in-memory index has them now
+    (deleting rows of stories it no longer has). Only the snapshot holds
+    _lock; encoding and the write don't, so queries go on meanwhile.
+    """
+    if not rel_paths: return
+    with _write_lock:
+        with _lock: rows, gone = _snapshot(_load(), rel_paths)
+        _write(rows, gone)
+
+# ---------------------------------------------------------
+# INDEXING
+# ---------------------------------------------------------
+def scan_file(full_path):
+    """Returns {term: [line offsets]} for one story file."""
+    postings = {}
+    with open(full_path, 'rb') as f: data = f.read()
+    for line in LINE_RE.finditer(data):
+        for term in set(TOKEN_RE.findall(line.group().decode('utf-8', errors='ignore').lower())):
+            postings.setdefault(term, []).append(line.start())
+    return postings
+
+def read_line(f, offset):
+    """The line at a scan_file() offset of a story opened in binary mode, as text mode would return it."""
+    f.seek(offset)
+    chunks = []
+    while True:
+        chunk = f.read(8192)
+        end = LINE_BREAK_RE.search(chunk)
+        if end or not chunk:
+            if end: chunks.append(chunk[:end.start()])
+            line = b"".join(chunks).decode('utf-8', errors='ignore')
+            return line + "\n" if end else line
+        chunks.append(chunk)
+
+def _drop_doc(idx, rel_path):
+    doc = idx["docs"].pop(rel_path, None)
+    if not doc: return
+    for term in doc["terms"]:
+        bucket = idx["postings"].get(term)
+        if not bucket: continue
+        bucket.pop(rel_path, None)
+        if not bucket: del idx["postings"][term]
+
+def _add_doc(idx, rel_path, mtime, size, doc_postings):
+    _drop_doc(idx, rel_path)
+    for term, offsets in doc_postings.items():
+        idx["postings"].setdefault(term, {})[rel_path] = offsets
+    idx["docs"][rel_path] = {"mtime": mtime, "size": size, "terms": list(doc_postings.keys())}
+
+def _scan(rel_paths):
+    """{rel_path: (mtime, size, postings)} of the stories that could be read. Call without _lock."""
+    docs = {}
+    for rel_path in rel_paths:
+        full_path = os.path.join(STORY_DIR, rel_path)
+        try:
+            st = os.stat(full_path)
+            docs[rel_path] = (st.st_mtime, st.st_size, scan_file(full_path))
+        except OSError: continue
+    return docs
+
+def _apply(docs, dropped=()):
+    """Adds scanned stories (replacing what they had) and drops others, then writes their rows."""
+    with _lock:
+        idx = _load()
+        for rel_path in dropped: _drop_doc(idx, rel_path)
+        for rel_path, (mtime, size, doc_postings) in docs.items():
+            _add_doc(idx, rel_path, mtime, size, doc_postings)
+    _persist(list(dropped) + list(docs))
+
+def add_scanned(docs):
+    """Indexes stories scanned elsewhere: {rel_path: (mtime, size, scan_file() output)}."""
+    _apply(docs)
+
+def index_story(rel_path):
+    docs = _scan([rel_path])
+    _apply(docs, [] if docs else [rel_path])
+
+def schedule_index(rel_paths):
+    job_queue.enqueue_many("search.index", [({"rel_path": p}, f"search:{p}") for p in rel_paths])
+
+job_queue.register("search.index", index_story)
+
+def remove_story(rel_path):
+    with _lock:
+        if rel_path not in _load()["docs"]: return
+    _apply({}, [rel_path])
+
+def move_story(old_rel_path, new_rel_path):
+    """Re-keys an indexed story without rescanning it."""
+    with _lock:
+        idx = _load()
+        doc = idx["docs"].pop(old_rel_path, None)
+        if doc:
+            for term in doc["terms"]:
+                bucket = idx["postings"].get(term)
+                if bucket and old_rel_path in bucket: bucket[new_rel_path] = bucket.pop(old_rel_path)
+            idx["docs"][new_rel_path] = doc
+    if doc: _persist([old_rel_path, new_rel_path])
+    else: index_story(new_rel_path)
+
+def sync(rel_paths):
+    """Reindexes stories whose size/mtime changed and forgets deleted ones."""
+    wanted = set(rel_paths)
+    stale = []
+    with _lock:
+        docs = _load()["docs"]
+        gone = [rel_path for rel_path in docs if rel_path not in wanted]
+        for rel_path in rel_paths:
+            try: st = os.stat(os.path.join(STORY_DIR, rel_path))
+            except OSError: continue
+            doc = docs.get(rel_path)
+            if not (doc and doc["mtime"] == st.st_mtime and doc["size"] == st.st_size): stale.append(rel_path)
+    if gone or stale: _apply(_scan(stale), gone)
+
+# ---------------------------------------------------------
+# QUERY
+# ---------------------------------------------------------
+def _matching_terms(postings, query, match):
+    """
+    A token is only pinned to a word boundary on the sides where the query
+    itself has a non-word character, so 'ello' still finds 'hello'.
+    """
+    term = match.group(0)
+    left = match.start() > 0
+    right = match.end() < len(query)
+    if left and right: return [term] if term in postings else []
+    if left: return [t for t in postings if t.startswith(term)]
+    if right: return [t for t in postings if t.endswith(term)]
+    return [t for t in postings if term in t]
+
+def find_candidates(query):
+    """
+    Returns {rel_path: sorted line offsets} of lines that may contain the
+    (lowercased) query, or None if the query has no indexable terms.
+    Callers still confirm each line, the index only narrows the reads.
+    """
+    tokens = list(TOKEN_RE.finditer(query))
+    if not tokens: return None
+    with _lock:
+        postings = _load()["postings"]
+        result = None
+        for match in tokens:
+            hits = {}
+            for term in _matching_terms(postings, query, match):
+                for rel_path, offsets in postings[term].items():
+                    hits.setdefault(rel_path, set()).update(offsets)
+            if result is not None:
+                hits = {p: result[p] & offs for p, offs in hits.items() if p in result}
+                hits = {p: offs for p, offs in hits.items() if offs}
+            result = hits
+            if not result: return {}
+    return {p: sorted(offs) for p, offs in result.items()}
@@ -0,0 +1,284 @@
+import os
+import json
+import threading
+from datetime import datetime
+
+import storage
+import job_queue
+import story_parser
+
+# CONFIG
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STORY_DIR = os.path.join(BASE_DIR, "stories")
+DATA_DIR = os.path.join(BASE_DIR, "data")
+STATS_DB_FILE = os.path.join(DATA_DIR, "story_stats.db")
+LEGACY_STATS_FILE = os.path.join(DATA_DIR, "story_stats.json")
+
+# One row per story, so a change rewrites only that story's entry and a
+# bulk_import run from the command line doesn't undo the server's writes
+# (or the other way round)
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS story_stats (path TEXT PRIMARY KEY, data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS storage_info (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+os.makedirs(DATA_DIR, exist_ok=True)
+
+# rel_path -> {"size", "mtime", "stats", "speakers", "version"}: get_file_stats()
+# output and its per speaker breakdown (story_parser.tally_speakers()).
+# In-memory copy of the story_stats table; entries are never changed once stored.
+_cache = None
+# campaign folder ("" = root) -> totals of its analysed stories, kept in step with _cache
+_campaigns = None
+_generation = 0
+_changed = {}   # rel_path -> _generation when its entry last changed, for changes_since()
+_lock = threading.RLock()
+_rows = None
+_rows_lock = threading.Lock()
+_write_lock = threading.Lock()  # keeps rows in the order their changes were made
+
+FIELDS = ("messages", "words", "actions", "ooc")
+# Entries from an older version are recomputed like stale ones
+ENTRY_VERSION = 2
+
+# ---------------------------------------------------------
+# PERSISTENCE
+# ---------------------------------------------------------
+def _db():
+    global _rows
+    with _rows_lock:
+        if _rows is None: _rows = storage.SqliteDocumentStore(storage.SqliteBackend(STATS_DB_FILE, SCHEMA), "story_stats", "path")
+    return _rows
+
+def _load():
+    global _cache, _campaigns
+    if _cache is not None: return _cache
+    cache = _db().all()
+    if not cache and os.path.exists(LEGACY_STATS_FILE):
+        # The whole-cache JSON file of older versions, moved over once
+        try:
+            with open(LEGACY_STATS_FILE, 'r', encoding='utf-8') as f: cache = json.load(f)
+            _db().put_many(cache)
+        except: cache = {}
+        os.remove(LEGACY_STATS_FILE)
+    _campaigns = {}
+    for rel_path, entry in cache.items(): _roll(rel_path, entry, 1)
+    _cache = cache
+    return _cache
+
+def _save(rel_paths):
+    """Writes the rows of rel_paths as _cache has them now (deleting the ones it no longer has)."""
+    if not rel_paths: return
+    with _write_lock:
+        with _lock:
+            cache = _load()
+            rows = {p: cache[p] for p in rel_paths if p in cache}
+            gone = [p for p in rel_paths if p not in cache]
+        _db().put_many(rows)
+        for rel_path in gone: _db().delete(rel_path)
+
+def _adopt(sigs):
+    """
+    Takes over rows another process (bulk_import from the command line)
+    stored for {rel_path: (size, mtime)} when they match the file and ours
+    don't. Returns the rel paths taken over.
+    """
+    rows = _db().get_many(sigs)
+    adopted = []
+    with _lock:
+        cache = _load()
+        for rel_path, entry in rows.items():
+            ours = cache.get(rel_path)
+            if ours and _is_current(ours, sigs[rel_path]) and _is_complete(ours): continue
+            if _is_current(entry, sigs[rel_path]) and _is_complete(entry):
+                _put(rel_path, entry)
+                adopted.append(rel_path)
+    return adopted
+
+# ---------------------------------------------------------
+# ROLLUPS
+# ---------------------------------------------------------
+def _folder(rel_path):
+    return rel_path.replace("\\", "/").rpartition("/")[0]
+
+def _roll(rel_path, entry, sign):
+    """
+    Adds (sign=1) or takes away (sign=-1) one entry's speakers from its
+    campaign's totals. Messages are summed from msg_count, like the story cards show them.
+    """
+    speakers = entry.get("speakers") if entry else None
+    if speakers is None: return
+    folder = _folder(rel_path)
+    totals = _campaigns.setdefault(folder, dict.fromkeys(("stories",) + FIELDS, 0))
+    totals["stories"] += sign
+    totals["messages"] += sign * entry["stats"]["msg_count"]
+    for counts in speakers.values():
+        for field in FIELDS[1:]: totals[field] += sign * counts[field]
+    if not totals["stories"]: del _campaigns[folder]
+
+def _put(rel_path, entry):
+    """Replaces (or with None removes) a cache entry. Call with _lock held."""
+    global _generation
+    cache = _load()
+    _generation += 1
+    _changed[rel_path] = _generation
+    _roll(rel_path, cache.get(rel_path), -1)
+    if entry is None: cache.pop(rel_path, None)
+    else:
+        cache[rel_path] = entry
+        _roll(rel_path, entry, 1)
+
+# ---------------------------------------------------------
+# COMPUTE
+# ---------------------------------------------------------
+def _empty_stats():
+    return {"msg_count": 0, "top_characters": [], "date": "Unknown"}
+
+def _stat(rel_path):
+    try:
+        st = os.stat(os.path.join(STORY_DIR, rel_path))
+        return st.st_size, st.st_mtime
+    except OSError: return None
+
+def _entry(sig, stats, speakers):
+    return {"size": sig[0], "mtime": sig[1], "stats": stats, "speakers": speakers, "version": ENTRY_VERSION}
+
+def _compute(rel_path, sig):
+    # The signature is taken before reading, so a write racing with us
+    # leaves a mismatching entry that gets recomputed next time.
+    speakers = {}
+    stats = story_parser.get_file_stats(os.path.join(STORY_DIR, rel_path), speakers)
+    with _lock: _put(rel_path, _entry(sig, stats, speakers))
+    return stats
+
+def _is_current(entry, sig):
+    return entry["size"] == sig[0] and entry["mtime"] == sig[1]
+
+def _is_complete(entry):
+    return entry.get("version") == ENTRY_VERSION
+
+def refresh(rel_path):
+    """Job handler: recomputes one story's stats unless the cached entry is current."""
+    sig = _stat(rel_path)
+    if not sig: return
+    with _lock: entry = _load().get(rel_path)
+    if entry and _is_current(entry, sig) and _is_complete(entry): return
+    if _adopt({rel_path: sig}): return
+    _compute(rel_path, sig)
+    _save([rel_path])
+
+def sync(rel_paths):
+    """Forgets stories that aren't in rel_paths any more and analyses new or changed ones."""
+    wanted = set(rel_paths)
+    with _lock:
+        gone = [p for p in _load() if p not in wanted]
+        for rel_path in gone: _put(rel_path, None)
+    _save(gone)
+    for rel_path in rel_paths: refresh(rel_path)
+
+def schedule_refresh(rel_paths, priority=job_queue.PRIORITY_NORMAL):
+    job_queue.enqueue_many("stats.refresh", [({"rel_path": p}, f"stats:{p}") for p in rel_paths], priority)
+
+job_queue.register("stats.refresh", refresh)
+
+# ---------------------------------------------------------
+# PUBLIC API
+# ---------------------------------------------------------
+def get_stats_many(rel_paths):
+    """
+    Returns {rel_path: stats}. Fresh entries cost one stat() each. Stories
+    never seen before are parsed inline (unless another process stored
+    them meanwhile); stories that changed since they
+    were cached (or by an older version of this module) are served
+    from the old entry (with an up to date date) while a background job
+    recomputes them.
+    """
+    results = {}
+    missing = []
+    stale = []
+    with _lock:
+        cache = _load()
+        for rel_path in rel_paths:
+            sig = _stat(rel_path)
+            if not sig:
+                results[rel_path] = _empty_stats()
+                continue
+            entry = cache.get(rel_path)
+            if entry and _is_current(entry, sig):
+                results[rel_path] = entry["stats"]
+                if not _is_complete(entry): stale.append((rel_path, sig))
+            elif entry:
+                date_str = datetime.fromtimestamp(sig[1]).strftime('%Y-%m-%d')
+                results[rel_path] = dict(entry["stats"], date=date_str)
+                stale.append((rel_path, sig))
+            else:
+                missing.append((rel_path, sig))
+
+    if missing or stale:
+        # Another process may have analysed them already
+        adopted = set(_adopt(dict(missing + stale)))
+        with _lock:
+            for rel_path in adopted: results[rel_path] = _cache[rel_path]["stats"]
+        missing = [(p, sig) for p, sig in missing if p not in adopted]
+        stale = [p for p, _ in stale if p not in adopted]
+    for rel_path, sig in missing: results[rel_path] = _compute(rel_path, sig)
+    _save([rel_path for rel_path, _ in missing])
+    if stale: schedule_refresh(stale)
+    return results
+
+def store_many(entries):
+    """Stores stats computed elsewhere: {rel_path: ((size, mtime), stats, speakers)}."""
+    with _lock:
+        for rel_path, (sig, stats, speakers) in entries.items():
+            _put(rel_path, _entry(sig, stats, speakers))
+    _save(list(entries))
+
+def get_stats(rel_path):
+    return get_stats_many([rel_path])[rel_path]
+
+def remove_story(rel_path):
+    with _lock:
+        if rel_path not in _load(): return
+        _put(rel_path, None)
+    _save([rel_path])
+
+def move_story(old_rel_path, new_rel_path):
+    with _lock:
+        entry = _load().get(old_rel_path)
+        if entry:
+            _put(old_rel_path, None)
+            _put(new_rel_path, entry)
+    if entry:
+        _save([old_rel_path, new_rel_path])
+        return
+    schedule_refresh([new_rel_path])
+
+# ---------------------------------------------------------
+# ANALYTICS
+# ---------------------------------------------------------
+# Read from the cache alone, so pages built on them never open a story.
+# Stories not analysed yet count as empty until their refresh job (or
+# sync()) has run.
+def get_speakers_many(rel_paths):
+    """{rel_path: {raw speaker ("" = narration): {"messages", "words", "actions", "ooc"}}}."""
+    with _lock:
+        cache = _load()
+        return {rel_path: (cache.get(rel_path) or {}).get("speakers") or {} for rel_path in rel_paths}
+
+def get_msg_counts_many(rel_paths):
+    """{rel_path: msg_count} (0 for stories not analysed yet)."""
+    with _lock:
+        cache = _load()
+        return {rel_path: (cache.get(rel_path) or {}).get("stats", {}).get("msg_count", 0) for rel_path in rel_paths}
+
+def changes_since(generation):
+    """(current generation, rel paths whose entry was added, replaced or removed after generation)."""
+    with _lock:
+        if generation == _generation: return generation, []
+        return _generation, [p for p, changed in _changed.items() if changed > generation]
+
+def get_campaign_totals():
+    """{campaign folder ("" = root): {"stories", "messages", "words", "actions", "ooc"}}."""
+    with _lock:
+        _load()
+        return {folder: dict(totals) for folder, totals in _campaigns.items()}
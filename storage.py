@@ -0,0 +1,513 @@
+import os
+import sys
+import copy
+import json
+import atexit
+import sqlite3
+import threading
+
+# CONFIG
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+SQLITE_DB_FILE = os.path.join(DATA_DIR, "storybox.db")
+
+# "sqlite" (default) or "json" for the legacy flat files
+STORAGE_BACKEND = os.environ.get("STORYBOX_STORAGE", "sqlite").lower()
+# JSON writes made within this window are coalesced into one flush
+FLUSH_DELAY_SECONDS = float(os.environ.get("STORYBOX_FLUSH_DELAY", "0.5"))
+
+# Collection name -> legacy JSON file it replaces
+JSON_FILES = {
+    "characters": "characters.json",
+    "story_meta": "stories_meta.json",
+    "story_map": "story_map.json",
+    "story_player_map": "story_player_map.json",
+    "prompts": "prompts.json",
+}
+
+# Document collections map key -> JSON document. Mapping collections map
+# key -> {subkey: value} and are stored one row per (key, subkey).
+DOCUMENT_TABLES = {
+    "characters": ("characters", "id"),
+    "story_meta": ("story_meta", "path"),
+    "prompts": ("prompts", "id"),
+}
+MAPPING_TABLES = {
+    "story_map": ("story_map", "filename", "raw_name", "char_id"),
+    "story_player_map": ("story_player_map", "filename", "char_id", "player"),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS characters (id TEXT PRIMARY KEY, data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS story_meta (path TEXT PRIMARY KEY, data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS prompts (id TEXT PRIMARY KEY, data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS story_map (
+    filename TEXT NOT NULL, raw_name TEXT NOT NULL, char_id TEXT NOT NULL,
+    PRIMARY KEY (filename, raw_name)
+);
+CREATE INDEX IF NOT EXISTS idx_story_map_char ON story_map (char_id);
+CREATE INDEX IF NOT EXISTS idx_story_map_name ON story_map (raw_name);
+CREATE TABLE IF NOT EXISTS story_player_map (
+    filename TEXT NOT NULL, char_id TEXT NOT NULL, player TEXT NOT NULL,
+    PRIMARY KEY (filename, char_id)
+);
+CREATE INDEX IF NOT EXISTS idx_story_player_char ON story_player_map (char_id);
+CREATE TABLE IF NOT EXISTS storage_info (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+os.makedirs(DATA_DIR, exist_ok=True)
+
+# ---------------------------------------------------------
+# WRITE-BEHIND JSON FILES
+# ---------------------------------------------------------
+def atomic_write_json(filepath, data):
+    """Compact dump to a temp file that replaces the target, so a crash never leaves half a file."""
+    tmp_path = f"{filepath}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, separators=(",", ":"))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, filepath)
+
+_writers = []
+_writers_lock = threading.Lock()
+
+class DeferredWriter:
+    """
+    Coalesces saves of one JSON file. mark_dirty() arms a timer and every
+    mutation made before it fires shares a single atomic write. The owner
+    keeps serving reads from memory, so pending changes are always visible.
+    """
+    def __init__(self, filepath, get_data, lock, on_flushed=None):
+        self.filepath = filepath
+        self.get_data = get_data
+        self.lock = lock
+        self.on_flushed = on_flushed
+        self.dirty = False
+        self._timer = None
+        with _writers_lock: _writers.append(self)
+
+    def mark_dirty(self):
+        with self.lock:
+            self.dirty = True
+            if self._timer is None:
+                self._timer = threading.Timer(FLUSH_DELAY_SECONDS, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        with self.lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self.dirty: return
+            atomic_write_json(self.filepath, self.get_data())
+            self.dirty = False
+            if self.on_flushed: self.on_flushed()
+
+def flush_all():
+    """Writes out every pending JSON change; called on shutdown and at exit."""
+    with _writers_lock: writers = list(_writers)
+    for writer in writers:
+        try: writer.flush()
+        except Exception as e: print(f"Flush Error ({writer.filepath}): {e}")
+
+atexit.register(flush_all)
+
+# ---------------------------------------------------------
+# JSON BACKEND (legacy flat files)
+# ---------------------------------------------------------
+class JsonDocumentStore:
+    """
+    One JSON object per file. The parsed file is kept in memory and only
+    re-read when its mtime/size change; writes are coalesced by a
+    DeferredWriter.
+    """
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self._data = None
+        self._sig = None
+        self._lock = threading.RLock()
+        self._writer = DeferredWriter(filepath, lambda: self._data, self._lock, self._on_flushed)
+
+    def _on_flushed(self):
+        self._sig = self._signature()
+
+    def _signature(self):
+        try:
+            st = os.stat(self.filepath)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError: return None
+
+    def _load(self):
+        with self._lock:
+            # Unflushed changes win over whatever is on disk
+            if self._writer.dirty: return self._data
+            sig = self._signature()
+            if self._data is None or sig != self._sig:
+                data = {}
+                if sig is not None:
+                    try:
+                        with open(self.filepath, 'r', encoding='utf-8') as f: data = json.load(f)
+                    except: data = {}
+                self._data = data
+                self._sig = sig
+            return self._data
+
+    def _save(self):
+        self._writer.mark_dirty()
+
+    def get(self, key):
+        with self._lock: return copy.deepcopy(self._load().get(key))
+
+    def get_many(self, keys):
+        """{key: value} for the keys that exist."""
+        with self._lock:
+            data = self._load()
+            return {key: copy.deepcopy(data[key]) for key in keys if key in data}
+
+    def all(self):
+        """Shallow copy of the whole collection; treat the values as read-only."""
+        with self._lock: return dict(self._load())
+
+    def put(self, key, value):
+        with self._lock:
+            self._load()[key] = value
+            self._save()
+
+    def put_many(self, items):
+        with self._lock:
+            self._load().update(items)
+            self._save()
+
+    def delete(self, key):
+        with self._lock:
+            data = self._load()
+            if key in data:
+                del data[key]
+                self._save()
+
+    def rename(self, old_key, new_key):
+        with self._lock:
+            data = self._load()
+            if old_key in data:
+                data[new_key] = data.pop(old_key)
+                self._save()
+
+    def replace_all(self, data):
+        with self._lock:
+            self._data = dict(data)
+            self._save()
+
+class JsonMappingStore(JsonDocumentStore):
+    """
+    Also keeps reverse indexes (value -> keys, subkey -> {key: value}), so
+    the lookups by value or subkey don't scan every mapping. They are
+    rebuilt whenever the file is (re)loaded and updated by every write.
+    """
+    def __init__(self, filepath):
+        super().__init__(filepath)
+        self._indexed = None  # the loaded data the indexes describe
+        self._by_value = {}   # value -> {key: number of its subkeys with that value}
+        self._by_subkey = {}  # subkey -> {key: value}
+
+    def _index(self):
+        data = self._load()
+        if data is not self._indexed:
+            self._by_value, self._by_subkey = {}, {}
+            for key, mapping in data.items(): self._index_mapping(key, mapping, True)
+            self._indexed = data
+        return data
+
+    def _index_entry(self, key, subkey, value, add):
+        keys = self._by_value.setdefault(value, {})
+        keys[key] = keys.get(key, 0) + (1 if add else -1)
+        if keys[key] <= 0: del keys[key]
+        if not keys: del self._by_value[value]
+        owners = self._by_subkey.setdefault(subkey, {})
+        if add: owners[key] = value
+        else: owners.pop(key, None)
+        if not owners: del self._by_subkey[subkey]
+
+    def _index_mapping(self, key, mapping, add):
+        for subkey, value in (mapping or {}).items(): self._index_entry(key, subkey, value, add)
+
+    def get(self, key):
+        return super().get(key) or {}
+
+    def put(self, key, value):
+        with self._lock:
+            data = self._index()
+            self._index_mapping(key, data.get(key), False)
+            data[key] = value
+            self._index_mapping(key, value, True)
+            self._save()
+
+    def put_many(self, items):
+        with self._lock:
+            for key, value in items.items(): self.put(key, value)
+
+    def delete(self, key):
+        with self._lock:
+            data = self._index()
+            if key in data:
+                self._index_mapping(key, data.pop(key), False)
+                self._save()
+
+    def rename(self, old_key, new_key):
+        with self._lock:
+            data = self._index()
+            if old_key in data:
+                mapping = data[old_key]
+                self.delete(old_key)
+                self.put(new_key, mapping)
+
+    def set_entry(self, key, subkey, value):
+        with self._lock:
+            mapping = self._index().setdefault(key, {})
+            if subkey in mapping: self._index_entry(key, subkey, mapping[subkey], False)
+            mapping[subkey] = value
+            self._index_entry(key, subkey, value, True)
+            self._save()
+
+    def delete_entry(self, key, subkey):
+        with self._lock:
+            mapping = self._index().get(key)
+            if mapping and subkey in mapping:
+                self._index_entry(key, subkey, mapping.pop(subkey), False)
+                self._save()
+
+    def delete_value(self, value):
+        """Removes every entry (in any mapping) that has this value."""
+        with self._lock:
+            data = self._index()
+            for key in list(self._by_value.get(value, {})):
+                for subkey in [s for s, v in data[key].items() if v == value]: self.delete_entry(key, subkey)
+
+    def delete_subkey(self, subkey):
+        """Removes subkey from every mapping."""
+        with self._lock:
+            self._index()
+            for key in list(self._by_subkey.get(subkey, {})): self.delete_entry(key, subkey)
+
+    def keys_with_value(self, value):
+        with self._lock:
+            self._index()
+            return list(self._by_value.get(value, {}))
+
+    def values_for_subkey(self, subkey):
+        with self._lock:
+            self._index()
+            return set(self._by_subkey.get(subkey, {}).values())
+
+# ---------------------------------------------------------
+# SQLITE BACKEND
+# ---------------------------------------------------------
+class SqliteBackend:
+    def __init__(self, db_path, schema=SCHEMA):
+        self.db_path = db_path
+        self._local = threading.local()
+        with self.connection() as conn: conn.executescript(schema)
+
+    def connection(self):
+        """One connection per thread; used as a context manager it is a transaction."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_info(self, key):
+        row = self.connection().execute("SELECT value FROM storage_info WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_info(self, key, value):
+        with self.connection() as conn:
+            conn.execute("INSERT OR REPLACE INTO storage_info (key, value) VALUES (?, ?)", (key, value))
+
+class SqliteDocumentStore:
+    def __init__(self, backend, table, key_col):
+        self.backend = backend
+        self.table = table
+        self.key_col = key_col
+
+    def get(self, key):
+        row = self.backend.connection().execute(f"SELECT data FROM {self.table} WHERE {self.key_col} = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_many(self, keys):
+        """{key: value} for the keys that exist."""
+        keys = list(keys)
+        found = {}
+        # Stays under SQLite's bound-parameter limit
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            rows = self.backend.connection().execute(
+                f"SELECT {self.key_col}, data FROM {self.table} WHERE {self.key_col} IN ({', '.join('?' * len(chunk))})", chunk)
+            found.update((key, json.loads(data)) for key, data in rows)
+        return found
+
+    def all(self):
+        rows = self.backend.connection().execute(f"SELECT {self.key_col}, data FROM {self.table} ORDER BY rowid")
+        return {key: json.loads(data) for key, data in rows}
+
+    def _upsert(self):
+        # An upsert keeps an edited row's rowid, so all() keeps its order
+        return (f"INSERT INTO {self.table} ({self.key_col}, data) VALUES (?, ?) "
+                f"ON CONFLICT ({self.key_col}) DO UPDATE SET data = excluded.data")
+
+    def put(self, key, value):
+        with self.backend.connection() as conn:
+            conn.execute(self._upsert(), (key, json.dumps(value)))
+
+    def put_many(self, items):
+        with self.backend.connection() as conn:
+            conn.executemany(self._upsert(), [(key, json.dumps(value)) for key, value in items.items()])
+
+    def delete(self, key):
+        with self.backend.connection() as conn:
+            conn.execute(f"DELETE FROM {self.table} WHERE {self.key_col} = ?", (key,))
+
+    def rename(self, old_key, new_key):
+        with self.backend.connection() as conn:
+            conn.execute(f"DELETE FROM {self.table} WHERE {self.key_col} = ?", (new_key,))
+            conn.execute(f"UPDATE {self.table} SET {self.key_col} = ? WHERE {self.key_col} = ?", (new_key, old_key))
+
+    def replace_all(self, data):
+        with self.backend.connection() as conn:
+            conn.execute(f"DELETE FROM {self.table}")
+            conn.executemany(f"INSERT INTO {self.table} ({self.key_col}, data) VALUES (?, ?)",
+                             [(key, json.dumps(value)) for key, value in data.items()])
+
+class SqliteMappingStore:
+    def __init__(self, backend, table, key_col, sub_col, val_col):
+        self.backend = backend
+        self.table = table
+        self.key_col = key_col
+        self.sub_col = sub_col
+        self.val_col = val_col
+
+    def get(self, key):
+        rows = self.backend.connection().execute(
+            f"SELECT {self.sub_col}, {self.val_col} FROM {self.table} WHERE {self.key_col} = ? ORDER BY rowid", (key,))
+        return dict(rows)
+
+    def all(self):
+        data = {}
+        rows = self.backend.connection().execute(f"SELECT {self.key_col}, {self.sub_col}, {self.val_col} FROM {self.table} ORDER BY rowid")
+        for key, subkey, value in rows: data.setdefault(key, {})[subkey] = value
+        return data
+
+    def set_entry(self, key, subkey, value):
+        with self.backend.connection() as conn:
+            conn.execute(f"INSERT INTO {self.table} ({self.key_col}, {self.sub_col}, {self.val_col}) VALUES (?, ?, ?) "
+                         f"ON CONFLICT ({self.key_col}, {self.sub_col}) DO UPDATE SET {self.val_col} = excluded.{self.val_col}",
+                         (key, subkey, value))
+
+    def delete_entry(self, key, subkey):
+        with self.backend.connection() as conn:
+            conn.execute(f"DELETE FROM {self.table} WHERE {self.key_col} = ? AND {self.sub_col} = ?", (key, subkey))
+
+    def delete_value(self, value):
+        """Removes every entry (in any mapping) that has this value."""
+        with self.backend.connection() as conn:
+            conn.execute(f"DELETE FROM {self.table} WHERE {self.val_col} = ?", (value,))
+
+    def delete_subkey(self, subkey):
+        """Removes subkey from every mapping."""
+        with self.backend.connection() as conn:
+            conn.execute(f"DELETE FROM {self.table} WHERE {self.sub_col} = ?", (subkey,))
+
+    def put(self, key, mapping):
+        with self.backend.connection() as conn:
+            conn.execute(f"DELETE FROM {self.table} WHERE {self.key_col} = ?", (key,))
+            conn.executemany(f"INSERT INTO {self.table} ({self.key_col}, {self.sub_col}, {self.val_col}) VALUES (?, ?, ?)",
+                             [(key, subkey, value) for subkey, value in mapping.items()])
+
+    def delete(self, key):
+        with self.backend.connection() as conn:
+            conn.execute(f"DELETE FROM {self.table} WHERE {self.key_col} = ?", (key,))
+
+    def rename(self, old_key, new_key):
+        with self.backend.connection() as conn:
+            conn.execute(f"DELETE FROM {self.table} WHERE {self.key_col} = ?", (new_key,))
+            conn.execute(f"UPDATE {self.table} SET {self.key_col} = ? WHERE {self.key_col} = ?", (new_key, old_key))
+
+    def keys_with_value(self, value):
+        rows = self.backend.connection().execute(
+            f"SELECT {self.key_col} FROM {self.table} WHERE {self.val_col} = ? GROUP BY {self.key_col} ORDER BY MIN(rowid)", (value,))
+        return [row[0] for row in rows]
+
+    def values_for_subkey(self, subkey):
+        rows = self.backend.connection().execute(f"SELECT DISTINCT {self.val_col} FROM {self.table} WHERE {self.sub_col} = ?", (subkey,))
+        return {row[0] for row in rows}
+
+    def replace_all(self, data):
+        with self.backend.connection() as conn:
+            conn.execute(f"DELETE FROM {self.table}")
+            conn.executemany(f"INSERT INTO {self.table} ({self.key_col}, {self.sub_col}, {self.val_col}) VALUES (?, ?, ?)",
+                             [(key, subkey, value) for key, mapping in data.items() for subkey, value in mapping.items()])
+
+# ---------------------------------------------------------
+# MIGRATION
+# ---------------------------------------------------------
+def _read_json_file(filename):
+    path = os.path.join(DATA_DIR, filename)
+    if not os.path.exists(path): return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f: return json.load(f)
+    except: return None
+
+def migrate_json_to_sqlite(backend, force=False):
+    """
+    Copies the legacy JSON files into SQLite once. The JSON files are left
+    untouched, so switching STORYBOX_STORAGE back to "json" still works.
+    """
+    if backend.get_info("json_migrated") and not force: return False
+    for name, filename in JSON_FILES.items():
+        data = _read_json_file(filename)
+        if not isinstance(data, dict): continue
+        if name in MAPPING_TABLES:
+            data = {k: v for k, v in data.items() if isinstance(v, dict)}
+        _make_store(backend, name).replace_all(data)
+    backend.set_info("json_migrated", "1")
+    return True
+
+# ---------------------------------------------------------
+# STORE REGISTRY
+# ---------------------------------------------------------
+_stores = {}
+_backend = None
+_registry_lock = threading.Lock()
+
+def _make_store(backend, name):
+    if name in DOCUMENT_TABLES: return SqliteDocumentStore(backend, *DOCUMENT_TABLES[name])
+    return SqliteMappingStore(backend, *MAPPING_TABLES[name])
+
+def _get_backend():
+    global _backend
+    if _backend is None:
+        _backend = SqliteBackend(SQLITE_DB_FILE)
+        migrate_json_to_sqlite(_backend)
+    return _backend
+
+def get_store(name):
+    """Returns the collection `name` (see JSON_FILES) for the configured backend."""
+    with _registry_lock:
+        if name not in _stores:
+            if STORAGE_BACKEND == "json":
+                path = os.path.join(DATA_DIR, JSON_FILES[name])
+                _stores[name] = JsonMappingStore(path) if name in MAPPING_TABLES else JsonDocumentStore(path)
+            else:
+                _stores[name] = _make_store(_get_backend(), name)
+        return _stores[name]
+
+if __name__ == "__main__":
+    # python storage.py migrate  -> re-import the JSON files into SQLite
+    if len(sys.argv) > 1 and sys.argv[1] == "migrate":
+        migrate_json_to_sqlite(SqliteBackend(SQLITE_DB_FILE), force=True)
+        print(f"Migrated JSON stores into {SQLITE_DB_FILE}")
+    else:
+        print("Usage: python storage.py migrate")
@@ -1,9 +1,23 @@
 import os
-import json
+import time
+import heapq
+import bisect
 import shutil
 import hashlib
+import itertools
+import threading
 from datetime import datetime
 
+import storage
+import search_index
+import story_parser
+import stats_cache
+import image_manager
+import character_manager
+import job_queue
+import story_watcher
+import tag_index
+
 # CONFIG
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 STORY_DIR = os.path.join(BASE_DIR, "stories")
@@ -19,63 +33,69 @@ os.makedirs(BACKGROUND_DIR, exist_ok=True)
 # ---------------------------------------------------------
 # METADATA DB
 # ---------------------------------------------------------
+meta_store = storage.get_store("story_meta")
+
 def load_meta():
-    if not os.path.exists(META_DB_FILE): return {}
-    try:
-        with open(META_DB_FILE, 'r', encoding='utf-8') as f: return json.load(f)
-    except: return {}
+    return meta_store.all()
 
 def save_meta(data):
-    with open(META_DB_FILE, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=4)
+    meta_store.replace_all(data)
+    tag_index.reset("stories")
+    _meta_changed(None)
+
+def _default_meta(rel_path):
+    return {
+        "display_title": os.path.basename(rel_path).replace(".txt", ""),
+        "synopsis": "No synopsis written.",
+        "tags": [],
+        "rating": 0,
+        "format_type": "star_rp",
+        "background_file": None,
+        "created_at": datetime.now().strftime("%Y-%m-%d")
+    }
 
 def get_story_meta(rel_path):
-    db = load_meta()
-    
-    # Create default if missing
-    if rel_path not in db:
-        db[rel_path] = {
-            "display_title": os.path.basename(rel_path).replace(".txt", ""),
-            "synopsis": "No synopsis written.",
-            "tags": [],
-            "rating": 0,
-            "format_type": "star_rp",
-            "background_file": None,
-            "created_at": datetime.now().strftime("%Y-%m-%d")
-        }
-        save_meta(db)
-    
-    # Backwards compatibility checks
-    entry = db[rel_path]
-    dirty = False
-    
-    if "rating" not in entry:
-        entry["rating"] = 0
-        dirty = True
+    """
+    Read-only lookup. Defaults for unknown stories and missing fields are
+    filled in on the returned entry; they reach storage with the next write.
+    """
+    entry = meta_store.get(rel_path)
+    if entry is None: entry = _default_meta(rel_path)
         
-    if "format_type" not in entry:
-        entry["format_type"] = "star_rp"
-        dirty = True
-        
-    if dirty:
-        save_meta(db)
+    # Backwards compatibility checks
+    if "rating" not in entry: entry["rating"] = 0
+    if "format_type" not in entry: entry["format_type"] = "star_rp"
         
     return entry
 
 def update_story_meta(rel_path, title, synopsis, tags, rating=0, format_type="star_rp", background_file=None):
-    db = load_meta()
-    if rel_path not in db: db[rel_path] = {}
+    entry = meta_store.get(rel_path) or _default_meta(rel_path)
+    if entry.get("format_type", "star_rp") != format_type:
+        story_parser.invalidate_parse_cache(os.path.join(STORY_DIR, rel_path))
     
-    db[rel_path]["display_title"] = title
-    db[rel_path]["synopsis"] = synopsis
-    db[rel_path]["tags"] = tags
-    db[rel_path]["rating"] = int(rating)
-    db[rel_path]["format_type"] = format_type
+    entry["display_title"] = title
+    entry["synopsis"] = synopsis
+    entry["tags"] = tags
+    entry["rating"] = int(rating)
+    entry["format_type"] = format_type
     
     if background_file: 
-        db[rel_path]["background_file"] = background_file
+        entry["background_file"] = background_file
         
-    save_meta(db)
+    meta_store.put(rel_path, entry)
+    tag_index.set_tags("stories", rel_path, tags)
+    _meta_changed([rel_path])
+
+def init_story_meta_many(titles):
+    """Default metadata for new stories in one write: {rel_path: display title}."""
+    entries = {}
+    for rel_path, title in titles.items():
+        entries[rel_path] = _default_meta(rel_path)
+        if title: entries[rel_path]["display_title"] = title
+    if entries:
+        meta_store.put_many(entries)
+        tag_index.set_tags_many("stories", {rel_path: entry["tags"] for rel_path, entry in entries.items()})
+        _meta_changed(entries)
 
 def save_story_background(rel_path, file_object, original_filename):
     ext = os.path.splitext(original_filename)[1]
@@ -84,38 +104,60 @@ def save_story_background(rel_path, file_object, original_filename):
     
     with open(file_path, "wb+") as dest:
         shutil.copyfileobj(file_object, dest)
+    image_manager.schedule_derivatives("backgrounds", safe_name)
         
-    db = load_meta()
-    if rel_path not in db: get_story_meta(rel_path)
-    db = load_meta() # Reload to be safe
-    db[rel_path]["background_file"] = safe_name
-    save_meta(db)
+    entry = meta_store.get(rel_path) or _default_meta(rel_path)
+    entry["background_file"] = safe_name
+    meta_store.put(rel_path, entry)
     return safe_name
 
 # ---------------------------------------------------------
 # ORACLE: SEARCH ENGINE
 # ---------------------------------------------------------
+def _format_match(line, query):
+    clean_line = line.strip()
+    # Truncate extremely long lines for display
+    if len(clean_line) > 150:
+        idx = clean_line.lower().find(query)
+        start = max(0, idx - 50)
+        end = min(len(clean_line), idx + 100)
+        clean_line = "..." + clean_line[start:end] + "..."
+    return clean_line
+
+def _scan_story_lines(full_path, query):
+    matches = []
+    with open(full_path, 'r', encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            if query in line.lower():
+                matches.append(_format_match(line, query))
+                if len(matches) >= 3: break # Limit matches per file
+    return matches
+
+def _read_indexed_lines(full_path, offsets, query):
+    matches = []
+    with open(full_path, 'rb') as f:
+        for offset in offsets:
+            line = search_index.read_line(f, offset)
+            if query in line.lower():
+                matches.append(_format_match(line, query))
+                if len(matches) >= 3: break # Limit matches per file
+    return matches
+
 def search_stories(query):
     results = []
     query = query.lower()
     all_files = get_all_stories_flat()
+    # While the watcher runs it keeps the index current
+    if not story_watcher.is_running(): search_index.sync(all_files)
+    candidates = search_index.find_candidates(query)
     
     for rel_path in all_files:
         full_path = os.path.join(STORY_DIR, rel_path)
-        matches = []
         try:
-            with open(full_path, 'r', encoding='utf-8', errors='ignore') as f:
-                for i, line in enumerate(f):
-                    if query in line.lower():
-                        clean_line = line.strip()
-                        # Truncate extremely long lines for display
-                        if len(clean_line) > 150:
-                            idx = clean_line.lower().find(query)
-                            start = max(0, idx - 50)
-                            end = min(len(clean_line), idx + 100)
-                            clean_line = "..." + clean_line[start:end] + "..."
-                        matches.append(clean_line)
-                        if len(matches) >= 3: break # Limit matches per file
+            # Queries without any word characters can't use the index
+            if candidates is None: matches = _scan_story_lines(full_path, query)
+            elif rel_path in candidates: matches = _read_indexed_lines(full_path, candidates[rel_path], query)
+            else: continue
             if matches:
                 meta = get_story_meta(rel_path)
                 results.append({
@@ -127,52 +169,303 @@ def search_stories(query):
     return results
 
 # ---------------------------------------------------------
-# FILE OPERATIONS
+# CATALOG
 # ---------------------------------------------------------
+# Every listing is answered from one in-memory catalog of the stories
+# folder. While story_watcher runs it's built from the watcher's snapshot,
+# and only folders the snapshot replaced are built again. With the watcher
+# off it comes from one scandir pass, redone after CATALOG_TTL_SECONDS or
+# as soon as the app reports a change of its own.
+CATALOG_TTL_SECONDS = 2.0
+
+# campaign folder ("" = root) -> {"files": the snapshot dict it was built
+# from, "campaign": display name, "stories": {rel_path: (size, mtime)},
+# "recent": [(mtime, rel_path)] newest first, sorted when first asked for}
+_catalog = {}
+_catalog_source = None      # the snapshot _catalog was built from (None: scanned)
+_catalog_version = None     # story_watcher.version() when scanned
+_catalog_expires = 0
+_catalog_lock = threading.Lock()
+
+def _catalog_folder(campaign, files):
+    stories = {(os.path.join(campaign, f) if campaign else f): (sig[2], sig[1]) for f, sig in files.items()}
+    return {"files": files, "campaign": campaign or "Unsorted", "stories": stories, "recent": None}
+
+def _folders():
+    """The current catalog: {campaign folder: folder entry}. Don't modify it."""
+    global _catalog, _catalog_source, _catalog_version, _catalog_expires
+    with _catalog_lock:
+        snapshot = story_watcher.snapshot()
+        if snapshot is None:
+            version = story_watcher.version()
+            if _catalog_source is None and _catalog_version == version and time.time() < _catalog_expires: return _catalog
+            source = story_watcher.scan()
+            _catalog_version, _catalog_expires = version, time.time() + CATALOG_TTL_SECONDS
+        elif snapshot is _catalog_source: return _catalog
+        else: source = snapshot
+        old = _catalog
+        _catalog = {camp: old[camp] if camp in old and old[camp]["files"] is files else _catalog_folder(camp, files) for camp, files in source.items()}
+        _catalog_source = snapshot
+        return _catalog
+
+def _recent(folder):
+    if folder["recent"] is None: folder["recent"] = sorted(((sig[1], p) for p, sig in folder["stories"].items()), reverse=True)
+    return folder["recent"]
+
+def _campaign_folder(campaign):
+    return "" if campaign == "Unsorted" else campaign
+
+def _folder_of(rel_path):
+    return rel_path.replace("\\", "/").rpartition("/")[0]
+
+def story_exists(rel_path):
+    folder = _folders().get(_folder_of(rel_path))
+    return bool(folder) and rel_path in folder["stories"]
+
+def get_story_signatures(rel_paths):
+    """{rel_path: (size, mtime)} as the catalog last saw them; None for unknown stories."""
+    stories = {}
+    for folder in _folders().values(): stories.update(folder["stories"])
+    return {rel_path: stories.get(rel_path) for rel_path in rel_paths}
+
 def get_campaigns():
-    items = os.listdir(STORY_DIR)
-    campaigns = [d for d in items if os.path.isdir(os.path.join(STORY_DIR, d))]
-    return ["Unsorted"] + campaigns
+    return ["Unsorted"] + [camp for camp in _folders() if camp]
+
+def sanitize_campaign_name(name):
+    return "".join([c for c in name if c.isalnum() or c in " _-"]).strip()
 
 def create_campaign(name):
-    safe_name = "".join([c for c in name if c.isalnum() or c in " _-"]).strip()
+    safe_name = sanitize_campaign_name(name)
     path = os.path.join(STORY_DIR, safe_name)
     if not os.path.exists(path): os.makedirs(path)
+    story_watcher.add_campaign(safe_name)
+    return safe_name
 
 def list_stories_by_campaign():
-    structure = {"Unsorted": []}
-    for f in os.listdir(STORY_DIR):
-        if f.endswith(".txt"): structure["Unsorted"].append(f)
-    
-    campaigns = get_campaigns()
-    for camp in campaigns:
-        if camp == "Unsorted": continue
-        camp_path = os.path.join(STORY_DIR, camp)
-        structure[camp] = []
-        for f in os.listdir(camp_path):
-            if f.endswith(".txt"): structure[camp].append(os.path.join(camp, f))
-    return structure
+    return {folder["campaign"]: list(folder["stories"]) for folder in _folders().values()}
+
+def get_campaign_stories(campaign):
+    """Rel paths of one campaign's stories ("Unsorted" = the root folder)."""
+    folder = _folders().get(_campaign_folder(campaign))
+    return list(folder["stories"]) if folder else []
 
 def get_all_stories_flat():
-    files = []
-    # Root
-    for f in os.listdir(STORY_DIR):
-        if f.endswith(".txt"): files.append(f)
-    # Campaigns
-    for d in os.listdir(STORY_DIR):
-        d_path = os.path.join(STORY_DIR, d)
-        if os.path.isdir(d_path):
-            for f in os.listdir(d_path):
-                if f.endswith(".txt"): files.append(os.path.join(d, f))
-    return files
+    return [rel_path for folder in _folders().values() for rel_path in folder["stories"]]
 
 def get_recent_stories(limit=5):
-    all_files = get_all_stories_flat()
-    all_files.sort(key=lambda x: os.path.getmtime(os.path.join(STORY_DIR, x)), reverse=True)
-    return all_files[:limit]
+    # Each folder's list is sorted once per change, so this only merges their heads
+    merged = heapq.merge(*(_recent(folder) for folder in _folders().values()), reverse=True)
+    return [rel_path for _, rel_path in itertools.islice(merged, limit)]
 
 def get_total_story_count():
-    return len(get_all_stories_flat())
+    return sum(len(folder["stories"]) for folder in _folders().values())
+
+# ---------------------------------------------------------
+# LISTING
+# ---------------------------------------------------------
+# The stories page is filtered and sorted on keys precomputed per story
+# from the catalog, the metadata and stats_cache. Keys are rebuilt only
+# for stories that changed (catalog folders that were replaced, metadata
+# writes below, stats_cache.changes_since()); each sort order is sorted
+# once and changed stories are then moved within it. Only the stories on
+# the requested page load their metadata and stats. Tag filters and
+# counts come from tag_index.
+SORT_FIELDS = ("date", "title", "rating", "messages")
+FORMAT_TYPES = ("star_rp", "markdown", "novel")
+STORIES_PAGE_SIZE = 48
+MAX_PAGE_SIZE = 200
+REORDER_LIMIT = 64          # more changed stories than this and the sort orders are rebuilt from scratch
+
+# {"folders": catalog it was built from, "stats": stats_cache generation,
+#  "keys": {rel_path: key}, "orders": {(sort, descending): [rel_paths]},
+#  "speakers": {lowercased name: set of rel_paths},
+#  "labels": {lowercased speaker: name as first seen}}
+_listing = None
+_listing_dirty = set()      # rel paths whose metadata changed since the last refresh
+_listing_lock = threading.Lock()
+
+def _meta_changed(rel_paths):
+    """Marks stories for the listing; None means all of them."""
+    global _listing
+    with _listing_lock:
+        if rel_paths is None: _listing = None
+        else: _listing_dirty.update(rel_paths)
+
+def _listing_key(rel_path, sig, meta, speakers, msg_count):
+    meta = meta or _default_meta(rel_path)
+    return {
+        "title": str(meta.get("display_title") or "").lower(),
+        "date": sig[1],
+        "rating": int(meta.get("rating") or 0),
+        "messages": msg_count,
+        "format": meta.get("format_type") or "star_rp",
+        # lowercased -> as written; filters ignore case
+        "speakers": {name.lower(): name for name, counts in speakers.items() if name and counts["messages"]},
+    }
+
+def _index_key(listing, rel_path, key, add):
+    index, labels = listing["speakers"], listing["labels"]
+    for name, label in key["speakers"].items():
+        if add:
+            index.setdefault(name, set()).add(rel_path)
+            labels.setdefault(name, label)
+        elif name in index:
+            index[name].discard(rel_path)
+            if not index[name]: del index[name], labels[name]
+
+def _rekey(listing, folders, rel_paths):
+    sigs = {}
+    for rel_path in rel_paths:
+        folder = folders.get(_folder_of(rel_path))
+        if folder and rel_path in folder["stories"]: sigs[rel_path] = folder["stories"][rel_path]
+    metas = meta_store.get_many(sigs)
+    speakers = stats_cache.get_speakers_many(sigs)
+    msg_counts = stats_cache.get_msg_counts_many(sigs)
+    keys = listing["keys"]
+    had_key = []
+    for rel_path in rel_paths:
+        old = keys.pop(rel_path, None)
+        if old:
+            _index_key(listing, rel_path, old, False)
+            had_key.append(rel_path)
+        if rel_path not in sigs: continue
+        keys[rel_path] = _listing_key(rel_path, sigs[rel_path], metas.get(rel_path), speakers[rel_path], msg_counts[rel_path])
+        _index_key(listing, rel_path, keys[rel_path], True)
+    _reorder(listing, rel_paths, had_key)
+
+def _reorder(listing, rel_paths, had_key):
+    """Moves changed stories to their new place in every cached sort order."""
+    keys, orders = listing["keys"], listing["orders"]
+    orders.pop(("title", True), None)  # derived from the ascending one
+    if len(rel_paths) > REORDER_LIMIT:
+        orders.clear()
+        return
+    for (sort, descending), order in orders.items():
+        key_fn = _sort_key(sort, descending)
+        for rel_path in had_key: order.remove(rel_path)
+        for rel_path in rel_paths:
+            if rel_path in keys: bisect.insort(order, rel_path, key=lambda p: key_fn((p, keys[p])))
+
+def _listing_index():
+    global _listing
+    folders = _folders()
+    with _listing_lock:
+        listing = _listing or {"folders": {}, "stats": 0, "keys": {}, "orders": {}, "speakers": {}, "labels": {}}
+        dirty = set(_listing_dirty)
+        _listing_dirty.clear()
+        generation, changed = stats_cache.changes_since(listing["stats"])
+        dirty.update(changed)
+        old_folders = listing["folders"]
+        if folders is not old_folders:
+            for camp in set(folders) | set(old_folders):
+                if folders.get(camp) is old_folders.get(camp): continue
+                for folder in (folders.get(camp), old_folders.get(camp)):
+                    if folder: dirty.update(folder["stories"])
+        if dirty: _rekey(listing, folders, dirty)
+        listing["folders"], listing["stats"] = folders, generation
+        _listing = listing
+        return listing
+
+def _sort_key(sort, descending):
+    # Numbers are negated for descending orders so ties stay in title order
+    sign = -1 if descending else 1
+    if sort == "title": return lambda item: (item[1]["title"], item[0])
+    return lambda item: (sign * item[1][sort], item[1]["title"], item[0])
+
+def _order(listing, sort, descending):
+    """All rel paths in one sort order, sorted once and then kept up to date by _reorder()."""
+    order = listing["orders"].get((sort, descending))
+    if order is None:
+        if sort == "title" and descending: order = _order(listing, "title", False)[::-1]
+        else: order = [rel_path for rel_path, _ in sorted(listing["keys"].items(), key=_sort_key(sort, descending))]
+        listing["orders"][(sort, descending)] = order
+    return order
+
+def _names(value):
+    """A filter given as one name or a list of them, blanks dropped."""
+    if isinstance(value, str): value = [value]
+    return [name for name in value or () if name and name.strip()]
+
+def _matches(listing, campaigns, sort, descending, min_rating=0, tags=(), speaker=None, format_type=None):
+    """Every rel path passing the filters, in sort order (callers hold _listing_lock and don't modify it)."""
+    keys = listing["keys"]
+    candidates = []
+    if campaigns:
+        folders = [listing["folders"].get(_campaign_folder(campaign)) for campaign in campaigns]
+        stories = [folder["stories"] for folder in folders if folder]
+        candidates.append(stories[0] if len(stories) == 1 else set().union(*stories))
+    if tags: candidates.append(tag_index.ids_with_all("stories", tags))
+    if speaker: candidates.append(listing["speakers"].get(speaker.strip().lower(), ()))
+
+    def wanted(rel_path):
+        key = keys[rel_path]
+        return key["rating"] >= min_rating and (not format_type or key["format"] == format_type)
+
+    order = _order(listing, sort, descending)
+    candidates.sort(key=len)
+    if candidates and len(candidates[0]) * 16 < len(order):
+        # A small set is cheaper to sort on its own than to pick out of the whole order
+        items = sorted(((p, keys[p]) for p in candidates[0] if p in keys), key=_sort_key(sort, descending), reverse=descending and sort == "title")
+        matches, rest = [p for p, _ in items], candidates[1:]
+    else: matches, rest = order, candidates
+    for other in rest: matches = [p for p in matches if p in other]
+    if min_rating or format_type: matches = [p for p in matches if wanted(p)]
+    return matches
+
+def query_stories(campaign=None, sort="date", descending=True, min_rating=0, tag=None, speaker=None, format_type=None, page=1, page_size=STORIES_PAGE_SIZE):
+    """
+    One page of the stories list: (rel paths on the page, number of
+    matching stories). campaign and tag take one name or a list: stories
+    in any of the campaigns (None lists every campaign) carrying all of
+    the tags.
+    """
+    if sort not in SORT_FIELDS: sort = "date"
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+    start = (max(1, page) - 1) * page_size
+    listing = _listing_index()
+    with _listing_lock:
+        matches = _matches(listing, _names(campaign), sort, descending, min_rating, _names(tag), speaker, format_type)
+        return matches[start:start + page_size], len(matches)
+
+def browse_stories(tags=(), campaigns=(), sort="title", descending=False, page=1, page_size=STORIES_PAGE_SIZE):
+    """
+    Faceted browsing: stories carrying every one of tags in any of
+    campaigns, with the counts to show next to each facet.
+    {"stories": rel paths on the page, "total": matching stories,
+     "tags": [(tag, matching stories carrying it)] most used first,
+     "campaigns": [(campaign, stories in it carrying every tag)]}
+    """
+    if sort not in SORT_FIELDS: sort = "title"
+    tags, campaigns = _names(tags), _names(campaigns)
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+    start = (max(1, page) - 1) * page_size
+    listing = _listing_index()
+    with _listing_lock:
+        keys = listing["keys"]
+        matches = _matches(listing, campaigns, sort, descending, tags=tags)
+        # Campaign counts leave the campaign choice out, so the others show what picking them adds
+        tagged = tag_index.ids_with_all("stories", tags) if tags else None
+        campaign_counts = []
+        for folder in listing["folders"].values():
+            stories = folder["stories"].keys()
+            count = len(stories) if tagged is None else len(stories & tagged)
+            if count or folder["campaign"] in campaigns: campaign_counts.append((folder["campaign"], count))
+        return {
+            "stories": matches[start:start + page_size],
+            "total": len(matches),
+            "tags": tag_index.counts("stories", within=set(matches) if tags or campaigns else keys.keys()),
+            "campaigns": sorted(campaign_counts, key=lambda row: (row[0] != "Unsorted", row[0].lower())),
+        }
+
+def get_listing_facets():
+    """{"tags": [...], "speakers": [...]}: every tag and speaker on the stories list, most used first."""
+    listing = _listing_index()
+    with _listing_lock:
+        speakers = listing["speakers"]
+        return {
+            "tags": [tag for tag, _ in tag_index.counts("stories", within=listing["keys"].keys())],
+            "speakers": [listing["labels"][name] for name in sorted(speakers, key=lambda name: (-len(speakers[name]), name))],
+        }
 
 def move_story_to_campaign(current_rel_path, target_campaign):
     src_path = os.path.join(STORY_DIR, current_rel_path)
@@ -185,13 +478,20 @@ def move_story_to_campaign(current_rel_path, target_campaign):
         dest_path = os.path.join(STORY_DIR, target_campaign, filename)
         
     if src_path != dest_path:
-        shutil.move(src_path, dest_path)
-        db = load_meta()
-        if current_rel_path in db:
-            db[dest_rel] = db.pop(current_rel_path)
-            save_meta(db)
+        with story_watcher.owned(current_rel_path, dest_rel):
+            shutil.move(src_path, dest_path)
+            _story_moved(current_rel_path, dest_rel)
     return dest_rel
 
+def _story_moved(old_rel_path, new_rel_path):
+    story_parser.invalidate_parse_cache(os.path.join(STORY_DIR, old_rel_path))
+    meta_store.rename(old_rel_path, new_rel_path)
+    tag_index.rename("stories", old_rel_path, new_rel_path)
+    _meta_changed([old_rel_path, new_rel_path])
+    search_index.move_story(old_rel_path, new_rel_path)
+    stats_cache.move_story(old_rel_path, new_rel_path)
+    character_manager.move_story(old_rel_path, new_rel_path)
+
 # ---------------------------------------------------------
 # IMPORT SAVING
 # ---------------------------------------------------------
@@ -200,28 +500,42 @@ def sanitize_filename(name):
     safe = safe.replace(" ", "_")
     return safe + ".txt"
 
-def save_story_from_text(title, content):
-    filename = sanitize_filename(title)
-    file_path = os.path.join(STORY_DIR, filename)
+def _schedule_derived(rel_paths, index_now=False):
+    """
+    Search postings, stats and block indexes of new or edited stories are
+    built by jobs. index_now indexes for search right away instead, for
+    stories the app wrote itself, so the next search already finds them.
+    """
+    if index_now:
+        for rel_path in rel_paths: search_index.index_story(rel_path)
+    else: search_index.schedule_index(rel_paths)
+    stats_cache.schedule_refresh(rel_paths)
+    story_parser.schedule_block_index([os.path.join(STORY_DIR, p) for p in rel_paths])
+
+def unique_story_name(directory, filename, reserved=()):
+    """filename, or filename with a _N suffix, free in directory and not in reserved."""
     base, ext = os.path.splitext(filename)
+    candidate = filename
     counter = 1
-    while os.path.exists(file_path):
-        file_path = os.path.join(STORY_DIR, f"{base}_{counter}{ext}")
+    while candidate in reserved or os.path.exists(os.path.join(directory, candidate)):
+        candidate = f"{base}_{counter}{ext}"
         counter += 1
-    with open(file_path, "w", encoding="utf-8") as f: f.write(content)
-    return os.path.basename(file_path)
+    return candidate
+
+def save_story_from_text(title, content):
+    filename = unique_story_name(STORY_DIR, sanitize_filename(title))
+    with story_watcher.owned(filename):
+        with open(os.path.join(STORY_DIR, filename), "w", encoding="utf-8") as f: f.write(content)
+        _schedule_derived([filename], index_now=True)
+    return filename
 
 def save_story_from_file(file_object, original_filename):
     title_part = os.path.splitext(original_filename)[0]
-    filename = sanitize_filename(title_part)
-    file_path = os.path.join(STORY_DIR, filename)
-    base, ext = os.path.splitext(filename)
-    counter = 1
-    while os.path.exists(file_path):
-        file_path = os.path.join(STORY_DIR, f"{base}_{counter}{ext}")
-        counter += 1
-    with open(file_path, "wb+") as dest: shutil.copyfileobj(file_object, dest)
-    return os.path.basename(file_path)
+    filename = unique_story_name(STORY_DIR, sanitize_filename(title_part))
+    with story_watcher.owned(filename):
+        with open(os.path.join(STORY_DIR, filename), "wb+") as dest: shutil.copyfileobj(file_object, dest)
+        _schedule_derived([filename], index_now=True)
+    return filename
 # ---------------------------------------------------------
 # CONTENT EDITING (NEW)
 # ---------------------------------------------------------
@@ -234,5 +548,45 @@ def read_raw_story(rel_path):
 
 def overwrite_story_content(rel_path, content):
     full_path = os.path.join(STORY_DIR, rel_path)
-    with open(full_path, 'w', encoding='utf-8') as f:
-        f.write(content)
+    with story_watcher.owned(rel_path):
+        with open(full_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        story_parser.invalidate_parse_cache(full_path)
+        _schedule_derived([rel_path], index_now=True)
+
+# ---------------------------------------------------------
+# EDITS MADE OUTSIDE THE APP
+# ---------------------------------------------------------
+def apply_disk_changes(added, modified, removed, moved):
+    """
+    story_watcher handler for stories added, edited, moved or deleted on
+    disk. Metadata of a deleted story is kept, so it's still there if the
+    file comes back.
+    """
+    for old_rel_path, new_rel_path in moved: _story_moved(old_rel_path, new_rel_path)
+    for rel_path in modified + removed: story_parser.invalidate_parse_cache(os.path.join(STORY_DIR, rel_path))
+    for rel_path in removed:
+        search_index.remove_story(rel_path)
+        stats_cache.remove_story(rel_path)
+    init_story_meta_many({p: None for p in added if meta_store.get(p) is None})
+    _schedule_derived(added + modified)
+
+def _sync_search_index():
+    search_index.sync(get_all_stories_flat())
+
+def _sync_stats():
+    stats_cache.sync(get_all_stories_flat())
+
+job_queue.register("search.sync", _sync_search_index)
+job_queue.register("stats.sync", _sync_stats)
+
+def start_watching():
+    """
+    Starts story_watcher (unless STORYBOX_WATCH=off) and catches the search
+    index and the story analytics up with edits made while stopped.
+    """
+    mode = story_watcher.start(apply_disk_changes)
+    if mode != "off": job_queue.enqueue("search.sync", priority=job_queue.PRIORITY_LOW, dedupe_key="search:sync")
+    # Analytics are only ever read from the cache, so they're synced either way
+    job_queue.enqueue("stats.sync", priority=job_queue.PRIORITY_LOW, dedupe_key="stats:sync")
+    return mode
@@ -1,31 +1,89 @@
 import re
 import html
 import os
+import io
+import threading
+from collections import OrderedDict, Counter
 import markdown
 
+import job_queue
+
 ACTION_STYLE = 'text-indigo-300 italic font-medium'
 
-def render_star_rp(text):
-    """Legacy format: *actions* are highlighted."""
-    safe_text = html.escape(text)
-    return re.sub(
-        r'\*([^*]+)\*', 
-        f'<span class="{ACTION_STYLE}">*\\1*</span>', 
-        safe_text
+# Parsed (blocks, stats) for the /read view, bounded by estimated size
+PARSE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+_parse_cache = OrderedDict()  # (filepath, mtime, format_type) -> (blocks, stats, size)
+_parse_cache_bytes = 0
+_parse_cache_lock = threading.Lock()
+
+# Byte offset of every block start, so /read can render a window of blocks
+BLOCK_INDEX_MAX_ENTRIES = 256
+_block_index_cache = OrderedDict()  # filepath -> ((mtime, size), index)
+_block_index_lock = threading.Lock()
+
+_markdown_local = threading.local()
+
+# Story buffers are tokenized with one pass of LINE_RE, which matches every
+# line from its start (indentation excluded): "ooc" is set for (( ... ))
+# lines, "name" holds the unstripped speaker like extract_speaker() would
+# find it, "rest" is what follows the speaker's colon and "line" is the
+# whole line. The name is matched inside a lookahead and then consumed by
+# backreference, which makes it atomic, so lines that turn out not to be
+# speaker lines aren't backtracked character by character.
+LINE_RE = re.compile(r"""
+    ^[^\S\n]*
+    (?P<line>
+        (?:
+            (?P<ooc>\(\(.*\)\))[^\S\n]*$
+          | \[?(?=(?P<name>[^:\]→>\n]+))(?P=name)(?:[→>][^:\n]*)?\]?:
+        )?
+        (?P<rest>.*)
+    )\n?
+""", re.MULTILINE | re.VERBOSE)
+
+# extract_speaker()'s pattern
+SPEAKER_RE = re.compile(r"\[?(?=([^:\]→>]+))\1(?:[→>].*?)?\]?:\s*(.*)")
+
+# tally_speakers() splits buffers at the lines that start a speaker's turn,
+# as LINE_RE reads them: group 1 is the matched start of the line, group 2
+# the OOC line or group 3 the unstripped speaker. What follows each match
+# up to the next one is that turn's text. ACTION_LINE_RE finds the lines
+# of such text that are *actions* once stripped. Both start at the newline
+# before a line rather than at ^, so the regex engine can skip ahead to
+# newlines instead of trying every position; buffers get a leading "\n".
+TURN_RE = re.compile(r"""
+    \n[^\S\n]*
+    (
+        (\(\(.*\)\))[^\S\n]*$
+      | \[?(?=([^:\]→>\n]+))\3(?:[→>][^:\n]*)?\]?:
     )
+""", re.MULTILINE | re.VERBOSE)
+ACTION_LINE_RE = re.compile(r"\n[^\S\n]*\*(?:.*\*)?[^\S\n]*$", re.MULTILINE)
+# Words are counted on the UTF-8 bytes with ASCII whitespace mapped to " "
+# and every other byte to "x", which is what str.split() sees unless the
+# text holds one of the non-ASCII whitespace characters
+_WORD_BYTES = bytes(32 if chr(c).isspace() else 120 for c in range(128)) + b"x" * 128
+_UNICODE_SPACES = "\x85\xa0\u1680\u2000\u2001\u2002\u2003\u2004\u2005\u2006\u2007\u2008\u2009\u200a\u2028\u2029\u202f\u205f\u3000"
+
+# Lines are rendered in batches joined by newlines, so matches must not cross them
+RENDER_BATCH_LINES = 1024
+_BATCH_STYLES = {
+    "star_rp": (re.compile(r'\*([^*\n]+)\*'), f'<span class="{ACTION_STYLE}">*', '*</span>'),
+    "novel": (re.compile(r'"([^"\n]+)"'), '<span class="text-white font-serif">"', '"</span>'),
+}
+
+def _markdown_renderer():
+    # Building a Markdown instance (and its extensions) is far costlier than
+    # a conversion, so each thread keeps one and resets it after every use
+    md = getattr(_markdown_local, "md", None)
+    if md is None: md = _markdown_local.md = markdown.Markdown(extensions=['extra', 'nl2br'])
+    return md
 
 def render_markdown(text):
     """Standard Markdown rendering."""
-    return markdown.markdown(text, extensions=['extra', 'nl2br'])
-
-def render_novel(text):
-    """Text is plain, but quotes are highlighted."""
-    safe_text = html.escape(text)
-    return re.sub(
-        r'"([^"]+)"', 
-        f'<span class="text-white font-serif">"\\1"</span>', 
-        safe_text
-    )
+    md = _markdown_renderer()
+    try: return md.convert(text)
+    finally: md.reset()
 
 def extract_speaker(line):
     """
@@ -43,114 +101,350 @@ def extract_speaker(line):
     # \]?           : Optional closing bracket
     # :\s* : The colon separator and whitespace
     # (.*)          : Capture Group 2 (The Message)
-    
-    match = re.match(r"^\[?([^:\]→>]+)(?:[→>].*?)?\]?:\s*(.*)", line)
-    
+    # The name is matched atomically (see LINE_RE), as backtracking into it
+    # can never find a colon and is slow on long lines without one.
+    match = SPEAKER_RE.match(line)
     if match:
         name = match.group(1).strip()
         content = match.group(2)
         return name, content
     return None, None
 
-def get_file_stats(filepath):
-    stats = {}
-    msg_count = 0
+def _read_text(filepath):
+    with open(filepath, "r", encoding="utf-8-sig", errors="ignore") as f: return f.read()
+
+def _count_words(text):
+    """len(text.split()) without building the words."""
+    if not text.isascii() and any(space in text for space in _UNICODE_SPACES): return len(text.split())
+    return (" " + text).encode("utf-8", "surrogatepass").translate(_WORD_BYTES).count(b" x")
+
+def _tally_entry(speakers, name):
+    entry = speakers.get(name)
+    if entry is None: entry = speakers[name] = {"messages": 0, "words": 0, "actions": 0, "ooc": 0}
+    return entry
+
+def tally_speakers(text, speakers, lines=None):
+    """
+    Adds up messages, words, action lines and OOC lines per raw speaker of
+    a story buffer, tokenized the way _iter_blocks() reads it: lines after
+    a speaker line belong to that speaker until the next OOC line. Narration
+    and OOC lines without a speaker ("((brb))", "((OOC: ...))") go under "".
+    A dict passed as lines counts every line that starts like a speaker
+    line, the way msg_count always has: OOC lines included, so
+    "((OOC: brb))" is a line of "((OOC".
+    """
+    parts = TURN_RE.split("\n" + text)
+    # Each speaker's text is gathered first, then counted in one go
+    owner = ""
+    owned = {"": [parts[0]]}
+    names, heads = [], []
+    for head, ooc, name, turn in zip(parts[1::4], parts[2::4], parts[3::4], parts[4::4]):
+        if ooc:
+            raw, _ = extract_speaker(ooc)
+            if raw: heads.append(raw)
+            ooc_speaker, _ = extract_speaker(ooc.strip("() "))
+            if not ooc_speaker or ooc_speaker.lower() == "ooc": ooc_speaker = ""
+            _tally_entry(speakers, ooc_speaker)["ooc"] += 1
+            owner = ""
+        else:
+            name = name.strip()
+            if name:
+                owner = name
+                names.append(name)
+                heads.append(name)
+            # A blank name ("[ ]: ...") leaves a plain line of the current turn
+            else: turn = head + turn
+        turns = owned.get(owner)
+        if turns is None: owned[owner] = [turn]
+        else: turns.append(turn)
+
+    messages = Counter(names)
+    for name, count in messages.items(): _tally_entry(speakers, name)["messages"] += count
+    for name, turns in owned.items():
+        owned_text = "\n".join(turns)
+        words = _count_words(owned_text)
+        if not words and name not in messages: continue
+        entry = _tally_entry(speakers, name)
+        entry["words"] += words
+        if "*" in owned_text: entry["actions"] += len(ACTION_LINE_RE.findall("\n" + owned_text))
+    if lines is not None:
+        for name, count in Counter(heads).items(): lines[name] = lines.get(name, 0) + count
+    return speakers
+
+def get_file_stats(filepath, speakers=None):
+    """
+    Message count, top three speakers and date of a story, counted from
+    tally_speakers() lines. A dict passed as speakers is filled with the
+    tally_speakers() breakdown as well.
+    """
+    if speakers is None: speakers = {}
     try:
         mod_time = os.path.getmtime(filepath)
         from datetime import datetime
         date_str = datetime.fromtimestamp(mod_time).strftime('%Y-%m-%d')
-        
-        with open(filepath, "r", encoding="utf-8-sig", errors="ignore") as f:
-            for line in f:
-                line = line.strip()
-                if not line: continue
-                
-                name, _ = extract_speaker(line)
-                if name:
-                    if name not in stats: stats[name] = 0
-                    stats[name] += 1
-                    msg_count += 1
-                    
+
+        stats = {}
+        tally_speakers(_read_text(filepath), speakers, stats)
         top_chars = sorted(stats.keys(), key=lambda n: stats[n], reverse=True)[:3]
-        return {"msg_count": msg_count, "top_characters": top_chars, "date": date_str}
+        return {"msg_count": sum(stats.values()), "top_characters": top_chars, "date": date_str}
     except:
+        speakers.clear()
         return {"msg_count": 0, "top_characters": [], "date": "Unknown"}
 
+def _render_batch(lines, format_type):
+    """
+    Same as rendering each entry on its own, but star_rp/novel lines are
+    escaped and highlighted all in one go. Markdown entries may be whole blocks.
+    """
+    if not lines: return []
+    if format_type == "markdown": return [render_markdown(line) for line in lines]
+    pattern, before, after = _BATCH_STYLES[format_type]
+    parts = pattern.split(html.escape("\n".join(lines)))
+    parts[1::2] = [before + inner + after for inner in parts[1::2]]
+    return "".join(parts).split("\n")
+
+def _iter_blocks(text, format_type="star_rp", stats=None):
+    """
+    Tokenizes a whole story buffer with LINE_RE and yields its blocks;
+    speaker counts go into stats. Lines are rendered a batch at a time and
+    blocks are yielded once their batch is done. Markdown dialogue is
+    rendered as one document per block, so lists and other multi-line
+    constructs survive, and held back until the block is complete.
+    """
+    if stats is None: stats = {}
+    if format_type not in ("markdown", "novel"): format_type = "star_rp"
+    is_markdown = format_type == "markdown"
+    narrative_format = "markdown" if is_markdown else "star_rp"
+    star_rp = format_type == "star_rp"
+    tokens = LINE_RE.findall(text)
+    current_block = None
+    block_source = None  # markdown: source lines of current_block
+    carried = None
+
+    for batch_start in range(0, len(tokens), RENDER_BATCH_LINES):
+        ready = []
+        speakers = []
+        line_slots, line_texts = [], []
+        narrative_slots, narrative_texts = [], []
+        if carried:
+            line_slots.append(carried[0])
+            line_texts.append(carried[1])
+
+        for line, is_ooc, name, rest in tokens[batch_start:batch_start + RENDER_BATCH_LINES]:
+            # 1. Handle OOC (( ... ))
+            if is_ooc:
+                if current_block:
+                    ready.append(current_block)
+                    current_block = None
+                ready.append({"type": "ooc", "text": html.escape(line.rstrip().strip("() "))})
+                continue
+
+            # 2. Speaker line starts a new dialogue block
+            if name: name = name.strip()
+            if name:
+                if current_block: ready.append(current_block)
+                speakers.append(name)
+                content = rest.strip()
+                entry = {"is_action_line": star_rp and content[:1] == "*" == content[-1:], "content": None}
+                current_block = {"type": "dialogue", "speaker": name, "lines": [entry]}
+                line_slots.append(entry)
+                if is_markdown:
+                    block_source = [content]
+                    line_texts.append(block_source)
+                else: line_texts.append(content)
+                continue
+
+            raw_line = line.rstrip()
+            if not raw_line: continue
+            if current_block and is_markdown:
+                block_source.append(raw_line)
+            elif current_block:
+                # Append line to previous block
+                entry = {"is_action_line": star_rp and raw_line[:1] == "*" == raw_line[-1:], "content": None}
+                current_block["lines"].append(entry)
+                line_slots.append(entry)
+                line_texts.append(raw_line)
+            else:
+                # Narrative block
+                block = {"type": "narrative", "text": None}
+                ready.append(block)
+                narrative_slots.append(block)
+                narrative_texts.append(raw_line)
+
+        carried = None
+        if is_markdown:
+            if current_block: carried = (line_slots.pop(), line_texts.pop())
+            line_texts = ["\n".join(source) for source in line_texts]
+        for slot, rendered in zip(line_slots, _render_batch(line_texts, format_type)): slot["content"] = rendered
+        for slot, rendered in zip(narrative_slots, _render_batch(narrative_texts, narrative_format)): slot["text"] = rendered
+        for name, count in Counter(speakers).items(): stats[name] = stats.get(name, 0) + count
+        yield from ready
+
+    if carried: carried[0]["content"] = render_markdown("\n".join(carried[1]))
+    if current_block: yield current_block
+
+def _parse_text(text, format_type="star_rp"):
+    stats = {}
+    blocks = list(_iter_blocks(text, format_type, stats))
+    return blocks, stats
+
 def parse_file(filepath, format_type="star_rp"):
+    try:
+        return _parse_text(_read_text(filepath), format_type)
+    except Exception as e:
+        print(f"Parser Error: {e}")
+        return [], {}
+
+# ---------------------------------------------------------
+# PARSE CACHE
+# ---------------------------------------------------------
+def _estimate_size(blocks, stats):
+    """Rough byte cost of a parse result: string payloads plus dict overhead."""
+    size = 0
+    for block in blocks:
+        size += 250
+        if "text" in block: size += len(block["text"])
+        for line in block.get("lines", ()): size += 150 + len(line["content"])
+    for name in stats: size += 100 + len(name)
+    return size
+
+def _evict(key):
+    global _parse_cache_bytes
+    entry = _parse_cache.pop(key, None)
+    if entry: _parse_cache_bytes -= entry[2]
+
+def _cache_key(filepath, format_type):
+    try: return (filepath, os.path.getmtime(filepath), format_type)
+    except OSError: return None
+
+def _cache_lookup(key):
+    with _parse_cache_lock:
+        entry = _parse_cache.get(key)
+        if entry:
+            _parse_cache.move_to_end(key)
+            return entry
+    return None
+
+def _cache_store(key, blocks, stats):
+    global _parse_cache_bytes
+    if not blocks: return
+    size = _estimate_size(blocks, stats)
+    if size > PARSE_CACHE_MAX_BYTES: return
+    with _parse_cache_lock:
+        # Older versions of the same story can never be hit again
+        for old_key in [k for k in _parse_cache if k[0] == key[0]]: _evict(old_key)
+        _parse_cache[key] = (blocks, stats, size)
+        _parse_cache_bytes += size
+        while _parse_cache_bytes > PARSE_CACHE_MAX_BYTES: _evict(next(iter(_parse_cache)))
+
+def iter_file_blocks_cached(filepath, format_type="star_rp"):
+    """
+    parse_file() behind an LRU keyed by (path, mtime, format_type), for
+    streamed pages: yields blocks while the file is still being parsed and
+    only fills the cache once the whole story has been consumed.
+    """
+    filepath = os.path.normpath(filepath)
+    key = _cache_key(filepath, format_type)
+    if key is None: return
+    entry = _cache_lookup(key)
+    if entry:
+        yield from entry[0]
+        return
+
     blocks = []
     stats = {}
-    current_block = None
+    try:
+        for block in _iter_blocks(_read_text(filepath), format_type, stats):
+            blocks.append(block)
+            yield block
+    except Exception as e:
+        print(f"Parser Error: {e}")
+        return
+    _cache_store(key, blocks, stats)
+
+def invalidate_parse_cache(filepath):
+    filepath = os.path.normpath(filepath)
+    with _parse_cache_lock:
+        for key in [k for k in _parse_cache if k[0] == filepath]: _evict(key)
+
+# ---------------------------------------------------------
+# BLOCK OFFSET INDEX (windowed reading)
+# ---------------------------------------------------------
+def build_block_index(filepath):
+    """
+    One pass over the raw bytes recording where each block of parse_file()
+    starts, plus the same per-speaker stats. A block start is a position
+    where the parser holds no open dialogue, so any [start, end) slice of
+    offsets parses to exactly the blocks it covers.
+    """
+    offsets = []
+    stats = {}
+    in_dialogue = False
+    offset = 0
+    with open(filepath, "rb") as f:
+        for raw in f:
+            line = raw.decode("utf-8", errors="ignore")
+            if offset == 0 and line.startswith("\ufeff"): line = line[1:]
+            line_offset = offset
+            offset += len(raw)
+            line = line.strip()
+            if not line: continue
+
+            if line.startswith("((") and line.endswith("))"):
+                offsets.append(line_offset)
+                in_dialogue = False
+                continue
 
+            name, _ = extract_speaker(line)
+            if name:
+                offsets.append(line_offset)
+                stats[name] = stats.get(name, 0) + 1
+                in_dialogue = True
+            elif not in_dialogue:
+                offsets.append(line_offset)
+    return {"offsets": offsets, "size": offset, "stats": stats}
+
+def get_block_index(filepath):
+    filepath = os.path.normpath(filepath)
     try:
-        with open(filepath, "r", encoding="utf-8-sig", errors="ignore") as f:
-            for line in f:
-                raw_line = line.strip()
-                if not raw_line: continue
-
-                # 1. Handle OOC (( ... ))
-                if raw_line.startswith("((") and raw_line.endswith("))"):
-                    if current_block:
-                        blocks.append(current_block)
-                        current_block = None
-                    blocks.append({"type": "ooc", "text": html.escape(raw_line.strip("() "))})
-                    continue
-
-                # 2. Check for Speaker using new logic
-                name, content = extract_speaker(raw_line)
-                
-                if name:
-                    if current_block: blocks.append(current_block)
-
-                    if name not in stats: stats[name] = 0
-                    stats[name] += 1
-                    
-                    current_block = {"type": "dialogue", "speaker": name, "lines": []}
-                    
-                    # RENDER CONTENT BASED ON FORMAT
-                    rendered_content = ""
-                    is_action = False
-
-                    if format_type == "markdown":
-                        rendered_content = render_markdown(content)
-                    elif format_type == "novel":
-                        rendered_content = render_novel(content)
-                    else:
-                        is_action = content.startswith("*") and content.endswith("*")
-                        rendered_content = render_star_rp(content)
-
-                    current_block["lines"].append({
-                        "is_action_line": is_action,
-                        "content": rendered_content
-                    })
-                else:
-                    # Append line to previous block
-                    if current_block:
-                        is_action = False
-                        rendered_content = ""
-
-                        if format_type == "markdown":
-                            rendered_content = render_markdown(raw_line)
-                        elif format_type == "novel":
-                            rendered_content = render_novel(raw_line)
-                        else:
-                            is_action = raw_line.startswith("*") and raw_line.endswith("*")
-                            rendered_content = render_star_rp(raw_line)
-
-                        current_block["lines"].append({
-                            "is_action_line": is_action,
-                            "content": rendered_content
-                        })
-                    else:
-                        # Narrative block
-                        rendered_narrative = ""
-                        if format_type == "markdown": rendered_narrative = render_markdown(raw_line)
-                        else: rendered_narrative = render_star_rp(raw_line)
-                        blocks.append({"type": "narrative", "text": rendered_narrative})
-
-            if current_block: blocks.append(current_block)
+        st = os.stat(filepath)
+        sig = (st.st_mtime, st.st_size)
+    except OSError: return {"offsets": [], "size": 0, "stats": {}}
+
+    with _block_index_lock:
+        entry = _block_index_cache.get(filepath)
+        if entry and entry[0] == sig:
+            _block_index_cache.move_to_end(filepath)
+            return entry[1]
+
+    index = build_block_index(filepath)
+    with _block_index_lock:
+        _block_index_cache[filepath] = (sig, index)
+        _block_index_cache.move_to_end(filepath)
+        while len(_block_index_cache) > BLOCK_INDEX_MAX_ENTRIES: _block_index_cache.popitem(last=False)
+    return index
+
+def schedule_block_index(filepaths):
+    """Builds block indexes on a job worker, so the first read doesn't have to."""
+    job_queue.enqueue_many("parse.block_index", [({"filepath": p}, f"blocks:{p}") for p in filepaths], job_queue.PRIORITY_LOW)
 
+job_queue.register("parse.block_index", get_block_index)
+
+def iter_block_window(filepath, start, end, format_type="star_rp"):
+    """Lazily yields only blocks [start, end) using the block offset index."""
+    index = get_block_index(filepath)
+    offsets = index["offsets"]
+    start = max(0, min(start, len(offsets)))
+    end = max(start, min(end, len(offsets)))
+    if start == end: return
+    stop = offsets[end] if end < len(offsets) else index["size"]
+    try:
+        with open(filepath, "rb") as f:
+            f.seek(offsets[start])
+            chunk = f.read(stop - offsets[start])
+        # Only the start of the file can hold a BOM; later windows keep a stray U+FEFF like the full parse does
+        encoding = "utf-8-sig" if offsets[start] == 0 else "utf-8"
+        text = io.TextIOWrapper(io.BytesIO(chunk), encoding=encoding, errors="ignore").read()
+        yield from _iter_blocks(text, format_type)
     except Exception as e:
         print(f"Parser Error: {e}")
-        return [], {}
-        
-    return blocks, stats
@@ -0,0 +1,274 @@
+import os
+import threading
+from contextlib import contextmanager
+
+# Optional: pip install watchdog (inotify, FSEvents, ...). Without it the
+# stories folder is polled.
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+# CONFIG
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STORY_DIR = os.path.join(BASE_DIR, "stories")
+STORY_EXTENSION = ".txt"
+
+# auto: filesystem events if watchdog is installed, polling otherwise
+# poll: always poll (e.g. for mounts that don't deliver events)
+# off:  no watcher; every listing reads the folder again
+WATCH_MODE = os.environ.get("STORYBOX_WATCH", "auto").lower()
+POLL_SECONDS = 2.0
+# Events can be lost (overflowing queues, Docker Desktop mounts), so with
+# events the whole tree is still checked after this long without any
+EVENT_RESCAN_SECONDS = 60.0
+SETTLE_SECONDS = 0.3        # a burst of events (a copy, an editor's save) is handled as one
+
+# Event types that can mean a story appeared, changed or went away. Reads
+# (opened / closed_no_write) are ignored: the app reads stories all the time.
+CHANGE_EVENTS = ("created", "deleted", "modified", "moved", "closed")
+
+# campaign folder ("" for the root) -> {filename: (inode, mtime, size)}.
+# Replaced, never mutated, so snapshot() can hand it out as is.
+_tree = None
+_handler = None
+_lock = threading.RLock()
+_owned = {}                 # rel path -> claim count; changes the app makes itself
+_generation = 0             # bumped by every change the app reports, watched or not
+_dirty = set()              # folders named by events since the last rescan
+_dirty_lock = threading.Lock()
+_wake = threading.Event()
+_stopping = threading.Event()
+_thread = None
+_observer = None
+
+# ---------------------------------------------------------
+# SCANNING
+# ---------------------------------------------------------
+def _rel_path(campaign, name):
+    return os.path.join(campaign, name) if campaign else name
+
+def _split(rel_path):
+    campaign, _, name = rel_path.replace(os.sep, "/").rpartition("/")
+    return campaign, name
+
+def _signature(st):
+    return (st.st_ino, st.st_mtime, st.st_size)
+
+def _scan(folder):
+    """({story filename: signature}, [subfolder names]) of one folder, or (None, []) if it's gone."""
+    files, folders = {}, []
+    try:
+        with os.scandir(os.path.join(STORY_DIR, folder)) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(): folders.append(entry.name)
+                    elif entry.name.endswith(STORY_EXTENSION) and entry.is_file(): files[entry.name] = _signature(entry.stat())
+                except OSError: continue
+    except OSError: return None, []
+    return files, folders
+
+def _scan_all():
+    root_files, campaigns = _scan("")
+    tree = {"": root_files or {}}
+    for campaign in campaigns:
+        files, _ = _scan(campaign)
+        if files is not None: tree[campaign] = files
+    return tree
+
+def _flatten(tree):
+    return {_rel_path(c, name): sig for c, files in tree.items() for name, sig in files.items()}
+
+def _diff(old, new):
+    """(added, modified, removed, moved) between two trees."""
+    old_flat, new_flat = _flatten(old), _flatten(new)
+    added = [p for p in new_flat if p not in old_flat]
+    removed = [p for p in old_flat if p not in new_flat]
+    modified = [p for p in new_flat if p in old_flat and new_flat[p] != old_flat[p]]
+    # A rename keeps the inode and the mtime
+    sources = {old_flat[p]: p for p in removed}
+    moved = [(sources.pop(new_flat[p]), p) for p in added if new_flat[p] in sources]
+    if moved:
+        moved_from, moved_to = {m[0] for m in moved}, {m[1] for m in moved}
+        added = [p for p in added if p not in moved_to]
+        removed = [p for p in removed if p not in moved_from]
+    return added, modified, removed, moved
+
+def _keep_owned(old, new):
+    """Claimed paths keep their old state until released."""
+    for rel_path in _owned:
+        campaign, name = _split(rel_path)
+        if campaign not in new: continue
+        before = old.get(campaign, {}).get(name)
+        if new[campaign].get(name) == before: continue
+        files = dict(new[campaign])
+        if before is None: files.pop(name, None)
+        else: files[name] = before
+        new[campaign] = files
+
+def _rescan(folders=None):
+    """
+    Rescans some campaign folders ("" = the root and the list of
+    campaigns), or everything, and reports what changed to the handler.
+    """
+    global _tree
+    with _lock:
+        old = _tree
+        if old is None: return
+        if folders is None or "" in folders:
+            root_files, campaigns = _scan("")
+            if root_files is None: root_files = {}
+            todo = set(campaigns) if folders is None else {c for c in campaigns if c in folders or c not in old}
+        else:
+            root_files, campaigns = old[""], [c for c in old if c]
+            todo = set(folders)
+        new = {"": root_files}
+        for campaign in campaigns:
+            files = _scan(campaign)[0] if campaign in todo else old.get(campaign)
+            if files is not None: new[campaign] = files
+        _keep_owned(old, new)
+        _tree = new
+        # Folders that weren't rescanned (or didn't change) are the same objects
+        changed = {c for c in set(old) | set(new) if old.get(c) is not new.get(c)}
+        added, modified, removed, moved = _diff({c: old[c] for c in changed if c in old}, {c: new[c] for c in changed if c in new})
+        if not (added or modified or removed or moved) or not _handler: return
+        try: _handler(added, modified, removed, moved)
+        except Exception as e: print(f"Watcher Error: {e}")
+
+# ---------------------------------------------------------
+# LISTING
+# ---------------------------------------------------------
+def is_running():
+    return _tree is not None
+
+def snapshot():
+    """{campaign folder ("" = root): {filename: (inode, mtime, size)}}, or None when not running. Don't modify it."""
+    return _tree
+
+def scan():
+    """A fresh tree in snapshot() format, read in one scandir pass per folder."""
+    return _scan_all()
+
+def version():
+    """Changes whenever the app reports writing, moving or creating stories (see release())."""
+    return _generation
+
+# ---------------------------------------------------------
+# CHANGES MADE BY THE APP
+# ---------------------------------------------------------
+# story_manager updates metadata, stats and the search index itself when
+# it writes or moves a story. Paths it's working on are claimed, so the
+# watcher doesn't report them halfway; releasing records their new state
+# silently.
+def claim(rel_paths):
+    with _lock:
+        for rel_path in rel_paths: _owned[rel_path] = _owned.get(rel_path, 0) + 1
+
+def release(rel_paths):
+    global _tree, _generation
+    with _lock:
+        _generation += 1
+        for rel_path in rel_paths:
+            if _owned.get(rel_path, 0) > 1: _owned[rel_path] -= 1
+            else: _owned.pop(rel_path, None)
+        if _tree is None: return
+        tree = dict(_tree)
+        copied = set()
+        for rel_path in rel_paths:
+            campaign, name = _split(rel_path)
+            if campaign not in copied:
+                if campaign not in tree and not os.path.isdir(os.path.join(STORY_DIR, campaign)): continue
+                tree[campaign] = dict(tree.get(campaign, {}))
+                copied.add(campaign)
+            try: tree[campaign][name] = _signature(os.stat(os.path.join(STORY_DIR, rel_path)))
+            except OSError: tree[campaign].pop(name, None)
+        _tree = tree
+
+@contextmanager
+def owned(*rel_paths):
+    claim(rel_paths)
+    try: yield
+    finally: release(rel_paths)
+
+def add_campaign(campaign):
+    """Records a campaign folder the app just created."""
+    global _tree, _generation
+    with _lock:
+        _generation += 1
+        if _tree is None or campaign in _tree: return
+        files, _ = _scan(campaign)
+        if files is None: return
+        tree = dict(_tree)
+        tree[campaign] = files
+        _tree = tree
+
+# ---------------------------------------------------------
+# WATCHING
+# ---------------------------------------------------------
+class _EventHandler(FileSystemEventHandler):
+    def on_any_event(self, event):
+        if event.event_type not in CHANGE_EVENTS: return
+        for path in (event.src_path, getattr(event, "dest_path", "")):
+            if not path: continue
+            parts = os.path.relpath(os.fsdecode(path), STORY_DIR).split(os.sep)
+            # Only the root and one level of campaign folders hold stories
+            if parts[0] == ".." or len(parts) > 2: continue
+            with _dirty_lock: _dirty.add(parts[0] if len(parts) == 2 else "")
+        _wake.set()
+
+def _loop():
+    interval = EVENT_RESCAN_SECONDS if _observer else POLL_SECONDS
+    while True:
+        woke = _wake.wait(interval)
+        if _stopping.is_set(): return
+        folders = None
+        if woke:
+            if _stopping.wait(SETTLE_SECONDS): return
+            _wake.clear()
+            with _dirty_lock:
+                folders = set(_dirty)
+                _dirty.clear()
+        try: _rescan(folders)
+        except Exception as e: print(f"Watcher Error: {e}")
+
+def start(handler, mode=WATCH_MODE):
+    """
+    Snapshots STORY_DIR and keeps the snapshot current from then on.
+    handler(added, modified, removed, moved) is called (on the watcher
+    thread) with the rel paths of every change the app didn't make itself;
+    moved is a list of (old, new) pairs. Returns the mode in use.
+    """
+    global _tree, _handler, _thread, _observer
+    if mode == "off": return "off"
+    if _thread: return "events" if _observer else "poll"
+    _handler = handler
+    _stopping.clear()
+    with _lock: _tree = _scan_all()
+    if mode != "poll" and Observer:
+        try:
+            _observer = Observer()
+            _observer.schedule(_EventHandler(), STORY_DIR, recursive=True)
+            _observer.start()
+        except Exception as e:
+            # e.g. the inotify watch limit
+            print(f"Watcher Error: {e}; polling instead")
+            _observer = None
+    _thread = threading.Thread(target=_loop, name="story-watcher", daemon=True)
+    _thread.start()
+    return "events" if _observer else "poll"
+
+def stop():
+    global _tree, _thread, _observer
+    _stopping.set()
+    _wake.set()
+    if _observer:
+        _observer.stop()
+        _observer.join(5)
+        _observer = None
+    if _thread:
+        _thread.join(5)
+        _thread = None
+    with _lock: _tree = None
+    _wake.clear()
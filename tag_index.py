@@ -0,0 +1,88 @@
+import threading
+
+import storage
+
+# ---------------------------------------------------------
+# TAG INDEX
+# ---------------------------------------------------------
+# Tag -> ids of everything carrying it, per kind of item, so tag filters
+# and counts don't scan every record. Each kind is built from its storage
+# collection on first use and then kept up to date by the managers that
+# write tags (story_manager, prompt_manager). Tags match ignoring case
+# and are shown as first written.
+SOURCES = {"stories": "story_meta", "prompts": "prompts"}
+
+_index = {}     # kind -> {lowercased tag: set of ids}
+_labels = {}    # kind -> {lowercased tag: tag as first written}
+_tags_of = {}   # kind -> {id: set of lowercased tags}
+_lock = threading.Lock()
+
+def normalize(tag):
+    return str(tag).strip().lower()
+
+def _load(kind):
+    if kind not in _index:
+        _index[kind], _labels[kind], _tags_of[kind] = {}, {}, {}
+        for item_id, record in storage.get_store(SOURCES[kind]).all().items():
+            _set(kind, item_id, (record or {}).get("tags") or [])
+    return _index[kind]
+
+def _set(kind, item_id, tags):
+    index, labels, tags_of = _index[kind], _labels[kind], _tags_of[kind]
+    new = {}
+    for tag in tags:
+        if normalize(tag): new.setdefault(normalize(tag), str(tag).strip())
+    for name in tags_of.pop(item_id, set()) - new.keys():
+        index[name].discard(item_id)
+        if not index[name]: del index[name], labels[name]
+    for name, label in new.items():
+        index.setdefault(name, set()).add(item_id)
+        labels.setdefault(name, label)
+    if new: tags_of[item_id] = set(new)
+
+# ---------------------------------------------------------
+# UPDATES
+# ---------------------------------------------------------
+def set_tags(kind, item_id, tags):
+    set_tags_many(kind, {item_id: tags})
+
+def set_tags_many(kind, items):
+    """items: {id: list of tags}; an empty list drops the id."""
+    with _lock:
+        _load(kind)
+        for item_id, tags in items.items(): _set(kind, item_id, tags)
+
+def remove(kind, item_id):
+    set_tags_many(kind, {item_id: []})
+
+def rename(kind, old_id, new_id):
+    with _lock:
+        _load(kind)
+        tags = [_labels[kind][name] for name in _tags_of[kind].get(old_id, ())]
+        _set(kind, old_id, [])
+        _set(kind, new_id, tags)
+
+def reset(kind):
+    """Forgets a kind after its whole collection was replaced; rebuilt on next use."""
+    with _lock:
+        for table in (_index, _labels, _tags_of): table.pop(kind, None)
+
+# ---------------------------------------------------------
+# QUERIES
+# ---------------------------------------------------------
+def ids_with_all(kind, tags):
+    """Set of ids tagged with every one of tags (a fresh set the caller may keep)."""
+    with _lock:
+        index = _load(kind)
+        sets = sorted((index.get(normalize(tag), set()) for tag in tags), key=len)
+        return set.intersection(*sets) if sets else set()
+
+def counts(kind, within=None):
+    """
+    [(tag, count)] most used first. within (a set or dict keys view of ids) counts only
+    those ids, leaving out tags none of them carry.
+    """
+    with _lock:
+        index = _load(kind)
+        rows = [(_labels[kind][name], len(ids) if within is None else len(ids & within)) for name, ids in index.items()]
+    return sorted((row for row in rows if row[1]), key=lambda row: (-row[1], row[0].lower()))
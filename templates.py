@@ -1,7 +1,10 @@
-from jinja2 import Template
+# Story blocks of the read view. Shared by the full page and the
+# /read_blocks fragments that windowed reading appends while scrolling.
+READ_BLOCKS_TEMPLATE_STRING = """{% for block in blocks %}{% if block.type == 'ooc' %}<div class="flex justify-center my-4 opacity-75"><div class="bg-gray-800 border border-gray-600 text-gray-400 text-xs px-4 py-1 rounded-full uppercase tracking-wider">(( {{ block.text | safe }} ))</div></div>{% elif block.type == 'dialogue' %}<div class="flex flex-col space-y-1"><span class="text-xs font-bold text-indigo-400 ml-1 drop-shadow-md">{{ block.speaker }}</span>{% set speaker_char = char_map.get(block.speaker) %}{% set bubble_color = speaker_char.bubble_color if speaker_char else '#1f2937' %}<div class="text-gray-100 p-3 rounded-2xl rounded-tl-none inline-block max-w-[85%] self-start shadow-sm leading-relaxed border" style="background-color: {{ bubble_color }}DD; border-color: {{ bubble_color }};"><div class="markdown-content">{% for line in block.lines %}{{ line.content | safe }}{% endfor %}</div></div></div>{% else %}<div class="text-gray-300 leading-relaxed bg-black/40 p-4 rounded-lg border-l-2 border-indigo-500/50 backdrop-blur-sm"><div class="markdown-content">{{ block.text | safe }}</div></div>{% endif %}{% endfor %}"""
 
-HTML_TEMPLATE_STRING = """
-<!DOCTYPE html>
+# Shared layout: head, navigation, the modals every page can open and their
+# scripts. Views extend it and fill in header_actions and content.
+BASE_TEMPLATE_STRING = """<!DOCTYPE html>
 <html class="dark">
 <head>
     <title>StoryStash RP</title>
@@ -20,6 +23,8 @@ HTML_TEMPLATE_STRING = """
         .tag-blue { background: #1e3a8a; color: #93c5fd; border: 1px solid #3b82f6; }
         .tag-purple { background: #581c87; color: #d8b4fe; border: 1px solid #7e22ce; }
         .tag-gray { background: #1f2937; color: #9ca3af; border: 1px solid #374151; }
+        .tag-green { background: #14532d; color: #86efac; border: 1px solid #16a34a; }
+        .tag-red { background: #7f1d1d; color: #fca5a5; border: 1px solid #dc2626; }
         .glass-panel { background: rgba(15, 23, 42, 0.85); backdrop-filter: blur(8px); border: 1px solid rgba(51, 65, 85, 0.5); }
         .markdown-content p { margin-bottom: 0.5em; }
         .markdown-content strong { color: #fff; font-weight: bold; }
@@ -66,8 +71,10 @@ HTML_TEMPLATE_STRING = """
             <nav class="flex gap-4 text-sm font-medium">
                 <a href="/" class="{{ 'text-white font-bold' if mode == 'dashboard' else 'text-gray-400 hover:text-white' }}">Dashboard</a>
                 <a href="/stories" class="{{ 'text-white font-bold' if mode == 'stories_list' else 'text-gray-400 hover:text-white' }}">Stories</a>
+                <a href="/browse" class="{{ 'text-white font-bold' if mode == 'browse' else 'text-gray-400 hover:text-white' }}">Tags</a>
                 <a href="/characters" class="{{ 'text-white font-bold' if mode in ['char_list', 'char_profile'] else 'text-gray-400 hover:text-white' }}">Characters</a>
                 <a href="/prompts" class="{{ 'text-white font-bold' if mode == 'prompts_list' else 'text-gray-400 hover:text-white' }}">Prompts</a>
+                <a href="/jobs" class="{{ 'text-white font-bold' if mode == 'jobs' else 'text-gray-400 hover:text-white' }}">Jobs</a>
             </nav>
         </div>
         
@@ -78,144 +85,12 @@ HTML_TEMPLATE_STRING = """
             </form>
         </div>
         
-        {% if mode == 'read' %}
-        <div class="flex gap-2">
-            <a href="/edit_story/{{ filename }}" class="bg-slate-800 hover:bg-slate-700 text-gray-300 px-3 py-1 rounded text-sm border border-slate-700" title="Edit Raw Text"><i class="fas fa-edit"></i></a>
-            <button onclick="document.getElementById('bgModal').showModal()" class="bg-slate-800 hover:bg-slate-700 text-gray-300 px-3 py-1 rounded text-sm border border-slate-700" title="Change Background"><i class="fas fa-image"></i></button>
-            <button onclick="document.getElementById('castModal').showModal()" class="bg-slate-800 hover:bg-slate-700 text-gray-300 px-3 py-1 rounded text-sm border border-slate-700"><i class="fas fa-users-cog mr-2"></i> Manage Cast</button>
-        </div>
-        {% elif mode == 'prompts_list' %}
-        <button onclick="document.getElementById('createPromptModal').showModal()" class="bg-indigo-600 hover:bg-indigo-500 text-white px-3 py-1 rounded text-sm font-bold shadow-lg shadow-indigo-500/20"><i class="fas fa-plus mr-2"></i> New Prompt</button>
-        {% endif %}
+        {% block header_actions %}{% endblock %}
     </header>
 
-    <main class="flex-1 overflow-hidden w-full flex justify-center p-6 gap-6 relative" style="{{ 'background-image: url(/backgrounds/' + background_file + '); background-size: cover; background-position: center;' if background_file else '' }}">
+    <main class="flex-1 overflow-hidden w-full flex justify-center p-6 gap-6 relative" style="{{ 'background-image: url(' + thumb_url('backgrounds', background_file, 'lg') + '); background-size: cover; background-position: center;' if background_file else '' }}">
         {% if background_file %}<div class="absolute inset-0 bg-slate-950/80 backdrop-blur-sm pointer-events-none z-0"></div>{% endif %}
-
-        {% if mode == 'dashboard' %}
-            <div class="flex-1 max-w-6xl h-full overflow-y-auto space-y-8 z-10">
-                <div><h2 class="text-3xl font-bold text-white mb-2">Welcome back.</h2><p class="text-gray-400">Here is an overview of your roleplay universe.</p></div>
-                <div class="grid grid-cols-1 md:grid-cols-4 gap-6">
-                    <div class="bg-slate-900 border border-slate-800 p-6 rounded-xl shadow-lg flex items-center gap-4"><div class="w-12 h-12 rounded-full bg-indigo-900/50 text-indigo-400 flex items-center justify-center text-xl"><i class="fas fa-book"></i></div><div><div class="text-2xl font-bold text-white">{{ stats.total_stories }}</div><div class="text-xs uppercase text-gray-500 font-bold tracking-wider">Stories</div></div></div>
-                    <div class="bg-slate-900 border border-slate-800 p-6 rounded-xl shadow-lg flex items-center gap-4"><div class="w-12 h-12 rounded-full bg-purple-900/50 text-purple-400 flex items-center justify-center text-xl"><i class="fas fa-users"></i></div><div><div class="text-2xl font-bold text-white">{{ stats.total_chars }}</div><div class="text-xs uppercase text-gray-500 font-bold tracking-wider">Characters</div></div></div>
-                    <div class="bg-slate-900 border border-slate-800 p-6 rounded-xl shadow-lg flex items-center gap-4"><div class="w-12 h-12 rounded-full bg-emerald-900/50 text-emerald-400 flex items-center justify-center text-xl"><i class="fas fa-layer-group"></i></div><div><div class="text-2xl font-bold text-white">{{ stats.total_campaigns }}</div><div class="text-xs uppercase text-gray-500 font-bold tracking-wider">Campaigns</div></div></div>
-                    <div class="bg-slate-900 border border-slate-800 p-6 rounded-xl shadow-lg flex items-center gap-4"><div class="w-12 h-12 rounded-full bg-amber-900/50 text-amber-400 flex items-center justify-center text-xl"><i class="fas fa-lightbulb"></i></div><div><div class="text-2xl font-bold text-white">{{ stats.total_prompts }}</div><div class="text-xs uppercase text-gray-500 font-bold tracking-wider">Prompts</div></div></div>
-                </div>
-                <div class="grid grid-cols-1 lg:grid-cols-3 gap-8">
-                    <div class="lg:col-span-2">
-                        <div class="flex justify-between items-center mb-4"><h3 class="text-lg font-bold text-white">Recent Updates</h3><a href="/stories" class="text-xs text-indigo-400 hover:text-indigo-300">View All</a></div>
-                        <div class="bg-slate-900 border border-slate-800 rounded-xl overflow-hidden">
-                            {% for story in recent_stories %}
-                            <a href="/read/{{ story.path }}" class="flex items-center justify-between p-4 border-b border-slate-800 hover:bg-slate-800/50 transition last:border-0"><div class="flex items-center gap-4"><div class="w-8 h-8 rounded bg-slate-800 flex items-center justify-center text-gray-500"><i class="fas fa-file-alt"></i></div><div><div class="font-bold text-gray-200">{{ story.meta.display_title }}</div><div class="flex gap-2"><div class="text-yellow-500 text-xs flex">{% for i in range(story.meta.rating) %}<i class="fas fa-star"></i>{% endfor %}</div><div class="text-xs text-gray-500">{{ story.path }}</div></div></div></div><div class="text-xs text-gray-500">{{ story.stats.date }}</div></a>
-                            {% endfor %}
-                        </div>
-                    </div>
-                    <div>
-                        <h3 class="text-lg font-bold text-white mb-4">Quick Actions</h3>
-                        <div class="space-y-3">
-                            <button onclick="document.getElementById('importStoryModal').showModal()" class="w-full text-left p-4 bg-slate-900 border border-slate-800 rounded-xl hover:border-indigo-500 transition flex items-center gap-3"><div class="w-10 h-10 rounded-full bg-green-900/30 text-green-400 flex items-center justify-center"><i class="fas fa-plus"></i></div><div><div class="font-bold text-gray-200">Import Story</div><div class="text-xs text-gray-500">Upload .txt or Paste</div></div></button>
-                            <form action="/create_character_quick" method="post" class="block w-full"><div class="p-4 bg-slate-900 border border-slate-800 rounded-xl hover:border-purple-500 transition flex flex-col gap-2"><div class="flex items-center gap-3 text-purple-400 font-bold"><i class="fas fa-user-plus"></i> New Character</div><div class="flex gap-2"><input type="text" name="name" placeholder="Name" class="input-dark py-1 text-sm" required><button type="submit" class="bg-purple-600 hover:bg-purple-500 text-white px-3 rounded text-sm font-bold">Go</button></div></div></form>
-                        </div>
-                    </div>
-                </div>
-            </div>
-            {{ modals | safe }}
-
-        {% elif mode == 'prompts_list' %}
-            <div class="flex-1 max-w-6xl h-full overflow-y-auto z-10">
-                <div class="flex justify-between items-center mb-6"><h2 class="text-2xl font-bold text-white">Roleplay Prompts</h2></div>
-                <div class="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 gap-6">{% for pid, prompt in prompts.items() %}<div class="bg-slate-900 border border-slate-800 rounded-xl p-6 hover:border-indigo-500 transition flex flex-col h-[300px] relative group"><form action="/delete_prompt" method="post" class="absolute top-4 right-4 opacity-0 group-hover:opacity-100 transition" onsubmit="return confirm('Delete prompt?');"><input type="hidden" name="pid" value="{{ pid }}"><button class="text-gray-600 hover:text-red-500"><i class="fas fa-trash"></i></button></form><h3 class="text-lg font-bold text-indigo-400 mb-2 truncate">{{ prompt.title }}</h3><div class="flex flex-wrap gap-2 mb-4">{% for tag in prompt.tags %}<span class="tag tag-purple">{{ tag }}</span>{% endfor %}</div><div class="flex-1 bg-slate-950/50 p-3 rounded text-sm text-gray-300 overflow-y-auto mb-4 font-serif leading-relaxed italic whitespace-pre-wrap">{{ prompt.content }}</div><div class="border-t border-slate-800 pt-3 flex items-center gap-2 overflow-x-auto"><span class="text-[10px] uppercase font-bold text-gray-600 shrink-0">Assigned:</span>{% if prompt.linked_chars %}{% for cid in prompt.linked_chars %}{% if all_chars.get(cid) %}<div class="w-6 h-6 rounded-full bg-slate-800 border border-slate-600 overflow-hidden shrink-0" title="{{ all_chars[cid].name }}">{% if all_chars[cid].avatar_file %}<img src="/avatars/{{ all_chars[cid].avatar_file }}" class="w-full h-full object-cover">{% else %}<div class="w-full h-full flex items-center justify-center text-[8px]">{{ all_chars[cid].name[:1] }}</div>{% endif %}</div>{% endif %}{% endfor %}{% else %}<span class="text-[10px] text-gray-600 italic">None</span>{% endif %}</div></div>{% endfor %}</div>
-            </div>
-            <dialog id="createPromptModal" class="rounded-xl bg-slate-900 border border-slate-700 text-gray-200 w-[600px] backdrop:bg-black/80"><form action="/create_prompt" method="post" class="flex flex-col h-[80vh]"><div class="p-6 border-b border-slate-800"><h2 class="text-lg font-bold text-indigo-400">Create New Prompt</h2></div><div class="p-6 overflow-y-auto space-y-4 flex-1"><div><label class="text-xs font-bold text-gray-500 uppercase">Title</label><input type="text" name="title" class="input-dark mt-1" required></div><div><label class="text-xs font-bold text-gray-500 uppercase">Prompt Content</label><textarea name="content" rows="8" class="input-dark mt-1 font-serif text-sm" required></textarea></div><div><label class="text-xs font-bold text-gray-500 uppercase">Tags (comma separated)</label><input type="text" name="tags" class="input-dark mt-1" placeholder="e.g. Romance, Sci-Fi, Conflict"></div><div><label class="text-xs font-bold text-gray-500 uppercase block mb-2">Assign Characters</label><div class="grid grid-cols-2 gap-2 max-h-40 overflow-y-auto bg-slate-950 p-2 rounded border border-slate-800">{% for cid, char in all_chars.items() %}<label class="flex items-center gap-2 text-sm text-gray-300 hover:bg-slate-900 p-1 rounded cursor-pointer"><input type="checkbox" name="linked_chars" value="{{ cid }}" class="accent-indigo-500"><div class="w-5 h-5 rounded-full bg-slate-800 overflow-hidden">{% if char.avatar_file %}<img src="/avatars/{{ char.avatar_file }}" class="w-full h-full object-cover">{% else %}<div class="w-full h-full flex items-center justify-center text-[8px]">{{ char.name[:1] }}</div>{% endif %}</div><span class="truncate">{{ char.name }}</span></label>{% endfor %}</div></div></div><div class="p-4 border-t border-slate-800 flex justify-end gap-2 bg-slate-900"><button type="button" onclick="this.closest('dialog').close()" class="text-gray-400 text-sm px-3 py-2">Cancel</button><button type="submit" class="bg-indigo-600 text-white px-4 py-2 rounded text-sm font-bold">Create Prompt</button></div></form></dialog>
-
-        {% elif mode == 'char_list' %}
-            <div class="flex-1 h-full overflow-y-auto z-10"><div class="flex justify-between items-center mb-6"><h2 class="text-2xl font-bold text-white">Character Database</h2><div class="flex gap-4 items-center"><form action="/import_character" method="post" enctype="multipart/form-data" class="flex gap-2"><label class="cursor-pointer bg-slate-800 hover:bg-slate-700 text-gray-300 px-3 py-1 rounded text-sm border border-slate-700 font-medium"><i class="fas fa-file-import mr-1"></i> Import Card (PNG)<input type="file" name="file" accept=".png" class="hidden" onchange="this.form.submit()"></label></form><form action="/create_character_quick" method="post" class="flex gap-2 border-l border-slate-700 pl-4"><input type="text" name="name" placeholder="New Character Name" class="input-dark py-1 px-3 w-64" required><button type="submit" class="bg-indigo-600 hover:bg-indigo-500 text-white px-4 py-1 rounded text-sm font-bold">Create</button></form></div></div><div class="grid grid-cols-2 md:grid-cols-4 lg:grid-cols-6 gap-6">{% for id, char in all_chars.items() %}<a href="/character/{{ id }}" class="block bg-slate-900 rounded-xl border border-slate-800 overflow-hidden hover:border-indigo-500 hover:shadow-lg transition group"><div class="aspect-square bg-slate-800 w-full relative">{% if char.get('avatar_file') %}<img src="/avatars/{{ char.avatar_file }}" class="w-full h-full object-cover">{% else %}<div class="w-full h-full flex items-center justify-center text-4xl font-bold text-white/20">{{ char.get('name', '?')[:1] }}</div>{% endif %}<div class="absolute bottom-0 left-0 right-0 bg-gradient-to-t from-black/90 to-transparent p-3 pt-8"><h3 class="font-bold text-white truncate">{{ char.get('name', 'Unknown') }}</h3></div></div></a>{% endfor %}</div></div>
-
-        {% elif mode == 'char_profile' %}
-            <div class="flex-1 h-full overflow-hidden flex gap-8 z-10">
-                <aside class="w-80 shrink-0 h-full overflow-y-auto space-y-6">
-                    <div class="bg-slate-900 rounded-xl border border-slate-800 p-6 flex flex-col items-center shadow-lg relative group">
-                        <button onclick='openEditModal({{ char | tojson }})' class="absolute top-2 right-2 text-gray-500 hover:text-indigo-400" title="Edit"><i class="fas fa-pencil-alt"></i></button>
-                        <form action="/delete_character" method="post" onsubmit="return confirm('Delete?');"><input type="hidden" name="char_id" value="{{ char_id }}"><button type="submit" class="absolute top-2 left-2 text-gray-600 hover:text-red-500 transition" title="Delete"><i class="fas fa-trash"></i></button></form>
-                        <a href="/export_character/{{ char_id }}" target="_blank" class="absolute bottom-2 right-2 text-gray-600 hover:text-blue-400 transition" title="Export Card"><i class="fas fa-address-card"></i></a>
-                        <div class="w-48 h-48 rounded-lg shadow-2xl border-2 border-slate-700 overflow-hidden mb-4 bg-slate-800">{% if char.get('avatar_file') %}<img src="/avatars/{{ char.avatar_file }}" class="w-full h-full object-cover">{% else %}<div class="w-full h-full flex items-center justify-center text-6xl font-bold text-white/20">{{ char.get('name', '?')[:1] }}</div>{% endif %}</div>
-                        <h1 class="text-2xl font-bold text-white text-center">{{ char.get('name', 'Unknown') }}</h1>
-                        <div class="w-full mt-6 space-y-3">
-                            <div class="flex justify-between border-b border-slate-800 pb-1"><span class="text-xs uppercase text-gray-500 font-bold">Age</span><span class="text-sm text-gray-200">{{ char.attributes.get('Age', 'Unknown') }}</span></div>
-                            <div class="flex justify-between border-b border-slate-800 pb-1"><span class="text-xs uppercase text-gray-500 font-bold">Gender</span><span class="text-sm text-gray-200">{{ char.attributes.get('Gender', 'Unknown') }}</span></div>
-                            <div class="flex justify-between border-b border-slate-800 pb-1"><span class="text-xs uppercase text-gray-500 font-bold">Race</span><span class="text-sm text-gray-200">{{ char.attributes.get('Race', 'Unknown') }}</span></div>
-                            <div class="flex justify-between border-b border-slate-800 pb-1"><span class="text-xs uppercase text-gray-500 font-bold">Orientation</span><span class="text-sm text-gray-200">{{ char.attributes.get('Orientation', 'Unknown') }}</span></div>
-                            {% for key, val in char.attributes.items() %}{% if key not in ['Age', 'Gender', 'Race', 'Orientation'] %}<div class="flex justify-between border-b border-slate-800 pb-1"><span class="text-xs uppercase text-gray-500 font-bold truncate max-w-[100px]">{{ key }}</span><span class="text-sm text-gray-400 truncate">{{ val }}</span></div>{% endif %}{% endfor %}
-                        </div>
-                    </div>
-                    {% if played_by_list %}
-                    <div class="bg-slate-900 rounded-xl border border-slate-800 p-4 shadow-lg">
-                        <h2 class="text-xs font-bold text-gray-500 uppercase tracking-widest mb-3 border-b border-slate-800 pb-2">Played By</h2>
-                        <div class="flex flex-wrap gap-2">{% for player in played_by_list %}<span class="px-2 py-1 rounded bg-slate-800 border border-slate-700 text-xs text-indigo-300 font-mono">{{ player }}</span>{% endfor %}</div>
-                    </div>
-                    {% endif %}
-                </aside>
-                
-                <div class="flex-1 h-full overflow-y-auto space-y-4 pr-4">
-                    {% if assigned_prompts %}<section><h2 class="text-xl font-bold text-amber-400 mb-2 border-b border-slate-800 pb-2"><i class="fas fa-lightbulb mr-2"></i> Assigned Prompts</h2><div class="grid grid-cols-1 md:grid-cols-2 gap-4">{% for p in assigned_prompts %}<div class="bg-slate-900 border border-slate-800 p-4 rounded-lg hover:border-amber-500/50 transition"><h3 class="font-bold text-gray-200 mb-2">{{ p.title }}</h3><div class="text-xs text-gray-400 italic line-clamp-3 mb-2">{{ p.content }}</div><div class="flex flex-wrap gap-1">{% for tag in p.tags %}<span class="text-[10px] px-2 py-0.5 rounded bg-slate-800 text-gray-500 border border-slate-700">{{ tag }}</span>{% endfor %}</div></div>{% endfor %}</div></section>{% endif %}
-                    <section><h2 class="text-xl font-bold text-indigo-400 mb-2 border-b border-slate-800 pb-2">Biography</h2><div class="bg-slate-900/50 p-6 rounded-xl border border-slate-800 text-gray-300 leading-relaxed italic whitespace-pre-wrap">{{ char.description or "No biography." }}</div></section>
-                    <section><h2 class="text-xl font-bold text-indigo-400 mb-2 border-b border-slate-800 pb-2">Appears In</h2><div class="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 gap-4">{% for story_path in stories %}<a href="/read/{{ story_path }}" class="block bg-slate-900 p-4 rounded-lg border border-slate-800 hover:border-indigo-500 transition"><i class="fas fa-file-alt text-indigo-500 mr-2"></i> {{ story_path }}</a>{% endfor %}{% if not stories %}<p class="text-gray-500 text-sm">Not linked to any stories.</p>{% endif %}</div></section>
-                    <section><div class="flex justify-between items-center mb-2 border-b border-slate-800 pb-2"><h2 class="text-xl font-bold text-indigo-400">Gallery</h2><form action="/upload_gallery" method="post" enctype="multipart/form-data"><input type="hidden" name="char_id" value="{{ char_id }}"><label class="cursor-pointer bg-slate-800 hover:bg-slate-700 text-xs px-3 py-1 rounded border border-slate-700 text-gray-300"><i class="fas fa-upload mr-1"></i> Add Image<input type="file" name="image" class="hidden" onchange="this.form.submit()"></label></form></div><div class="grid grid-cols-2 md:grid-cols-3 lg:grid-cols-4 gap-4">{% for img in char.get('gallery', []) %}<div class="aspect-square rounded-lg overflow-hidden border border-slate-800 bg-black cursor-pointer hover:border-indigo-500 transition" onclick="window.open('/gallery/{{ img }}', '_blank')"><img src="/gallery/{{ img }}" class="w-full h-full object-cover"></div>{% endfor %}</div></section>
-                </div>
-            </div>
-            {{ modals | safe }}
-
-        {% elif mode == 'edit_story' %}
-            <div class="flex-1 max-w-4xl h-full overflow-hidden flex flex-col z-10">
-                <div class="flex justify-between items-center mb-4"><h2 class="text-2xl font-bold text-white">Edit Story Content</h2><div class="flex gap-2"><a href="/read/{{ filename }}" class="text-gray-400 hover:text-white px-4 py-2 text-sm font-medium">Cancel</a><button form="editForm" type="submit" class="bg-indigo-600 hover:bg-indigo-500 text-white px-4 py-2 rounded text-sm font-bold shadow-lg shadow-indigo-500/20">Save Changes</button></div></div>
-                <form id="editForm" action="/save_story_text" method="post" class="flex-1 border border-slate-700 rounded-xl overflow-hidden shadow-2xl"><input type="hidden" name="path" value="{{ filename }}"><textarea name="content" class="w-full h-full bg-slate-950 text-gray-300 p-6 font-mono text-sm resize-none focus:outline-none leading-relaxed">{{ content }}</textarea></form>
-            </div>
-
-        {% elif mode == 'search' %}
-            <div class="flex-1 max-w-4xl h-full overflow-y-auto z-10"><h2 class="text-2xl font-bold text-white mb-6">Search Results for "<span class="text-indigo-400">{{ query }}</span>"</h2><div class="space-y-4">{% for result in results %}<div class="bg-slate-900 border border-slate-800 rounded-xl p-6 hover:border-indigo-500 transition"><a href="/read/{{ result.path }}" class="block"><h3 class="font-bold text-lg text-indigo-400 mb-1"><i class="fas fa-file-alt mr-2"></i> {{ result.title }}</h3><div class="text-xs text-gray-500 mb-3">{{ result.path }}</div><div class="space-y-2">{% for match in result.matches %}<div class="text-sm text-gray-300 font-mono bg-slate-950 p-2 rounded border-l-2 border-indigo-500/50">...{{ match }}...</div>{% endfor %}</div></a></div>{% endfor %}{% if not results %}<div class="text-center text-gray-500 mt-20"><i class="fas fa-ghost text-4xl mb-4 opacity-50"></i><p>No results found.</p></div>{% endif %}</div></div>
-        
-        {% elif mode == 'stories_list' %}
-            <aside class="w-64 shrink-0 bg-slate-900/50 rounded-xl border border-slate-800 p-4 h-full overflow-y-auto z-10">
-                <div class="flex justify-between items-center mb-4"><h2 class="text-xs font-bold text-gray-500 uppercase tracking-widest">Campaigns</h2><button onclick="document.getElementById('campaignModal').showModal()" class="text-xs text-indigo-400 hover:text-indigo-300"><i class="fas fa-plus"></i></button></div>
-                <nav class="space-y-1"><a href="/stories" class="block px-3 py-2 rounded text-sm {{ 'bg-indigo-900/50 text-indigo-200' if not active_campaign else 'text-gray-400 hover:bg-slate-800 hover:text-white' }}"><i class="fas fa-layer-group w-5"></i> All Stories</a>{% for camp in campaigns %}{% if camp != "Unsorted" %}<a href="/stories?campaign={{ camp }}" class="block px-3 py-2 rounded text-sm {{ 'bg-indigo-900/50 text-indigo-200' if active_campaign == camp else 'text-gray-400 hover:bg-slate-800 hover:text-white' }}"><i class="fas fa-folder w-5 text-yellow-600"></i> {{ camp }}</a>{% endif %}{% endfor %}</nav>
-                <div class="mt-6 border-t border-slate-800 pt-4"><button onclick="document.getElementById('importStoryModal').showModal()" class="block w-full text-left px-3 py-2 rounded text-sm text-gray-400 hover:bg-slate-800 hover:text-white transition"><i class="fas fa-file-import w-5 text-green-500"></i> Import / Write</button></div>
-            </aside>
-            <div class="flex-1 h-full overflow-y-auto pr-2 z-10"><div class="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 xl:grid-cols-4 gap-6">{% for item in stories %}<div class="bg-slate-900 rounded-xl border border-slate-800 shadow-lg hover:border-indigo-500/50 transition flex flex-col h-[280px] group relative"><button onclick='openStoryMetaModal({{ item | tojson }})' class="absolute top-2 right-2 z-10 text-gray-500 hover:text-indigo-400 opacity-0 group-hover:opacity-100 transition p-2"><i class="fas fa-cog"></i></button><a href="/read/{{ item.path }}" class="flex-1 flex flex-col p-5"><div class="mb-3"><h3 class="font-bold text-lg text-gray-100 leading-tight line-clamp-1" title="{{ item.meta.display_title }}">{{ item.meta.display_title }}</h3><div class="text-[10px] text-gray-500 mt-1 flex gap-2"><span><i class="far fa-clock"></i> {{ item.stats.date }}</span><span><i class="far fa-comment-alt"></i> {{ item.stats.msg_count }}</span></div></div><div class="text-yellow-500 text-xs mb-1">{% for i in range(item.meta.rating) %}<i class="fas fa-star"></i>{% endfor %}</div><div class="flex-1 text-xs text-gray-400 italic line-clamp-4 leading-relaxed overflow-hidden">{{ item.meta.synopsis }}</div>{% if item.stats.top_characters %}<div class="mt-3 flex -space-x-2 overflow-hidden py-1">{% for char in item.stats.top_characters %}<div class="inline-block h-6 w-6 rounded-full ring-2 ring-slate-900 bg-indigo-500 flex items-center justify-center text-[8px] font-bold text-white">{{ char[:1] }}</div>{% endfor %}</div>{% endif %}</a><div class="p-3 border-t border-slate-800 bg-slate-950/30 rounded-b-xl flex gap-2 overflow-x-auto">{% if item.meta.tags %}{% for tag in item.meta.tags %}<span class="tag tag-blue">{{ tag }}</span>{% endfor %}{% else %}<span class="tag tag-gray">No Tags</span>{% endif %}</div></div>{% endfor %}</div></div>
-            {{ modals | safe }}
-
-        {% elif mode == 'edit_story' %}
-            <div class="flex-1 max-w-4xl h-full overflow-hidden flex flex-col z-10">
-                <div class="flex justify-between items-center mb-4"><h2 class="text-2xl font-bold text-white">Edit Story Content</h2><div class="flex gap-2"><a href="/read/{{ filename }}" class="text-gray-400 hover:text-white px-4 py-2 text-sm font-medium">Cancel</a><button form="editForm" type="submit" class="bg-indigo-600 hover:bg-indigo-500 text-white px-4 py-2 rounded text-sm font-bold shadow-lg shadow-indigo-500/20">Save Changes</button></div></div>
-                <form id="editForm" action="/save_story_text" method="post" class="flex-1 border border-slate-700 rounded-xl overflow-hidden shadow-2xl"><input type="hidden" name="path" value="{{ filename }}"><textarea name="content" class="w-full h-full bg-slate-950 text-gray-300 p-6 font-mono text-sm resize-none focus:outline-none leading-relaxed">{{ content }}</textarea></form>
-            </div>
-
-        {% elif mode == 'read' %}
-            <aside class="w-80 hidden md:block shrink-0 sidebar-container space-y-6 z-10">
-                {% for char in characters %}
-                <div class="glass-panel rounded-xl overflow-hidden shadow-lg flex flex-col relative group">
-                    {% if char.id %}<a href="/character/{{ char.id }}" class="absolute top-2 left-2 z-10 bg-black/50 hover:bg-indigo-600 text-white p-2 rounded-full opacity-0 group-hover:opacity-100 transition"><i class="fas fa-external-link-alt text-xs"></i></a><button onclick='openEditModal({{ char | tojson }})' class="absolute top-2 right-2 z-10 bg-black/50 hover:bg-indigo-600 text-white p-2 rounded-full opacity-0 group-hover:opacity-100 transition"><i class="fas fa-pencil-alt text-xs"></i></button>{% else %}<div class="absolute top-2 right-2 z-10 bg-black/50 text-xs text-gray-400 px-2 py-1 rounded pointer-events-none">Unlinked</div>{% endif %}
-                    <div class="w-full flex justify-center pt-4 pb-2 bg-slate-800/50">{% if char.avatar_url %}<img src="{{ char.avatar_url }}" class="w-[200px] h-[200px] object-cover rounded shadow-md border border-gray-700">{% else %}<div class="w-[200px] h-[200px] flex items-center justify-center font-bold text-white shadow-md rounded border border-gray-700 text-6xl select-none" style="background-color: {{ char.color }};">{{ char.display_name[:1] }}</div>{% endif %}</div>
-                    <div class="p-4 border-t border-gray-800 bg-gray-900/90">
-                        <h3 class="font-bold text-lg text-gray-100 truncate text-center mb-3">{{ char.display_name }}</h3>
-                        <div class="grid grid-cols-2 gap-2 text-xs text-gray-400 mb-3 bg-slate-950/50 p-2 rounded"><div><span class="block text-[9px] uppercase font-bold text-gray-600">Age</span>{{ char.attributes.get('Age', '-') }}</div><div><span class="block text-[9px] uppercase font-bold text-gray-600">Gender</span>{{ char.attributes.get('Gender', '-') }}</div><div><span class="block text-[9px] uppercase font-bold text-gray-600">Race</span>{{ char.attributes.get('Race', '-') }}</div><div><span class="block text-[9px] uppercase font-bold text-gray-600">Orient.</span>{{ char.attributes.get('Orientation', '-') }}</div></div>
-                        {% if char.id %}
-                        <form action="/set_story_player" method="post" class="mt-2 pt-2 border-t border-gray-800">
-                            <input type="hidden" name="filename" value="{{ filename }}">
-                            <input type="hidden" name="char_id" value="{{ char.id }}">
-                            <div class="flex items-center gap-1">
-                                <label class="text-[9px] uppercase font-bold text-gray-600 shrink-0">Played By</label>
-                                <input type="text" name="player_name" value="{{ player_map.get(char.id, '') }}" class="bg-transparent text-xs text-indigo-300 border-b border-gray-700 w-full focus:outline-none focus:border-indigo-500 ml-1" placeholder="Username" onchange="this.form.submit()">
-                            </div>
-                        </form>
-                        {% endif %}
-                    </div>
-                </div>
-                {% endfor %}
-            </aside>
-            <div class="flex-1 max-w-4xl h-full overflow-y-auto pr-2 z-10"><div class="glass-panel rounded-xl shadow-2xl p-8 min-h-full"><div class="space-y-6">{% for block in blocks %}{% if block.type == 'ooc' %}<div class="flex justify-center my-4 opacity-75"><div class="bg-gray-800 border border-gray-600 text-gray-400 text-xs px-4 py-1 rounded-full uppercase tracking-wider">(( {{ block.text | safe }} ))</div></div>{% elif block.type == 'dialogue' %}<div class="flex flex-col space-y-1"><span class="text-xs font-bold text-indigo-400 ml-1 drop-shadow-md">{{ block.speaker }}</span>{% set speaker_char = char_map.get(block.speaker) %}{% set bubble_color = speaker_char.bubble_color if speaker_char else '#1f2937' %}<div class="text-gray-100 p-3 rounded-2xl rounded-tl-none inline-block max-w-[85%] self-start shadow-sm leading-relaxed border" style="background-color: {{ bubble_color }}DD; border-color: {{ bubble_color }};"><div class="markdown-content">{% for line in block.lines %}{{ line.content | safe }}{% endfor %}</div></div></div>{% else %}<div class="text-gray-300 leading-relaxed bg-black/40 p-4 rounded-lg border-l-2 border-indigo-500/50 backdrop-blur-sm"><div class="markdown-content">{{ block.text | safe }}</div></div>{% endif %}{% endfor %}</div><div class="mt-20 pt-10 border-t border-gray-800 text-center text-gray-600 text-sm">End of File</div></div></div><div class="w-10 hidden xl:block shrink-0"></div>
-            <dialog id="castModal" class="rounded-xl shadow-2xl bg-slate-900 border border-slate-700 text-gray-200 w-[600px] backdrop:bg-black/80"><div class="p-6 border-b border-slate-800 flex justify-between items-center"><h2 class="text-lg font-bold text-indigo-400">Manage Cast</h2><button onclick="document.getElementById('castModal').close()" class="text-gray-500 hover:text-white"><i class="fas fa-times"></i></button></div><div class="p-6 max-h-[70vh] overflow-y-auto"><table class="w-full text-left text-sm"><thead class="text-xs text-gray-500 uppercase border-b border-slate-700"><tr><th class="py-2">Name in Story</th><th class="py-2">Database Character</th></tr></thead><tbody class="divide-y divide-slate-800">{% for char in characters %}<tr><td class="py-3 font-bold text-gray-300">{{ char.raw_name }}</td><td class="py-3"><form action="/link_character" method="POST" class="flex gap-2"><input type="hidden" name="filename" value="{{ filename }}"><input type="hidden" name="raw_name" value="{{ char.raw_name }}"><select name="char_id" class="input-dark text-xs py-1"><option value="">-- Unlinked --</option><option value="NEW">➕ Create New</option>{% for db_id, db_data in all_db_chars.items() %}<option value="{{ db_id }}" {% if char.id == db_id %}selected{% endif %}>{{ db_data.get('name', 'Unknown') }}</option>{% endfor %}</select><button type="submit" class="bg-indigo-900 hover:bg-indigo-700 text-indigo-200 px-2 rounded text-xs">Save</button></form></td></tr>{% endfor %}</tbody></table></div></dialog>
-            <dialog id="bgModal" class="rounded-xl bg-slate-900 border border-slate-700 text-gray-200 w-96 backdrop:bg-black/80"><form action="/upload_story_background" method="post" enctype="multipart/form-data" class="p-6"><h2 class="text-lg font-bold text-indigo-400 mb-4">Change Story Background</h2><input type="hidden" name="return_path" value="{{ filename }}"><input type="file" name="file" accept="image/*" class="block w-full text-sm text-gray-400 file:mr-4 file:py-2 file:px-4 file:rounded-full file:border-0 file:text-xs file:font-semibold file:bg-indigo-900 file:text-indigo-300 hover:file:bg-indigo-800 cursor-pointer mb-4 bg-slate-950 rounded border border-slate-700 p-1"/><div class="flex justify-end gap-2"><button type="button" onclick="this.closest('dialog').close()" class="text-gray-400 text-sm px-3 py-2">Cancel</button><button type="submit" class="bg-indigo-600 text-white px-4 py-2 rounded text-sm font-bold">Upload</button></div></form></dialog>
-        {% endif %}
+{% block content %}{% endblock %}
 
     </main>
     
@@ -301,6 +176,7 @@ HTML_TEMPLATE_STRING = """
         <div class="flex gap-2 mb-4 border-b border-slate-700 pb-2">
             <button onclick="showImportTab('file')" id="tab-file" class="px-3 py-1 text-sm font-bold text-white border-b-2 border-indigo-500 transition">Upload File</button>
             <button onclick="showImportTab('text')" id="tab-text" class="px-3 py-1 text-sm text-gray-400 hover:text-white transition">Write / Paste</button>
+            <button onclick="showImportTab('archive')" id="tab-archive" class="px-3 py-1 text-sm text-gray-400 hover:text-white transition">Archive</button>
         </div>
         <form id="form-file" action="/import_story_file" method="post" enctype="multipart/form-data" class="space-y-4">
             <div>
@@ -316,6 +192,21 @@ HTML_TEMPLATE_STRING = """
                 <button type="submit" class="bg-indigo-600 text-white px-4 py-2 rounded text-sm font-bold">Upload</button>
             </div>
         </form>
+        <form id="form-archive" action="/import_archive" method="post" enctype="multipart/form-data" class="space-y-4 hidden">
+            <div>
+                <label class="text-xs font-bold text-gray-500 uppercase">Select Archive (.zip, .tar, .tar.gz)</label>
+                <input type="file" name="file" accept=".zip,.tar,.gz,.tgz,.bz2,.xz" class="block w-full text-sm text-gray-400 file:mr-4 file:py-2 file:px-4 file:rounded-full file:border-0 file:text-xs file:font-semibold file:bg-indigo-900 file:text-indigo-300 hover:file:bg-indigo-800 cursor-pointer mt-2 bg-slate-950 rounded border border-slate-700 p-1"/>
+            </div>
+            <div>
+                <label class="text-xs font-bold text-gray-500 uppercase">Default Campaign</label>
+                <select name="campaign" class="input-dark mt-1"><option value="Unsorted">Unsorted</option>{% for camp in campaigns %}{% if camp != "Unsorted" %}<option value="{{ camp }}">{{ camp }}</option>{% endif %}{% endfor %}</select>
+            </div>
+            <div><label class="text-xs font-bold text-gray-500 uppercase">Folder Mapping (optional)</label><textarea name="campaign_map" rows="3" class="input-dark mt-1 font-mono text-xs" placeholder="One per line: folder/in/archive = Campaign"></textarea></div>
+            <div class="flex justify-end gap-2 pt-2">
+                <button type="button" onclick="this.closest('dialog').close()" class="text-gray-400 text-sm px-3 py-2">Cancel</button>
+                <button type="submit" class="bg-indigo-600 text-white px-4 py-2 rounded text-sm font-bold">Import</button>
+            </div>
+        </form>
         <form id="form-text" action="/import_story_text" method="post" class="space-y-4 hidden">
             <div><label class="text-xs font-bold text-gray-500 uppercase">Story Title</label><input type="text" name="title" class="input-dark mt-1" placeholder="e.g. The Tavern Brawl" required></div>
             <div><label class="text-xs font-bold text-gray-500 uppercase">Content</label><textarea name="content" rows="10" class="input-dark mt-1 font-mono text-xs" placeholder="Paste your log here..." required></textarea></div>
@@ -323,14 +214,11 @@ HTML_TEMPLATE_STRING = """
 
     <script>
         function showImportTab(tab) {
-            if(tab === 'file') {
-                document.getElementById('form-file').classList.remove('hidden'); document.getElementById('form-text').classList.add('hidden');
-                document.getElementById('tab-file').classList.add('text-white', 'border-indigo-500', 'border-b-2'); document.getElementById('tab-file').classList.remove('text-gray-400');
-                document.getElementById('tab-text').classList.add('text-gray-400'); document.getElementById('tab-text').classList.remove('text-white', 'border-indigo-500', 'border-b-2');
-            } else {
-                document.getElementById('form-file').classList.add('hidden'); document.getElementById('form-text').classList.remove('hidden');
-                document.getElementById('tab-text').classList.add('text-white', 'border-indigo-500', 'border-b-2'); document.getElementById('tab-text').classList.remove('text-gray-400');
-                document.getElementById('tab-file').classList.add('text-gray-400'); document.getElementById('tab-file').classList.remove('text-white', 'border-indigo-500', 'border-b-2');
+            for (const name of ['file', 'text', 'archive']) {
+                const active = name === tab;
+                document.getElementById('form-' + name).classList.toggle('hidden', !active);
+                document.getElementById('tab-' + name).classList.toggle('text-gray-400', !active);
+                for (const cls of ['text-white', 'border-indigo-500', 'border-b-2']) document.getElementById('tab-' + name).classList.toggle(cls, active);
             }
         }
         function openStoryMetaModal(item) {
@@ -398,8 +286,258 @@ HTML_TEMPLATE_STRING = """
             div.innerHTML = `<input type="text" name="attr_keys" value="${key}" placeholder="Label" class="input-dark w-1/3 text-xs font-bold text-indigo-300"><input type="text" name="attr_values" value="${value}" placeholder="Value" class="input-dark flex-1"><button type="button" onclick="this.parentElement.remove()" class="text-red-500 hover:text-red-400 px-2"><i class="fas fa-times"></i></button>`;
             container.appendChild(div);
         }
+
+        // --- WINDOWED READING: fetch further blocks as the reader nears the end ---
+        (function() {
+            const sentinel = document.getElementById('blockSentinel');
+            if (!sentinel) return;
+            const list = document.getElementById('blockList');
+            let loading = false;
+            const observer = new IntersectionObserver(async function(entries) {
+                if (!entries[0].isIntersecting || loading) return;
+                loading = true;
+                const next = parseInt(sentinel.dataset.next);
+                const size = parseInt(sentinel.dataset.size);
+                const total = parseInt(sentinel.dataset.total);
+                try {
+                    const resp = await fetch(`/read_blocks/{{ filename }}?start=${next}&count=${size}`);
+                    if (!resp.ok) throw new Error(resp.status);
+                    list.insertAdjacentHTML('beforeend', await resp.text());
+                } catch (e) { loading = false; return; }
+                if (next + size >= total) {
+                    observer.disconnect();
+                    sentinel.remove();
+                    document.getElementById('endOfFile').classList.remove('hidden');
+                } else {
+                    sentinel.dataset.next = next + size;
+                }
+                loading = false;
+            }, { root: document.getElementById('readScroll'), rootMargin: '1500px' });
+            observer.observe(sentinel);
+        })();
     </script>
 
 </body>
 </html>
 """
+
+DASHBOARD_TEMPLATE_STRING = """{% extends "base.html" %}{% set mode = 'dashboard' %}
+{% block content %}
+            <div class="flex-1 max-w-6xl h-full overflow-y-auto space-y-8 z-10">
+                <div><h2 class="text-3xl font-bold text-white mb-2">Welcome back.</h2><p class="text-gray-400">Here is an overview of your roleplay universe.</p></div>
+                <div class="grid grid-cols-1 md:grid-cols-5 gap-6">
+                    <div class="bg-slate-900 border border-slate-800 p-6 rounded-xl shadow-lg flex items-center gap-4"><div class="w-12 h-12 rounded-full bg-indigo-900/50 text-indigo-400 flex items-center justify-center text-xl"><i class="fas fa-book"></i></div><div><div class="text-2xl font-bold text-white">{{ stats.total_stories }}</div><div class="text-xs uppercase text-gray-500 font-bold tracking-wider">Stories</div></div></div>
+                    <div class="bg-slate-900 border border-slate-800 p-6 rounded-xl shadow-lg flex items-center gap-4"><div class="w-12 h-12 rounded-full bg-purple-900/50 text-purple-400 flex items-center justify-center text-xl"><i class="fas fa-users"></i></div><div><div class="text-2xl font-bold text-white">{{ stats.total_chars }}</div><div class="text-xs uppercase text-gray-500 font-bold tracking-wider">Characters</div></div></div>
+                    <div class="bg-slate-900 border border-slate-800 p-6 rounded-xl shadow-lg flex items-center gap-4"><div class="w-12 h-12 rounded-full bg-emerald-900/50 text-emerald-400 flex items-center justify-center text-xl"><i class="fas fa-layer-group"></i></div><div><div class="text-2xl font-bold text-white">{{ stats.total_campaigns }}</div><div class="text-xs uppercase text-gray-500 font-bold tracking-wider">Campaigns</div></div></div>
+                    <div class="bg-slate-900 border border-slate-800 p-6 rounded-xl shadow-lg flex items-center gap-4"><div class="w-12 h-12 rounded-full bg-amber-900/50 text-amber-400 flex items-center justify-center text-xl"><i class="fas fa-lightbulb"></i></div><div><div class="text-2xl font-bold text-white">{{ stats.total_prompts }}</div><div class="text-xs uppercase text-gray-500 font-bold tracking-wider">Prompts</div></div></div>
+                    <div class="bg-slate-900 border border-slate-800 p-6 rounded-xl shadow-lg flex items-center gap-4"><div class="w-12 h-12 rounded-full bg-sky-900/50 text-sky-400 flex items-center justify-center text-xl"><i class="fas fa-pen-nib"></i></div><div><div class="text-2xl font-bold text-white">{{ "{:,}".format(stats.total_words) }}</div><div class="text-xs uppercase text-gray-500 font-bold tracking-wider">Words</div></div></div>
+                </div>
+                <div class="grid grid-cols-1 lg:grid-cols-3 gap-8">
+                    <div class="lg:col-span-2">
+                        <div class="flex justify-between items-center mb-4"><h3 class="text-lg font-bold text-white">Recent Updates</h3><a href="/stories" class="text-xs text-indigo-400 hover:text-indigo-300">View All</a></div>
+                        <div class="bg-slate-900 border border-slate-800 rounded-xl overflow-hidden">
+                            {% for story in recent_stories %}
+                            <a href="/read/{{ story.path }}" class="flex items-center justify-between p-4 border-b border-slate-800 hover:bg-slate-800/50 transition last:border-0"><div class="flex items-center gap-4"><div class="w-8 h-8 rounded bg-slate-800 flex items-center justify-center text-gray-500"><i class="fas fa-file-alt"></i></div><div><div class="font-bold text-gray-200">{{ story.meta.display_title }}</div><div class="flex gap-2"><div class="text-yellow-500 text-xs flex">{% for i in range(story.meta.rating) %}<i class="fas fa-star"></i>{% endfor %}</div><div class="text-xs text-gray-500">{{ story.path }}</div></div></div></div><div class="text-xs text-gray-500">{{ story.stats.date }}</div></a>
+                            {% endfor %}
+                        </div>
+                    </div>
+                    <div>
+                        <h3 class="text-lg font-bold text-white mb-4">Quick Actions</h3>
+                        <div class="space-y-3">
+                            <button onclick="document.getElementById('importStoryModal').showModal()" class="w-full text-left p-4 bg-slate-900 border border-slate-800 rounded-xl hover:border-indigo-500 transition flex items-center gap-3"><div class="w-10 h-10 rounded-full bg-green-900/30 text-green-400 flex items-center justify-center"><i class="fas fa-plus"></i></div><div><div class="font-bold text-gray-200">Import Story</div><div class="text-xs text-gray-500">Upload .txt or Paste</div></div></button>
+                            <form action="/create_character_quick" method="post" class="block w-full"><div class="p-4 bg-slate-900 border border-slate-800 rounded-xl hover:border-purple-500 transition flex flex-col gap-2"><div class="flex items-center gap-3 text-purple-400 font-bold"><i class="fas fa-user-plus"></i> New Character</div><div class="flex gap-2"><input type="text" name="name" placeholder="Name" class="input-dark py-1 text-sm" required><button type="submit" class="bg-purple-600 hover:bg-purple-500 text-white px-3 rounded text-sm font-bold">Go</button></div></div></form>
+                        </div>
+                        {% if top_chars %}
+                        <h3 class="text-lg font-bold text-white mt-8 mb-4">Most Written</h3>
+                        <div class="bg-slate-900 border border-slate-800 rounded-xl overflow-hidden">{% for char, cid, counts in top_chars %}<a href="/character/{{ cid }}" class="flex items-center gap-3 p-3 border-b border-slate-800 hover:bg-slate-800/50 transition last:border-0"><div class="w-8 h-8 rounded-full bg-slate-800 overflow-hidden shrink-0">{% if char.avatar_file %}<img src="{{ thumb_url('avatars', char.avatar_file, 'xs') }}" class="w-full h-full object-cover">{% else %}<div class="w-full h-full flex items-center justify-center text-xs font-bold text-white/40">{{ char.name[:1] }}</div>{% endif %}</div><div class="flex-1 min-w-0"><div class="font-bold text-gray-200 truncate">{{ char.name }}</div><div class="text-xs text-gray-500">{{ "{:,}".format(counts.messages) }} messages</div></div><div class="text-sm text-sky-400 font-bold">{{ "{:,}".format(counts.words) }} <span class="text-[10px] uppercase text-gray-500">words</span></div></a>{% endfor %}</div>
+                        {% endif %}
+                        <h3 class="text-lg font-bold text-white mt-8 mb-4">Campaigns</h3>
+                        <div class="bg-slate-900 border border-slate-800 rounded-xl overflow-hidden">{% for camp, totals in campaign_stats %}<a href="/stories?campaign={{ camp | urlencode }}" class="flex items-center justify-between p-3 border-b border-slate-800 hover:bg-slate-800/50 transition last:border-0"><div><div class="font-bold text-gray-200">{{ camp }}</div><div class="text-xs text-gray-500">{{ totals.get('stories', 0) }} stories · {{ "{:,}".format(totals.get('messages', 0)) }} messages</div></div><div class="text-sm text-sky-400 font-bold">{{ "{:,}".format(totals.get('words', 0)) }} <span class="text-[10px] uppercase text-gray-500">words</span></div></a>{% endfor %}</div>
+                    </div>
+                </div>
+            </div>
+{% endblock %}
+"""
+
+PROMPTS_TEMPLATE_STRING = """{% extends "base.html" %}{% set mode = 'prompts_list' %}
+{% block header_actions %}
+        <button onclick="document.getElementById('createPromptModal').showModal()" class="bg-indigo-600 hover:bg-indigo-500 text-white px-3 py-1 rounded text-sm font-bold shadow-lg shadow-indigo-500/20"><i class="fas fa-plus mr-2"></i> New Prompt</button>
+        {% endblock %}
+{% block content %}
+            <div class="flex-1 max-w-6xl h-full overflow-y-auto z-10">
+                <div class="flex justify-between items-center mb-6"><h2 class="text-2xl font-bold text-white">Roleplay Prompts</h2></div>
+                <div class="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 gap-6">{% for pid, prompt in prompts.items() %}<div class="bg-slate-900 border border-slate-800 rounded-xl p-6 hover:border-indigo-500 transition flex flex-col h-[300px] relative group"><form action="/delete_prompt" method="post" class="absolute top-4 right-4 opacity-0 group-hover:opacity-100 transition" onsubmit="return confirm('Delete prompt?');"><input type="hidden" name="pid" value="{{ pid }}"><button class="text-gray-600 hover:text-red-500"><i class="fas fa-trash"></i></button></form><h3 class="text-lg font-bold text-indigo-400 mb-2 truncate">{{ prompt.title }}</h3><div class="flex flex-wrap gap-2 mb-4">{% for tag in prompt.tags %}<a href="/browse?tag={{ tag | urlencode }}" class="tag tag-purple hover:text-white">{{ tag }}</a>{% endfor %}</div><div class="flex-1 bg-slate-950/50 p-3 rounded text-sm text-gray-300 overflow-y-auto mb-4 font-serif leading-relaxed italic whitespace-pre-wrap">{{ prompt.content }}</div><div class="border-t border-slate-800 pt-3 flex items-center gap-2 overflow-x-auto"><span class="text-[10px] uppercase font-bold text-gray-600 shrink-0">Assigned:</span>{% if prompt.linked_chars %}{% for cid in prompt.linked_chars %}{% if all_chars.get(cid) %}<div class="w-6 h-6 rounded-full bg-slate-800 border border-slate-600 overflow-hidden shrink-0" title="{{ all_chars[cid].name }}">{% if all_chars[cid].avatar_file %}<img src="{{ thumb_url('avatars', all_chars[cid].avatar_file, 'xs') }}" class="w-full h-full object-cover">{% else %}<div class="w-full h-full flex items-center justify-center text-[8px]">{{ all_chars[cid].name[:1] }}</div>{% endif %}</div>{% endif %}{% endfor %}{% else %}<span class="text-[10px] text-gray-600 italic">None</span>{% endif %}</div></div>{% endfor %}</div>
+            </div>
+            <dialog id="createPromptModal" class="rounded-xl bg-slate-900 border border-slate-700 text-gray-200 w-[600px] backdrop:bg-black/80"><form action="/create_prompt" method="post" class="flex flex-col h-[80vh]"><div class="p-6 border-b border-slate-800"><h2 class="text-lg font-bold text-indigo-400">Create New Prompt</h2></div><div class="p-6 overflow-y-auto space-y-4 flex-1"><div><label class="text-xs font-bold text-gray-500 uppercase">Title</label><input type="text" name="title" class="input-dark mt-1" required></div><div><label class="text-xs font-bold text-gray-500 uppercase">Prompt Content</label><textarea name="content" rows="8" class="input-dark mt-1 font-serif text-sm" required></textarea></div><div><label class="text-xs font-bold text-gray-500 uppercase">Tags (comma separated)</label><input type="text" name="tags" class="input-dark mt-1" placeholder="e.g. Romance, Sci-Fi, Conflict"></div><div><label class="text-xs font-bold text-gray-500 uppercase block mb-2">Assign Characters</label><div class="grid grid-cols-2 gap-2 max-h-40 overflow-y-auto bg-slate-950 p-2 rounded border border-slate-800">{% for cid, char in all_chars.items() %}<label class="flex items-center gap-2 text-sm text-gray-300 hover:bg-slate-900 p-1 rounded cursor-pointer"><input type="checkbox" name="linked_chars" value="{{ cid }}" class="accent-indigo-500"><div class="w-5 h-5 rounded-full bg-slate-800 overflow-hidden">{% if char.avatar_file %}<img src="{{ thumb_url('avatars', char.avatar_file, 'xs') }}" class="w-full h-full object-cover">{% else %}<div class="w-full h-full flex items-center justify-center text-[8px]">{{ char.name[:1] }}</div>{% endif %}</div><span class="truncate">{{ char.name }}</span></label>{% endfor %}</div></div></div><div class="p-4 border-t border-slate-800 flex justify-end gap-2 bg-slate-900"><button type="button" onclick="this.closest('dialog').close()" class="text-gray-400 text-sm px-3 py-2">Cancel</button><button type="submit" class="bg-indigo-600 text-white px-4 py-2 rounded text-sm font-bold">Create Prompt</button></div></form></dialog>
+{% endblock %}
+"""
+
+CHAR_LIST_TEMPLATE_STRING = """{% extends "base.html" %}{% set mode = 'char_list' %}
+{% block content %}
+            <div class="flex-1 h-full overflow-y-auto z-10"><div class="flex justify-between items-center mb-6"><h2 class="text-2xl font-bold text-white">Character Database</h2><div class="flex gap-4 items-center"><a href="/export_characters" class="bg-slate-800 hover:bg-slate-700 text-gray-300 px-3 py-1 rounded text-sm border border-slate-700 font-medium"><i class="fas fa-file-archive mr-1"></i> Export All (ZIP)</a><form action="/import_character" method="post" enctype="multipart/form-data" class="flex gap-2"><label class="cursor-pointer bg-slate-800 hover:bg-slate-700 text-gray-300 px-3 py-1 rounded text-sm border border-slate-700 font-medium"><i class="fas fa-file-import mr-1"></i> Import Card (PNG)<input type="file" name="file" accept=".png" class="hidden" onchange="this.form.submit()"></label></form><form action="/create_character_quick" method="post" class="flex gap-2 border-l border-slate-700 pl-4"><input type="text" name="name" placeholder="New Character Name" class="input-dark py-1 px-3 w-64" required><button type="submit" class="bg-indigo-600 hover:bg-indigo-500 text-white px-4 py-1 rounded text-sm font-bold">Create</button></form></div></div><div class="grid grid-cols-2 md:grid-cols-4 lg:grid-cols-6 gap-6">{% for id, char in all_chars.items() %}<a href="/character/{{ id }}" class="block bg-slate-900 rounded-xl border border-slate-800 overflow-hidden hover:border-indigo-500 hover:shadow-lg transition group"><div class="aspect-square bg-slate-800 w-full relative">{% if char.get('avatar_file') %}<img src="{{ thumb_url('avatars', char.avatar_file, 'sm') }}" loading="lazy" class="w-full h-full object-cover">{% else %}<div class="w-full h-full flex items-center justify-center text-4xl font-bold text-white/20">{{ char.get('name', '?')[:1] }}</div>{% endif %}<div class="absolute bottom-0 left-0 right-0 bg-gradient-to-t from-black/90 to-transparent p-3 pt-8"><h3 class="font-bold text-white truncate">{{ char.get('name', 'Unknown') }}</h3></div></div></a>{% endfor %}</div></div>
+{% endblock %}
+"""
+
+CHAR_PROFILE_TEMPLATE_STRING = """{% extends "base.html" %}{% set mode = 'char_profile' %}
+{% block content %}
+            <div class="flex-1 h-full overflow-hidden flex gap-8 z-10">
+                <aside class="w-80 shrink-0 h-full overflow-y-auto space-y-6">
+                    <div class="bg-slate-900 rounded-xl border border-slate-800 p-6 flex flex-col items-center shadow-lg relative group">
+                        <button onclick='openEditModal({{ char | tojson }})' class="absolute top-2 right-2 text-gray-500 hover:text-indigo-400" title="Edit"><i class="fas fa-pencil-alt"></i></button>
+                        <form action="/delete_character" method="post" onsubmit="return confirm('Delete?');"><input type="hidden" name="char_id" value="{{ char_id }}"><button type="submit" class="absolute top-2 left-2 text-gray-600 hover:text-red-500 transition" title="Delete"><i class="fas fa-trash"></i></button></form>
+                        <a href="/export_character/{{ char_id }}" target="_blank" class="absolute bottom-2 right-2 text-gray-600 hover:text-blue-400 transition" title="Export Card"><i class="fas fa-address-card"></i></a>
+                        <div class="w-48 h-48 rounded-lg shadow-2xl border-2 border-slate-700 overflow-hidden mb-4 bg-slate-800">{% if char.get('avatar_file') %}<img src="{{ thumb_url('avatars', char.avatar_file, 'sm') }}" class="w-full h-full object-cover">{% else %}<div class="w-full h-full flex items-center justify-center text-6xl font-bold text-white/20">{{ char.get('name', '?')[:1] }}</div>{% endif %}</div>
+                        <h1 class="text-2xl font-bold text-white text-center">{{ char.get('name', 'Unknown') }}</h1>
+                        <div class="w-full mt-6 space-y-3">
+                            <div class="flex justify-between border-b border-slate-800 pb-1"><span class="text-xs uppercase text-gray-500 font-bold">Age</span><span class="text-sm text-gray-200">{{ char.attributes.get('Age', 'Unknown') }}</span></div>
+                            <div class="flex justify-between border-b border-slate-800 pb-1"><span class="text-xs uppercase text-gray-500 font-bold">Gender</span><span class="text-sm text-gray-200">{{ char.attributes.get('Gender', 'Unknown') }}</span></div>
+                            <div class="flex justify-between border-b border-slate-800 pb-1"><span class="text-xs uppercase text-gray-500 font-bold">Race</span><span class="text-sm text-gray-200">{{ char.attributes.get('Race', 'Unknown') }}</span></div>
+                            <div class="flex justify-between border-b border-slate-800 pb-1"><span class="text-xs uppercase text-gray-500 font-bold">Orientation</span><span class="text-sm text-gray-200">{{ char.attributes.get('Orientation', 'Unknown') }}</span></div>
+                            {% for key, val in char.attributes.items() %}{% if key not in ['Age', 'Gender', 'Race', 'Orientation'] %}<div class="flex justify-between border-b border-slate-800 pb-1"><span class="text-xs uppercase text-gray-500 font-bold truncate max-w-[100px]">{{ key }}</span><span class="text-sm text-gray-400 truncate">{{ val }}</span></div>{% endif %}{% endfor %}
+                        </div>
+                    </div>
+                    {% if stories %}
+                    <div class="bg-slate-900 rounded-xl border border-slate-800 p-4 shadow-lg">
+                        <h2 class="text-xs font-bold text-gray-500 uppercase tracking-widest mb-3 border-b border-slate-800 pb-2">Writing</h2>
+                        <div class="grid grid-cols-2 gap-3">{% for field, label in [('words', 'Words'), ('messages', 'Messages'), ('actions', 'Action Lines'), ('ooc', 'OOC Lines')] %}<div class="bg-slate-950/50 rounded p-2 text-center"><div class="text-lg font-bold text-white">{{ "{:,}".format(analytics.totals[field]) }}</div><div class="text-[10px] uppercase text-gray-500 font-bold">{{ label }}</div></div>{% endfor %}</div>
+                    </div>
+                    {% endif %}
+                    {% if played_by_list %}
+                    <div class="bg-slate-900 rounded-xl border border-slate-800 p-4 shadow-lg">
+                        <h2 class="text-xs font-bold text-gray-500 uppercase tracking-widest mb-3 border-b border-slate-800 pb-2">Played By</h2>
+                        <div class="flex flex-wrap gap-2">{% for player in played_by_list %}<span class="px-2 py-1 rounded bg-slate-800 border border-slate-700 text-xs text-indigo-300 font-mono">{{ player }}</span>{% endfor %}</div>
+                    </div>
+                    {% endif %}
+                </aside>
+                
+                <div class="flex-1 h-full overflow-y-auto space-y-4 pr-4">
+                    {% if assigned_prompts %}<section><h2 class="text-xl font-bold text-amber-400 mb-2 border-b border-slate-800 pb-2"><i class="fas fa-lightbulb mr-2"></i> Assigned Prompts</h2><div class="grid grid-cols-1 md:grid-cols-2 gap-4">{% for p in assigned_prompts %}<div class="bg-slate-900 border border-slate-800 p-4 rounded-lg hover:border-amber-500/50 transition"><h3 class="font-bold text-gray-200 mb-2">{{ p.title }}</h3><div class="text-xs text-gray-400 italic line-clamp-3 mb-2">{{ p.content }}</div><div class="flex flex-wrap gap-1">{% for tag in p.tags %}<span class="text-[10px] px-2 py-0.5 rounded bg-slate-800 text-gray-500 border border-slate-700">{{ tag }}</span>{% endfor %}</div></div>{% endfor %}</div></section>{% endif %}
+                    <section><h2 class="text-xl font-bold text-indigo-400 mb-2 border-b border-slate-800 pb-2">Biography</h2><div class="bg-slate-900/50 p-6 rounded-xl border border-slate-800 text-gray-300 leading-relaxed italic whitespace-pre-wrap">{{ char.description or "No biography." }}</div></section>
+                    <section><h2 class="text-xl font-bold text-indigo-400 mb-2 border-b border-slate-800 pb-2">Appears In</h2><div class="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 gap-4">{% for story_path in stories %}{% set counts = analytics.stories.get(story_path) %}<a href="/read/{{ story_path }}" class="block bg-slate-900 p-4 rounded-lg border border-slate-800 hover:border-indigo-500 transition"><i class="fas fa-file-alt text-indigo-500 mr-2"></i> {{ story_path }}{% if counts and counts.messages %}<div class="text-xs text-gray-500 mt-1">{{ "{:,}".format(counts.words) }} words · {{ "{:,}".format(counts.messages) }} messages</div>{% endif %}</a>{% endfor %}{% if not stories %}<p class="text-gray-500 text-sm">Not linked to any stories.</p>{% endif %}</div></section>
+                    <section><div class="flex justify-between items-center mb-2 border-b border-slate-800 pb-2"><h2 class="text-xl font-bold text-indigo-400">Gallery</h2><form action="/upload_gallery" method="post" enctype="multipart/form-data"><input type="hidden" name="char_id" value="{{ char_id }}"><label class="cursor-pointer bg-slate-800 hover:bg-slate-700 text-xs px-3 py-1 rounded border border-slate-700 text-gray-300"><i class="fas fa-upload mr-1"></i> Add Image<input type="file" name="image" class="hidden" onchange="this.form.submit()"></label></form></div><div class="grid grid-cols-2 md:grid-cols-3 lg:grid-cols-4 gap-4">{% for img in char.get('gallery', []) %}<div class="aspect-square rounded-lg overflow-hidden border border-slate-800 bg-black cursor-pointer hover:border-indigo-500 transition" onclick="window.open('/gallery/{{ img }}', '_blank')"><img src="{{ thumb_url('gallery', img, 'sm') }}" loading="lazy" class="w-full h-full object-cover"></div>{% endfor %}</div></section>
+                </div>
+            </div>
+{% endblock %}
+"""
+
+EDIT_STORY_TEMPLATE_STRING = """{% extends "base.html" %}{% set mode = 'edit_story' %}
+{% block content %}
+            <div class="flex-1 max-w-4xl h-full overflow-hidden flex flex-col z-10">
+                <div class="flex justify-between items-center mb-4"><h2 class="text-2xl font-bold text-white">Edit Story Content</h2><div class="flex gap-2"><a href="/read/{{ filename }}" class="text-gray-400 hover:text-white px-4 py-2 text-sm font-medium">Cancel</a><button form="editForm" type="submit" class="bg-indigo-600 hover:bg-indigo-500 text-white px-4 py-2 rounded text-sm font-bold shadow-lg shadow-indigo-500/20">Save Changes</button></div></div>
+                <form id="editForm" action="/save_story_text" method="post" class="flex-1 border border-slate-700 rounded-xl overflow-hidden shadow-2xl"><input type="hidden" name="path" value="{{ filename }}"><textarea name="content" class="w-full h-full bg-slate-950 text-gray-300 p-6 font-mono text-sm resize-none focus:outline-none leading-relaxed">{{ content }}</textarea></form>
+            </div>
+{% endblock %}
+"""
+
+SEARCH_TEMPLATE_STRING = """{% extends "base.html" %}{% set mode = 'search' %}
+{% block content %}
+            <div class="flex-1 max-w-4xl h-full overflow-y-auto z-10"><h2 class="text-2xl font-bold text-white mb-6">Search Results for "<span class="text-indigo-400">{{ query }}</span>"</h2><div class="space-y-4">{% for result in results %}<div class="bg-slate-900 border border-slate-800 rounded-xl p-6 hover:border-indigo-500 transition"><a href="/read/{{ result.path }}" class="block"><h3 class="font-bold text-lg text-indigo-400 mb-1"><i class="fas fa-file-alt mr-2"></i> {{ result.title }}</h3><div class="text-xs text-gray-500 mb-3">{{ result.path }}</div><div class="space-y-2">{% for match in result.matches %}<div class="text-sm text-gray-300 font-mono bg-slate-950 p-2 rounded border-l-2 border-indigo-500/50">...{{ match }}...</div>{% endfor %}</div></a></div>{% endfor %}{% if not results %}<div class="text-center text-gray-500 mt-20"><i class="fas fa-ghost text-4xl mb-4 opacity-50"></i><p>No results found.</p></div>{% endif %}</div></div>
+{% endblock %}
+"""
+
+STORIES_TEMPLATE_STRING = """{% extends "base.html" %}{% set mode = 'stories_list' %}
+{% block content %}
+            <aside class="w-64 shrink-0 bg-slate-900/50 rounded-xl border border-slate-800 p-4 h-full overflow-y-auto z-10">
+                <div class="flex justify-between items-center mb-4"><h2 class="text-xs font-bold text-gray-500 uppercase tracking-widest">Campaigns</h2><button onclick="document.getElementById('campaignModal').showModal()" class="text-xs text-indigo-400 hover:text-indigo-300"><i class="fas fa-plus"></i></button></div>
+                <nav class="space-y-1"><a href="/stories" class="block px-3 py-2 rounded text-sm {{ 'bg-indigo-900/50 text-indigo-200' if not active_campaign else 'text-gray-400 hover:bg-slate-800 hover:text-white' }}"><i class="fas fa-layer-group w-5"></i> All Stories</a>{% for camp in campaigns %}{% if camp != "Unsorted" %}<a href="/stories?campaign={{ camp | urlencode }}" class="block px-3 py-2 rounded text-sm {{ 'bg-indigo-900/50 text-indigo-200' if active_campaign == camp else 'text-gray-400 hover:bg-slate-800 hover:text-white' }}"><i class="fas fa-folder w-5 text-yellow-600"></i> {{ camp }}</a>{% endif %}{% endfor %}</nav>
+                <div class="mt-6 border-t border-slate-800 pt-4"><button onclick="document.getElementById('importStoryModal').showModal()" class="block w-full text-left px-3 py-2 rounded text-sm text-gray-400 hover:bg-slate-800 hover:text-white transition"><i class="fas fa-file-import w-5 text-green-500"></i> Import / Write</button></div>
+            </aside>
+            <div class="flex-1 h-full overflow-y-auto pr-2 z-10">
+                <form action="/stories" method="get" class="flex flex-wrap items-end gap-3 mb-6 bg-slate-900/50 border border-slate-800 rounded-xl p-3 text-sm">{% if active_campaign %}<input type="hidden" name="campaign" value="{{ active_campaign }}">{% endif %}{% if link_query.page_size %}<input type="hidden" name="page_size" value="{{ link_query.page_size }}">{% endif %}
+                    <label class="flex flex-col gap-1"><span class="text-[10px] uppercase font-bold text-gray-500">Sort</span><select name="sort" class="input-dark py-1">{% for field in sort_fields %}<option value="{{ field }}" {{ 'selected' if query.sort == field }}>{{ {'date': 'Last updated', 'title': 'Title', 'rating': 'Rating', 'messages': 'Messages'}[field] }}</option>{% endfor %}</select></label>
+                    <label class="flex flex-col gap-1"><span class="text-[10px] uppercase font-bold text-gray-500">Order</span><select name="order" class="input-dark py-1"><option value="desc" {{ 'selected' if query.order != 'asc' }}>Descending</option><option value="asc" {{ 'selected' if query.order == 'asc' }}>Ascending</option></select></label>
+                    <label class="flex flex-col gap-1"><span class="text-[10px] uppercase font-bold text-gray-500">Rating</span><select name="min_rating" class="input-dark py-1"><option value="0">Any</option>{% for i in range(1, 6) %}<option value="{{ i }}" {{ 'selected' if query.min_rating == i }}>{{ i }}+ stars</option>{% endfor %}</select></label>
+                    <label class="flex flex-col gap-1"><span class="text-[10px] uppercase font-bold text-gray-500">Tag</span><input type="text" name="tag" value="{{ query.tag }}" list="tagOptions" class="input-dark py-1 w-36" placeholder="Any"></label>
+                    <label class="flex flex-col gap-1"><span class="text-[10px] uppercase font-bold text-gray-500">Speaker</span><input type="text" name="speaker" value="{{ query.speaker }}" list="speakerOptions" class="input-dark py-1 w-36" placeholder="Anyone"></label>
+                    <label class="flex flex-col gap-1"><span class="text-[10px] uppercase font-bold text-gray-500">Format</span><select name="format" class="input-dark py-1"><option value="">Any</option>{% for fmt in format_types %}<option value="{{ fmt }}" {{ 'selected' if query.format == fmt }}>{{ {'star_rp': 'Star RP', 'markdown': 'Markdown', 'novel': 'Novel'}[fmt] }}</option>{% endfor %}</select></label>
+                    <button type="submit" class="bg-indigo-600 hover:bg-indigo-500 text-white px-4 py-1.5 rounded font-bold">Apply</button><a href="/stories{{ '?campaign=' ~ (active_campaign | urlencode) if active_campaign }}" class="text-gray-500 hover:text-gray-300 py-1.5">Reset</a>
+                    <datalist id="tagOptions">{% for name in facets.tags %}<option value="{{ name }}">{% endfor %}</datalist><datalist id="speakerOptions">{% for name in facets.speakers[:200] %}<option value="{{ name }}">{% endfor %}</datalist>
+                </form>
+                <div class="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 xl:grid-cols-4 gap-6">{% for item in stories %}<div class="bg-slate-900 rounded-xl border border-slate-800 shadow-lg hover:border-indigo-500/50 transition flex flex-col h-[280px] group relative"><button onclick='openStoryMetaModal({{ {'path': item.path, 'meta': item.meta} | tojson }})' class="absolute top-2 right-2 z-10 text-gray-500 hover:text-indigo-400 opacity-0 group-hover:opacity-100 transition p-2"><i class="fas fa-cog"></i></button><a href="/read/{{ item.path }}" class="flex-1 flex flex-col p-5"><div class="mb-3"><h3 class="font-bold text-lg text-gray-100 leading-tight line-clamp-1" title="{{ item.meta.display_title }}">{{ item.meta.display_title }}</h3><div class="text-[10px] text-gray-500 mt-1 flex gap-2"><span><i class="far fa-clock"></i> {{ item.stats.date }}</span><span><i class="far fa-comment-alt"></i> {{ item.stats.msg_count }}</span></div></div><div class="text-yellow-500 text-xs mb-1">{% for i in range(item.meta.rating) %}<i class="fas fa-star"></i>{% endfor %}</div><div class="flex-1 text-xs text-gray-400 italic line-clamp-4 leading-relaxed overflow-hidden">{{ item.meta.synopsis }}</div>{% if item.stats.top_characters %}<div class="mt-3 flex -space-x-2 overflow-hidden py-1">{% for char in item.stats.top_characters %}<div class="inline-block h-6 w-6 rounded-full ring-2 ring-slate-900 bg-indigo-500 flex items-center justify-center text-[8px] font-bold text-white">{{ char[:1] }}</div>{% endfor %}</div>{% endif %}</a><div class="p-3 border-t border-slate-800 bg-slate-950/30 rounded-b-xl flex gap-2 overflow-x-auto">{% if item.meta.tags %}{% for tag in item.meta.tags %}<a href="/browse?tag={{ tag | urlencode }}" class="tag tag-blue hover:text-white">{{ tag }}</a>{% endfor %}{% else %}<span class="tag tag-gray">No Tags</span>{% endif %}</div></div>{% endfor %}</div>
+                {% if not stories %}<div class="text-center text-gray-500 py-16"><i class="fas fa-book-open text-4xl mb-4 opacity-50"></i><p>No stories match.</p></div>{% endif %}
+                <div class="flex justify-between items-center mt-6 text-sm text-gray-500">{% if pages.current > 1 %}<a href="/stories?{{ dict(link_query, page=pages.current - 1) | urlencode }}" class="text-indigo-400 hover:text-indigo-300"><i class="fas fa-chevron-left mr-1"></i> Previous</a>{% else %}<span></span>{% endif %}<span>Page {{ pages.current }} of {{ pages.count }} · {{ pages.total }} stories</span>{% if pages.current < pages.count %}<a href="/stories?{{ dict(link_query, page=pages.current + 1) | urlencode }}" class="text-indigo-400 hover:text-indigo-300">Next <i class="fas fa-chevron-right ml-1"></i></a>{% else %}<span></span>{% endif %}</div>
+            </div>
+{% endblock %}
+"""
+
+READ_TEMPLATE_STRING = """{% extends "base.html" %}{% set mode = 'read' %}
+{% block header_actions %}
+        <div class="flex gap-2">
+            <a href="/edit_story/{{ filename }}" class="bg-slate-800 hover:bg-slate-700 text-gray-300 px-3 py-1 rounded text-sm border border-slate-700" title="Edit Raw Text"><i class="fas fa-edit"></i></a>
+            <button onclick="document.getElementById('bgModal').showModal()" class="bg-slate-800 hover:bg-slate-700 text-gray-300 px-3 py-1 rounded text-sm border border-slate-700" title="Change Background"><i class="fas fa-image"></i></button>
+            <button onclick="document.getElementById('castModal').showModal()" class="bg-slate-800 hover:bg-slate-700 text-gray-300 px-3 py-1 rounded text-sm border border-slate-700"><i class="fas fa-users-cog mr-2"></i> Manage Cast</button>
+        </div>
+        {% endblock %}
+{% block content %}
+            <aside class="w-80 hidden md:block shrink-0 sidebar-container space-y-6 z-10">
+                {% for char in characters %}
+                <div class="glass-panel rounded-xl overflow-hidden shadow-lg flex flex-col relative group">
+                    {% if char.id %}<a href="/character/{{ char.id }}" class="absolute top-2 left-2 z-10 bg-black/50 hover:bg-indigo-600 text-white p-2 rounded-full opacity-0 group-hover:opacity-100 transition"><i class="fas fa-external-link-alt text-xs"></i></a><button onclick='openEditModal({{ char | tojson }})' class="absolute top-2 right-2 z-10 bg-black/50 hover:bg-indigo-600 text-white p-2 rounded-full opacity-0 group-hover:opacity-100 transition"><i class="fas fa-pencil-alt text-xs"></i></button>{% else %}<div class="absolute top-2 right-2 z-10 bg-black/50 text-xs text-gray-400 px-2 py-1 rounded pointer-events-none">Unlinked</div>{% endif %}
+                    <div class="w-full flex justify-center pt-4 pb-2 bg-slate-800/50">{% if char.avatar_url %}<img src="{{ char.avatar_url }}" class="w-[200px] h-[200px] object-cover rounded shadow-md border border-gray-700">{% else %}<div class="w-[200px] h-[200px] flex items-center justify-center font-bold text-white shadow-md rounded border border-gray-700 text-6xl select-none" style="background-color: {{ char.color }};">{{ char.display_name[:1] }}</div>{% endif %}</div>
+                    <div class="p-4 border-t border-gray-800 bg-gray-900/90">
+                        <h3 class="font-bold text-lg text-gray-100 truncate text-center mb-3">{{ char.display_name }}</h3>
+                        <div class="grid grid-cols-2 gap-2 text-xs text-gray-400 mb-3 bg-slate-950/50 p-2 rounded"><div><span class="block text-[9px] uppercase font-bold text-gray-600">Age</span>{{ char.attributes.get('Age', '-') }}</div><div><span class="block text-[9px] uppercase font-bold text-gray-600">Gender</span>{{ char.attributes.get('Gender', '-') }}</div><div><span class="block text-[9px] uppercase font-bold text-gray-600">Race</span>{{ char.attributes.get('Race', '-') }}</div><div><span class="block text-[9px] uppercase font-bold text-gray-600">Orient.</span>{{ char.attributes.get('Orientation', '-') }}</div></div>
+                        {% if char.id %}
+                        <form action="/set_story_player" method="post" class="mt-2 pt-2 border-t border-gray-800">
+                            <input type="hidden" name="filename" value="{{ filename }}">
+                            <input type="hidden" name="char_id" value="{{ char.id }}">
+                            <div class="flex items-center gap-1">
+                                <label class="text-[9px] uppercase font-bold text-gray-600 shrink-0">Played By</label>
+                                <input type="text" name="player_name" value="{{ player_map.get(char.id, '') }}" class="bg-transparent text-xs text-indigo-300 border-b border-gray-700 w-full focus:outline-none focus:border-indigo-500 ml-1" placeholder="Username" onchange="this.form.submit()">
+                            </div>
+                        </form>
+                        {% endif %}
+                    </div>
+                </div>
+                {% endfor %}
+            </aside>
+            <div id="readScroll" class="flex-1 max-w-4xl h-full overflow-y-auto pr-2 z-10"><div class="glass-panel rounded-xl shadow-2xl p-8 min-h-full">{% if window and window.start > 0 %}<a href="/read/{{ filename }}?start={{ [window.start - window.size, 0] | max }}" class="block text-center text-xs text-indigo-400 hover:text-indigo-300 mb-6"><i class="fas fa-arrow-up mr-1"></i> Show earlier blocks</a>{% endif %}<div id="blockList" class="space-y-6">{% include "read_blocks.html" %}</div>{% if window and window.end < window.total %}<div id="blockSentinel" data-next="{{ window.end }}" data-total="{{ window.total }}" data-size="{{ window.size }}" class="py-6 text-center text-gray-600 text-xs"><i class="fas fa-spinner fa-spin mr-2"></i> Loading more...</div>{% endif %}<div id="endOfFile" class="mt-20 pt-10 border-t border-gray-800 text-center text-gray-600 text-sm {{ 'hidden' if window and window.end < window.total else '' }}">End of File</div></div></div><div class="w-10 hidden xl:block shrink-0"></div>
+            <dialog id="castModal" class="rounded-xl shadow-2xl bg-slate-900 border border-slate-700 text-gray-200 w-[600px] backdrop:bg-black/80"><div class="p-6 border-b border-slate-800 flex justify-between items-center"><h2 class="text-lg font-bold text-indigo-400">Manage Cast</h2><button onclick="document.getElementById('castModal').close()" class="text-gray-500 hover:text-white"><i class="fas fa-times"></i></button></div><div class="p-6 max-h-[70vh] overflow-y-auto"><table class="w-full text-left text-sm"><thead class="text-xs text-gray-500 uppercase border-b border-slate-700"><tr><th class="py-2">Name in Story</th><th class="py-2">Database Character</th></tr></thead><tbody class="divide-y divide-slate-800">{% for char in characters %}<tr><td class="py-3 font-bold text-gray-300">{{ char.raw_name }}</td><td class="py-3"><form action="/link_character" method="POST" class="flex gap-2"><input type="hidden" name="filename" value="{{ filename }}"><input type="hidden" name="raw_name" value="{{ char.raw_name }}"><select name="char_id" class="input-dark text-xs py-1"><option value="">-- Unlinked --</option><option value="NEW">➕ Create New</option>{% for db_id, db_data in all_db_chars.items() %}<option value="{{ db_id }}" {% if char.id == db_id %}selected{% endif %}>{{ db_data.get('name', 'Unknown') }}</option>{% endfor %}</select><button type="submit" class="bg-indigo-900 hover:bg-indigo-700 text-indigo-200 px-2 rounded text-xs">Save</button></form></td></tr>{% endfor %}</tbody></table></div></dialog>
+            <dialog id="bgModal" class="rounded-xl bg-slate-900 border border-slate-700 text-gray-200 w-96 backdrop:bg-black/80"><form action="/upload_story_background" method="post" enctype="multipart/form-data" class="p-6"><h2 class="text-lg font-bold text-indigo-400 mb-4">Change Story Background</h2><input type="hidden" name="return_path" value="{{ filename }}"><input type="file" name="file" accept="image/*" class="block w-full text-sm text-gray-400 file:mr-4 file:py-2 file:px-4 file:rounded-full file:border-0 file:text-xs file:font-semibold file:bg-indigo-900 file:text-indigo-300 hover:file:bg-indigo-800 cursor-pointer mb-4 bg-slate-950 rounded border border-slate-700 p-1"/><div class="flex justify-end gap-2"><button type="button" onclick="this.closest('dialog').close()" class="text-gray-400 text-sm px-3 py-2">Cancel</button><button type="submit" class="bg-indigo-600 text-white px-4 py-2 rounded text-sm font-bold">Upload</button></div></form></dialog>
+{% endblock %}
+"""
+
+BROWSE_TEMPLATE_STRING = """{% extends "base.html" %}{% set mode = 'browse' %}
+{% block content %}
+            <aside class="w-64 shrink-0 bg-slate-900/50 rounded-xl border border-slate-800 p-4 h-full overflow-y-auto z-10">
+                <h2 class="text-xs font-bold text-gray-500 uppercase tracking-widest mb-4">Tags</h2>
+                <nav class="space-y-1">{% for facet in tag_facets %}<a href="/browse{{ '?' ~ (facet.params | urlencode) if facet.params }}" class="flex justify-between items-center px-3 py-1.5 rounded text-sm {{ 'bg-indigo-900/50 text-indigo-200' if facet.selected else 'text-gray-400 hover:bg-slate-800 hover:text-white' }}"><span class="truncate"><i class="{{ 'fas fa-check-square' if facet.selected else 'far fa-square' }} w-5"></i> {{ facet.label }}</span><span class="text-[10px] text-gray-500 shrink-0" title="stories · prompts">{{ facet.stories }}{% if facet.prompts %} · {{ facet.prompts }}{% endif %}</span></a>{% else %}<p class="text-xs text-gray-600 italic px-3">No tags yet.</p>{% endfor %}</nav>
+                <h2 class="text-xs font-bold text-gray-500 uppercase tracking-widest mt-6 mb-4 border-t border-slate-800 pt-4">Campaigns</h2>
+                <nav class="space-y-1">{% for facet in campaign_facets %}<a href="/browse{{ '?' ~ (facet.params | urlencode) if facet.params }}" class="flex justify-between items-center px-3 py-1.5 rounded text-sm {{ 'bg-indigo-900/50 text-indigo-200' if facet.selected else 'text-gray-400 hover:bg-slate-800 hover:text-white' }}"><span class="truncate"><i class="{{ 'fas fa-check-square' if facet.selected else 'fas fa-folder text-yellow-600' }} w-5"></i> {{ facet.label }}</span><span class="text-[10px] text-gray-500 shrink-0">{{ facet.stories }}</span></a>{% endfor %}</nav>
+            </aside>
+            <div class="flex-1 h-full overflow-y-auto pr-2 z-10">
+                <div class="flex flex-wrap items-center gap-2 mb-6"><h2 class="text-2xl font-bold text-white mr-2">Browse</h2>{% for facet in tag_facets if facet.selected %}<a href="/browse{{ '?' ~ (facet.params | urlencode) if facet.params }}" class="tag tag-blue hover:text-white">{{ facet.label }} <i class="fas fa-times ml-1"></i></a>{% endfor %}{% for facet in campaign_facets if facet.selected %}<a href="/browse{{ '?' ~ (facet.params | urlencode) if facet.params }}" class="tag tag-gray hover:text-white"><i class="fas fa-folder mr-1"></i>{{ facet.label }} <i class="fas fa-times ml-1"></i></a>{% endfor %}{% if tags or campaigns %}<a href="/browse" class="text-xs text-gray-500 hover:text-gray-300 ml-2">Clear</a>{% endif %}</div>
+                <div class="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 xl:grid-cols-4 gap-6">{% for item in stories %}<a href="/read/{{ item.path }}" class="bg-slate-900 rounded-xl border border-slate-800 shadow-lg hover:border-indigo-500/50 transition flex flex-col h-[220px] p-5"><h3 class="font-bold text-lg text-gray-100 leading-tight line-clamp-1" title="{{ item.meta.display_title }}">{{ item.meta.display_title }}</h3><div class="text-[10px] text-gray-500 mt-1 mb-3 flex gap-2"><span><i class="far fa-clock"></i> {{ item.stats.date }}</span><span><i class="far fa-comment-alt"></i> {{ item.stats.msg_count }}</span></div><div class="flex-1 text-xs text-gray-400 italic line-clamp-4 leading-relaxed overflow-hidden">{{ item.meta.synopsis }}</div><div class="mt-3 flex gap-2 overflow-x-auto">{% for tag in item.meta.tags %}<span class="tag tag-blue">{{ tag }}</span>{% endfor %}</div></a>{% endfor %}</div>
+                {% if not stories %}<div class="text-center text-gray-500 py-16"><i class="fas fa-tags text-4xl mb-4 opacity-50"></i><p>No stories match.</p></div>{% endif %}
+                <div class="flex justify-between items-center mt-6 text-sm text-gray-500">{% if pages.current > 1 %}<a href="/browse{{ '?' ~ (prev_params | urlencode) if prev_params }}" class="text-indigo-400 hover:text-indigo-300"><i class="fas fa-chevron-left mr-1"></i> Previous</a>{% else %}<span></span>{% endif %}<span>Page {{ pages.current }} of {{ pages.count }} · {{ pages.total }} stories</span>{% if pages.current < pages.count %}<a href="/browse?{{ next_params | urlencode }}" class="text-indigo-400 hover:text-indigo-300">Next <i class="fas fa-chevron-right ml-1"></i></a>{% else %}<span></span>{% endif %}</div>
+                {% if tags %}<h2 class="text-lg font-bold text-white mt-10 mb-4">Prompts <span class="text-sm text-gray-500">{{ prompts | length }}</span></h2>
+                <div class="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 gap-6">{% for pid, prompt in prompts.items() %}<div class="bg-slate-900 border border-slate-800 rounded-xl p-5 flex flex-col max-h-[220px]"><h3 class="text-lg font-bold text-indigo-400 mb-2 truncate">{{ prompt.title }}</h3><div class="flex flex-wrap gap-2 mb-3">{% for tag in prompt.tags %}<span class="tag tag-purple">{{ tag }}</span>{% endfor %}</div><div class="flex-1 text-sm text-gray-300 overflow-y-auto font-serif italic whitespace-pre-wrap">{{ prompt.content }}</div></div>{% else %}<p class="text-sm text-gray-600 italic">No prompts carry every selected tag.</p>{% endfor %}</div>{% endif %}
+            </div>
+{% endblock %}
+"""
+
+JOBS_TEMPLATE_STRING = """{% extends "base.html" %}{% set mode = 'jobs' %}
+{% block content %}
+            <div class="flex-1 max-w-6xl h-full overflow-y-auto z-10">
+                <div class="flex justify-between items-center mb-6"><h2 class="text-2xl font-bold text-white">Background Jobs</h2><a href="/jobs{{ '?status=' + status_filter if status_filter else '' }}" class="text-xs text-indigo-400 hover:text-indigo-300"><i class="fas fa-sync-alt mr-1"></i> Refresh</a></div>
+                <div class="flex gap-2 mb-6 text-sm"><a href="/jobs" class="px-3 py-1 rounded-full border {{ 'bg-indigo-900/50 border-indigo-500 text-indigo-200' if not status_filter else 'border-slate-700 text-gray-400 hover:text-white' }}">All</a>{% for status, count in counts.items() %}<a href="/jobs?status={{ status }}" class="px-3 py-1 rounded-full border {{ 'bg-indigo-900/50 border-indigo-500 text-indigo-200' if status_filter == status else 'border-slate-700 text-gray-400 hover:text-white' }}">{{ status | capitalize }} <span class="text-xs text-gray-500">{{ count }}</span></a>{% endfor %}</div>
+                <div class="bg-slate-900 border border-slate-800 rounded-xl overflow-hidden"><table class="w-full text-sm"><thead class="bg-slate-950/50 text-[10px] uppercase text-gray-500 tracking-wider"><tr><th class="text-left p-3">#</th><th class="text-left p-3">Job</th><th class="text-left p-3">Status</th><th class="text-left p-3">Priority</th><th class="text-left p-3">Attempts</th><th class="text-left p-3">Details</th><th class="p-3"></th></tr></thead><tbody>{% for job in jobs %}<tr class="border-t border-slate-800 align-top"><td class="p-3 text-gray-500">{{ job.id }}</td><td class="p-3"><div class="font-bold text-gray-200">{{ job.kind }}</div><div class="text-[10px] text-gray-500 font-mono truncate max-w-xs">{% for key, value in job.payload.items() %}{{ key }}={{ value }} {% endfor %}</div></td><td class="p-3"><span class="tag {{ {'queued': 'tag-gray', 'running': 'tag-blue', 'done': 'tag-green', 'failed': 'tag-red'}.get(job.status, 'tag-gray') }}">{{ job.status }}</span></td><td class="p-3 text-gray-400">{{ job.priority }}</td><td class="p-3 text-gray-400">{{ job.attempts }}/{{ job.max_attempts }}</td><td class="p-3 text-xs text-gray-400">{% if job.progress %}{% set p = job.progress %}<div>{{ p.status }}{% if p.total %} · {{ p.processed }}/{{ p.total }}{% elif p.extracted %} · {{ p.extracted }} extracted{% endif %}{% if p.imported %} · {{ p.imported }} imported{% endif %}</div>{% endif %}{% if job.error %}<div class="text-red-400 font-mono break-all">{{ job.error }}</div>{% endif %}{% if job.status == 'queued' and job.run_after > now %}<div>retry in {{ (job.run_after - now) | round | int }}s</div>{% endif %}</td><td class="p-3 text-right">{% if job.status == 'failed' %}<form action="/retry_job" method="post"><input type="hidden" name="job_id" value="{{ job.id }}"><button class="text-xs text-indigo-400 hover:text-indigo-300"><i class="fas fa-redo mr-1"></i> Retry</button></form>{% endif %}</td></tr>{% endfor %}</tbody></table>{% if not jobs %}<div class="text-center text-gray-500 py-16"><i class="fas fa-check-circle text-4xl mb-4 opacity-50"></i><p>No jobs.</p></div>{% endif %}</div>
+            </div>
+{% endblock %}
+"""
+
+# Template name -> source, for the jinja Environment in main.py
+TEMPLATES = {
+    "base.html": BASE_TEMPLATE_STRING,
+    "read_blocks.html": READ_BLOCKS_TEMPLATE_STRING,
+    "dashboard.html": DASHBOARD_TEMPLATE_STRING,
+    "prompts_list.html": PROMPTS_TEMPLATE_STRING,
+    "char_list.html": CHAR_LIST_TEMPLATE_STRING,
+    "char_profile.html": CHAR_PROFILE_TEMPLATE_STRING,
+    "edit_story.html": EDIT_STORY_TEMPLATE_STRING,
+    "search.html": SEARCH_TEMPLATE_STRING,
+    "stories_list.html": STORIES_TEMPLATE_STRING,
+    "browse.html": BROWSE_TEMPLATE_STRING,
+    "read.html": READ_TEMPLATE_STRING,
+    "jobs.html": JOBS_TEMPLATE_STRING,
+}
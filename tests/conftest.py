@@ -0,0 +1,20 @@
+"""
+Every module keeps its data next to itself (BASE_DIR), so the tests import
+a copy of the app's modules from a temporary folder: data/, stories/ and
+the upload folders are all created there and the checkout is never touched.
+"""
+import os
+import sys
+import shutil
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_DIR = tempfile.mkdtemp(prefix="storybox-tests-")
+
+for name in os.listdir(ROOT):
+    if name.endswith(".py"): shutil.copy2(os.path.join(ROOT, name), APP_DIR)
+sys.path.insert(0, APP_DIR)
+os.environ["STORYBOX_WATCH"] = "off"
+
+def pytest_unconfigure(config):
+    shutil.rmtree(APP_DIR, ignore_errors=True)
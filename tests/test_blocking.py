@@ -0,0 +1,39 @@
+import time
+
+import anyio
+import httpx
+import pytest
+
+import main
+import story_manager
+
+SEARCH_SECONDS = 1.0
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+@pytest.mark.anyio
+async def test_slow_search_does_not_delay_characters(monkeypatch):
+    def slow_search(query):
+        time.sleep(SEARCH_SECONDS)
+        return []
+    monkeypatch.setattr(story_manager, "search_stories", slow_search)
+
+    finished = {}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        start = time.perf_counter()
+
+        async def fetch(name, url):
+            response = await client.get(url)
+            assert response.status_code == 200
+            finished[name] = time.perf_counter() - start
+
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(fetch, "search", "/search?q=slow")
+            await anyio.sleep(0.05)  # the search is already running on a worker thread
+            tg.start_soon(fetch, "characters", "/characters")
+
+    assert finished["search"] >= SEARCH_SECONDS
+    assert finished["characters"] < SEARCH_SECONDS / 2
@@ -0,0 +1,87 @@
+import io
+import os
+import tarfile
+import zipfile
+
+import bulk_import
+import search_index
+import stats_cache
+import story_manager
+
+def make_zip(path, entries):
+    with zipfile.ZipFile(path, "w") as zf:
+        for name, text in entries.items(): zf.writestr(name, text)
+    return str(path)
+
+def make_tar(path, entries):
+    with tarfile.open(path, "w:gz") as tf:
+        for name, text in entries.items():
+            data = text.encode()
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tf.addfile(info, io.BytesIO(data))
+    return str(path)
+
+def extract(archive_path, campaign, campaign_map=None):
+    report = bulk_import._new_report(os.path.basename(archive_path))
+    written = []
+    try: stories = bulk_import._extract(archive_path, campaign_map or {}, campaign, report, written)
+    finally: bulk_import.story_watcher.release(written)
+    return stories, report
+
+def test_entries_cannot_escape_the_stories_folder(tmp_path):
+    archive = make_zip(tmp_path / "evil.zip", {
+        "../../escaped.txt": "Alice: out",
+        "/absolute.txt": "Alice: out",
+        "Logs/../../../dotdot.txt": "Alice: out",
+        "..\\windows.txt": "Alice: out",
+    })
+    stories, report = extract(archive, "Traversal")
+    # ".." parts count as hidden, so only the absolute path is kept, inside the campaign
+    assert stories == [(os.path.join("Traversal", "absolute.txt"), "absolute")]
+    assert sorted(entry["path"] for entry in report["skipped"]) == ["../../escaped.txt", "..\\windows.txt", "Logs/../../../dotdot.txt"]
+    for name in ("escaped.txt", "dotdot.txt", "windows.txt", "absolute.txt"):
+        assert not os.path.exists(os.path.join(os.path.dirname(story_manager.STORY_DIR), name))
+        assert not os.path.exists(tmp_path / name)
+
+def test_hidden_and_other_entries_are_skipped(tmp_path):
+    archive = make_tar(tmp_path / "mixed.tar.gz", {
+        "log.txt": "Alice: hi",
+        ".hidden.txt": "x",
+        "__MACOSX/._log.txt": "x",
+        "Logs/.git/notes.txt": "x",
+        "cover.png": "x",
+    })
+    stories, report = extract(archive, "Hidden")
+    assert [title for _, title in stories] == ["log"]
+    assert {entry["path"]: entry["reason"] for entry in report["skipped"]} == {
+        ".hidden.txt": "hidden file",
+        "__MACOSX/._log.txt": "hidden file",
+        "Logs/.git/notes.txt": "hidden file",
+        "cover.png": "not a .txt or .json file",
+    }
+
+def test_same_names_get_unique_files(tmp_path):
+    story_manager.create_campaign("Dedupe")
+    existing = os.path.join(story_manager.STORY_DIR, "Dedupe", "log.txt")
+    with open(existing, "w", encoding="utf-8") as f: f.write("already here")
+    archive = make_zip(tmp_path / "dupes.zip", {"a/log.txt": "one", "b/log.txt": "two", "c/log.json": "three"})
+    stories, _ = extract(archive, "Dedupe")
+    assert [p for p, _ in stories] == [os.path.join("Dedupe", name) for name in ("log_1.txt", "log_2.txt", "log_3.txt")]
+    with open(existing, encoding="utf-8") as f: assert f.read() == "already here"
+
+def test_folders_map_to_campaigns(tmp_path):
+    archive = make_zip(tmp_path / "mapped.zip", {"Logs/one.txt": "x", "Logs/old/two.txt": "x", "three.txt": "x"})
+    campaign_map = bulk_import.parse_campaign_map("Logs = Mapped A\nLogs/old/ = Mapped B\nbroken line")
+    stories, _ = extract(archive, "Mapped C", campaign_map)
+    assert sorted(p for p, _ in stories) == sorted(os.path.join(c, n) for c, n in
+                                                   [("Mapped A", "one.txt"), ("Mapped B", "two.txt"), ("Mapped C", "three.txt")])
+
+def test_run_import_indexes_what_it_imports(tmp_path):
+    archive = make_zip(tmp_path / "full.zip", {"quest.txt": "Alice: the zebra waves\nBob: hello\n", "notes.md": "x"})
+    report = bulk_import.run_import(archive, default_campaign="Full Import", workers=1)
+    assert (report["status"], report["imported"], len(report["skipped"])) == ("done", 1, 1)
+    rel_path = os.path.join("Full Import", "quest.txt")
+    assert stats_cache.get_msg_counts_many([rel_path])[rel_path] == 2
+    assert rel_path in search_index.find_candidates("zebra")
+    assert story_manager.get_story_meta(rel_path)["display_title"] == "quest"
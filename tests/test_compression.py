@@ -0,0 +1,109 @@
+import gzip
+from collections import OrderedDict
+
+import anyio
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import HTMLResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+import compression
+
+PAGE = "<p>" + "story text " * 500 + "</p>"
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    monkeypatch.setattr(compression, "_cache", OrderedDict())
+    monkeypatch.setattr(compression, "_cache_bytes", 0)
+
+def page(request):
+    if request.headers.get("if-none-match") == '"v1"': return Response(status_code=304, headers={"ETag": '"v1"'})
+    return HTMLResponse(PAGE, headers={"ETag": '"v1"'})
+
+async def chunks():
+    for _ in range(3):
+        yield PAGE
+        await anyio.sleep(0)
+
+app = compression.CompressionMiddleware(Starlette(routes=[
+    Route("/page", page),
+    Route("/small", lambda request: HTMLResponse("<p>hi</p>")),
+    Route("/stream", lambda request: StreamingResponse(chunks(), media_type="text/html")),
+    Route("/image", lambda request: Response(b"\x89PNG" * 1000, media_type="image/png")),
+]))
+
+async def get(path, **headers):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        return await client.get(path, headers=headers)
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip", "gzip"),
+    ("gzip, deflate, br", "br"),
+    ("br;q=0.5, gzip", "gzip"),
+    ("GZIP", "gzip"),
+    ("*", "br"),
+    ("*, br;q=0", "zstd"),
+    ("gzip;q=0", None),
+    ("gzip;q=oops", None),
+    ("identity", None),
+    ("", None),
+])
+def test_choose_encoding(monkeypatch, header, expected):
+    monkeypatch.setattr(compression, "ENCODERS", OrderedDict.fromkeys(["br", "zstd", "gzip"]))
+    assert compression.choose_encoding(header) == expected
+
+@pytest.mark.anyio
+async def test_pages_are_compressed_with_their_own_etag():
+    response = await get("/page", **{"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"] == '"v1-gzip"'
+    assert "accept-encoding" in response.headers["vary"].lower()
+    assert response.text == PAGE
+
+    plain = await get("/page", **{"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert plain.headers["etag"] == '"v1"'
+
+@pytest.mark.anyio
+async def test_revalidating_a_compressed_copy():
+    response = await get("/page", **{"Accept-Encoding": "gzip", "If-None-Match": '"v1-gzip"'})
+    assert response.status_code == 304
+    assert response.headers["etag"] == '"v1-gzip"'
+
+@pytest.mark.anyio
+async def test_small_and_binary_responses_are_left_alone():
+    for path in ("/small", "/image"):
+        response = await get(path, **{"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in response.headers, path
+
+@pytest.mark.anyio
+async def test_streamed_responses_are_compressed_as_they_go():
+    response = await get("/stream", **{"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert response.text == PAGE * 3
+
+@pytest.mark.anyio
+async def test_encoded_bodies_are_cached_by_etag():
+    await get("/page", **{"Accept-Encoding": "gzip"})
+    cached = compression.cached_response('"v1"', "gzip, deflate")
+    assert cached.headers["etag"] == '"v1-gzip"'
+    assert cached.headers["content-encoding"] == "gzip"
+    assert gzip.decompress(cached.body).decode() == PAGE
+    assert compression.cached_response('"v1"', "identity") is None
+    assert compression.cached_response('"v2"', "gzip") is None
+
+def test_cache_evicts_the_least_recently_used(monkeypatch):
+    monkeypatch.setattr(compression, "CACHE_MAX_BYTES", 250)
+    monkeypatch.setattr(compression, "CACHE_MAX_ENTRY_BYTES", 150)
+    for tag in ("a", "b"): compression._cache_store(tag, "gzip", {}, b"x" * 100)
+    assert compression.cached_response("a", "gzip")
+    compression._cache_store("c", "gzip", {}, b"x" * 100)
+    compression._cache_store("too big", "gzip", {}, b"x" * 200)
+    assert [key[0] for key in compression._cache] == ["a", "c"]
+    assert compression._cache_bytes == 200
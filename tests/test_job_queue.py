@@ -0,0 +1,99 @@
+import pytest
+
+import job_queue
+
+@pytest.fixture(autouse=True)
+def queue(tmp_path, monkeypatch):
+    monkeypatch.setattr(job_queue, "JOBS_DB_FILE", str(tmp_path / "jobs.db"))
+    monkeypatch.setattr(job_queue, "_backend", None)
+    monkeypatch.setattr(job_queue, "_handlers", {})
+    monkeypatch.setattr(job_queue, "RETRY_DELAY_SECONDS", 0)
+
+def run_next():
+    """Claims and runs one job on this thread; returns its id, or None if nothing is due."""
+    job = job_queue._claim()
+    if job: job_queue._run(*job)
+    return job[0] if job else None
+
+def flaky(failures):
+    calls = []
+    def handler(**payload):
+        calls.append(payload)
+        if len(calls) <= failures: raise RuntimeError(f"failure {len(calls)}")
+    return handler, calls
+
+def test_queued_jobs_are_deduplicated():
+    job_queue.register("test.job", lambda **payload: None)
+    first = job_queue.enqueue("test.job", {"n": 1}, dedupe_key="same")
+    assert job_queue.enqueue("test.job", {"n": 2}, dedupe_key="same") == first
+    job_queue.enqueue_many("test.job", [({"n": 3}, "same"), ({"n": 4}, "other")])
+    assert job_queue.counts()["queued"] == 2
+
+    # Once it runs, the same work can be queued again
+    job_queue._claim()
+    assert job_queue.enqueue("test.job", {"n": 5}, dedupe_key="same") != first
+
+def test_failed_jobs_are_retried_until_they_succeed():
+    handler, calls = flaky(2)
+    job_queue.register("test.job", handler)
+    job_id = job_queue.enqueue("test.job", {"n": 1})
+
+    run_next()
+    job = job_queue.get_job(job_id)
+    assert (job["status"], job["attempts"], job["error"]) == ("queued", 1, "RuntimeError: failure 1")
+    run_next()
+    run_next()
+    job = job_queue.get_job(job_id)
+    assert (job["status"], job["attempts"]) == ("done", 3)
+    assert calls == [{"n": 1}] * 3
+
+def test_retries_wait_longer_each_time(monkeypatch):
+    monkeypatch.setattr(job_queue, "RETRY_DELAY_SECONDS", 60)
+    job_queue.register("test.job", flaky(5)[0])
+    job_id = job_queue.enqueue("test.job")
+    run_next()
+    assert run_next() is None
+    job = job_queue.get_job(job_id)
+    assert job["run_after"] - job["started_at"] >= 59
+
+def test_jobs_fail_after_max_attempts_and_can_be_retried():
+    handler, calls = flaky(3)
+    job_queue.register("test.job", handler)
+    job_id = job_queue.enqueue("test.job", dedupe_key="key", max_attempts=2)
+    run_next()
+    run_next()
+    assert job_queue.get_job(job_id)["status"] == "failed"
+    assert run_next() is None
+
+    assert job_queue.retry(job_id)
+    assert job_queue.get_job(job_id)["attempts"] == 0
+    run_next()
+    run_next()
+    assert job_queue.get_job(job_id)["status"] == "done"
+    assert len(calls) == 4
+    assert not job_queue.retry(job_id)
+
+def test_retry_gives_way_to_an_identical_queued_job():
+    job_queue.register("test.job", flaky(5)[0])
+    job_id = job_queue.enqueue("test.job", dedupe_key="key", max_attempts=1)
+    run_next()
+    job_queue.enqueue("test.job", dedupe_key="key")
+    assert not job_queue.retry(job_id)
+
+def test_failing_run_gives_way_to_the_same_work_queued_meanwhile():
+    job_queue.register("test.job", flaky(5)[0])
+    job_id = job_queue.enqueue("test.job", dedupe_key="key")
+    claimed = job_queue._claim()
+    queued_id = job_queue.enqueue("test.job", dedupe_key="key")
+    job_queue._run(*claimed)
+    job = job_queue.get_job(job_id)
+    assert job["status"] == "failed" and job["error"].endswith("(superseded)")
+    assert job_queue.get_job(queued_id)["status"] == "queued"
+
+def test_interrupted_jobs_run_again_after_a_restart():
+    job_queue.register("test.job", lambda **payload: None)
+    job_id = job_queue.enqueue("test.job")
+    job_queue._claim()
+    job_queue._recover()
+    assert job_queue.get_job(job_id)["status"] == "queued"
+    assert run_next() == job_id
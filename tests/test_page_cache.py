@@ -0,0 +1,36 @@
+import re
+
+import anyio
+import httpx
+import pytest
+
+import main
+import stats_cache
+import story_manager
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+def message_count(html, title):
+    match = re.search(re.escape(f'title="{title}"') + r'.*?fa-comment-alt"></i> (\d+)<', html, re.S)
+    return int(match.group(1))
+
+@pytest.mark.anyio
+async def test_stories_page_changes_when_stats_are_recomputed():
+    rel_path = story_manager.save_story_from_text("ETag Probe", "Alice: hi\nBob: hello\n")
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        first = await client.get("/stories")
+        assert message_count(first.text, "ETag_Probe") == 2
+
+        # Until its refresh job has run the edited story shows its old stats
+        await anyio.to_thread.run_sync(story_manager.overwrite_story_content, rel_path, "Alice: hi\nBob: hello\nAlice: bye\nBob: bye\n")
+        stale = await client.get("/stories", headers={"If-None-Match": first.headers["etag"]})
+        assert stale.status_code == 200
+        assert message_count(stale.text, "ETag_Probe") == 2
+
+        await anyio.to_thread.run_sync(stats_cache.refresh, rel_path)
+        fresh = await client.get("/stories", headers={"If-None-Match": stale.headers["etag"]})
+        assert fresh.status_code == 200
+        assert message_count(fresh.text, "ETag_Probe") == 4
@@ -0,0 +1,74 @@
+import io
+import zlib
+import struct
+
+import pytest
+
+import png_chunks
+
+def chunk(chunk_type, data, crc=None):
+    if crc is None: crc = zlib.crc32(chunk_type + data)
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", crc)
+
+def png(*chunks, width=1, height=1):
+    ihdr = chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+    idat = chunk(b"IDAT", zlib.compress(b"\0\0\0\0\0"))
+    return io.BytesIO(png_chunks.PNG_SIGNATURE + ihdr + b"".join(chunks) + idat + chunk(b"IEND", b""))
+
+def itxt(keyword, text, compressed=False):
+    body = zlib.compress(text.encode()) if compressed else text.encode()
+    return chunk(b"iTXt", keyword + b"\0" + (b"\1\0" if compressed else b"\0\0") + b"en\0\0" + body)
+
+def test_reads_every_kind_of_text_chunk():
+    f = png(chunk(b"tEXt", b"chara\0first"),
+            chunk(b"zTXt", b"comment\0\0" + zlib.compress(b"squeezed")),
+            itxt(b"title", "café"),
+            itxt(b"chara", "last wins", compressed=True))
+    assert png_chunks.read_text_chunks(f) == {"chara": "last wins", "comment": "squeezed", "title": "café"}
+
+def test_no_text_chunks():
+    assert png_chunks.read_text_chunks(png()) == {}
+
+@pytest.mark.parametrize("data, message", [
+    (b"", "Not a PNG"),
+    (b"GIF89a" + b"\0" * 20, "Not a PNG"),
+    (png_chunks.PNG_SIGNATURE, "Truncated"),
+    (png_chunks.PNG_SIGNATURE + chunk(b"IHDR", b"\0" * 13)[:-6], "Truncated"),
+    (png_chunks.PNG_SIGNATURE + chunk(b"tEXt", b"a\0b") + chunk(b"IEND", b""), "no IHDR"),
+    (png_chunks.PNG_SIGNATURE + chunk(b"IHDR", b"\0" * 12) + chunk(b"IEND", b""), "no IHDR"),
+])
+def test_malformed_files_raise_value_error(data, message):
+    with pytest.raises(ValueError, match=message): png_chunks.read_text_chunks(io.BytesIO(data))
+
+def test_missing_iend_is_truncated():
+    data = png(chunk(b"tEXt", b"a\0b")).getvalue()[:-12]
+    with pytest.raises(ValueError, match="Truncated"): png_chunks.read_text_chunks(io.BytesIO(data))
+
+def test_chunk_longer_than_the_file():
+    data = png().getvalue()
+    lying = data[:33] + struct.pack(">I", 1 << 30) + b"tEXt" + data[41:]
+    with pytest.raises(ValueError, match="Truncated"): png_chunks.read_text_chunks(io.BytesIO(lying))
+
+def test_bad_crc():
+    with pytest.raises(ValueError, match="Corrupt"): png_chunks.read_text_chunks(png(chunk(b"tEXt", b"a\0b", crc=0)))
+
+def test_corrupt_compressed_text():
+    with pytest.raises(ValueError, match="Corrupt"): png_chunks.read_text_chunks(png(chunk(b"zTXt", b"a\0\0not zlib")))
+
+def test_invalid_utf8_in_itxt():
+    with pytest.raises(ValueError): png_chunks.read_text_chunks(png(chunk(b"iTXt", b"a\0\0\0\0\0\xff\xfe")))
+
+def test_dimension_bomb():
+    with pytest.raises(ValueError, match="dimensions"): png_chunks.read_text_chunks(png(width=100000, height=100000))
+
+def test_decompression_bomb(monkeypatch):
+    monkeypatch.setattr(png_chunks, "MAX_TEXT_BYTES", 1024)
+    bomb = chunk(b"zTXt", b"a\0\0" + zlib.compress(b"\0" * 1025))
+    with pytest.raises(ValueError, match="too large"): png_chunks.read_text_chunks(png(bomb))
+    with pytest.raises(ValueError, match="too large"): png_chunks.read_text_chunks(png(itxt(b"a", "x" * 1025, compressed=True)))
+
+def test_oversized_chunks_and_files(monkeypatch):
+    monkeypatch.setattr(png_chunks, "MAX_TEXT_BYTES", 1024)
+    with pytest.raises(ValueError, match="too large"): png_chunks.read_text_chunks(png(chunk(b"tEXt", b"a\0" + b"x" * 1100)))
+    monkeypatch.setattr(png_chunks, "MAX_FILE_BYTES", 64)
+    with pytest.raises(ValueError, match="too large"): png_chunks.read_text_chunks(png())
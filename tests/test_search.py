@@ -0,0 +1,30 @@
+import os
+
+import story_manager
+
+STORIES = {
+    "search_cr.txt": "Alice: the fox jumps\r\rBob: a lazy dog\rThe fox sleeps\r",
+    "search_crlf.txt": "﻿Alice: hello fox\r\nBob: hello dog\r\n\r\nThe end",
+    "search_mixed.txt": "Fox one\rfox two\r\nfox three\nfox four\n\rdog",
+}
+QUERIES = ["fox", "dog", "hello", "the fox", "fox sleeps", "ox", "a lazy", "end", "bob:", "fox\n"]
+
+def linear_search(query):
+    """search_stories() as it was before the index: every line of every story, read in text mode."""
+    results = []
+    for rel_path in story_manager.get_all_stories_flat():
+        matches = []
+        with open(os.path.join(story_manager.STORY_DIR, rel_path), 'r', encoding='utf-8', errors='ignore') as f:
+            for line in f:
+                if query in line.lower():
+                    matches.append(story_manager._format_match(line, query))
+                    if len(matches) >= 3: break
+        if matches: results.append((rel_path, matches))
+    return results
+
+def test_index_splits_lines_like_text_mode():
+    for name, text in STORIES.items():
+        with open(os.path.join(story_manager.STORY_DIR, name), "w", encoding="utf-8", newline="") as f: f.write(text)
+    for query in QUERIES:
+        found = [(result["path"], result["matches"]) for result in story_manager.search_stories(query)]
+        assert found == linear_search(query), query
@@ -0,0 +1,73 @@
+import story_parser
+
+STORY = """﻿Alice: *waves* "Hi there"
+She keeps talking.
+((OOC: brb, coffee))
+((brb))
+  [Bob → Alice]: hello
+The tavern is quiet.
+Note: the door creaks
+((Bob: sorry, lag))
+Bob: *sits*
+"""
+
+def baseline_stats(filepath):
+    """msg_count and top_characters as get_file_stats() has always counted them."""
+    stats = {}
+    with open(filepath, "r", encoding="utf-8-sig", errors="ignore") as f:
+        for line in f:
+            line = line.strip()
+            if not line: continue
+            name, _ = story_parser.extract_speaker(line)
+            if name: stats[name] = stats.get(name, 0) + 1
+    return sum(stats.values()), sorted(stats.keys(), key=lambda n: stats[n], reverse=True)[:3]
+
+def test_file_stats_keep_baseline_counts(tmp_path):
+    path = tmp_path / "story.txt"
+    path.write_text(STORY, encoding="utf-8")
+    speakers = {}
+    stats = story_parser.get_file_stats(str(path), speakers)
+
+    msg_count, top_characters = baseline_stats(str(path))
+    # OOC lines with a colon are still messages of whatever precedes it
+    assert msg_count == 6
+    assert stats["msg_count"] == msg_count
+    assert stats["top_characters"] == top_characters
+
+    # while the per speaker tally files them as OOC lines
+    assert "((OOC" not in speakers
+    assert speakers["Alice"] == {"messages": 1, "words": 6, "actions": 0, "ooc": 0}
+    assert speakers["Bob"] == {"messages": 2, "words": 6, "actions": 1, "ooc": 1}
+    assert speakers[""]["ooc"] == 2
+    assert speakers["Note"]["messages"] == 1
+
+def test_stats_stored_by_another_process_are_kept(tmp_path, monkeypatch):
+    import storage
+    import stats_cache
+    monkeypatch.setattr(stats_cache, "STORY_DIR", str(tmp_path))
+    monkeypatch.setattr(stats_cache, "STATS_DB_FILE", str(tmp_path / "stats.db"))
+    for name in ("_cache", "_campaigns", "_rows"): monkeypatch.setattr(stats_cache, name, None)
+
+    (tmp_path / "a.txt").write_text(STORY, encoding="utf-8")
+    (tmp_path / "b.txt").write_text(STORY, encoding="utf-8")
+    assert stats_cache.get_stats("a.txt")["msg_count"] == 6
+
+    # bulk_import run from the command line, with its own connection
+    other = storage.SqliteDocumentStore(storage.SqliteBackend(str(tmp_path / "stats.db"), stats_cache.SCHEMA), "story_stats", "path")
+    stats = dict(stats_cache._empty_stats(), msg_count=99)
+    other.put("b.txt", stats_cache._entry(stats_cache._stat("b.txt"), stats, {}))
+
+    def no_parsing(*args): raise AssertionError("b.txt was parsed again")
+    monkeypatch.setattr(story_parser, "get_file_stats", no_parsing)
+    assert stats_cache.get_stats("b.txt")["msg_count"] == 99
+
+    # and the server's own writes leave that row alone
+    stats_cache.remove_story("a.txt")
+    assert list(other.all()) == ["b.txt"]
+
+def test_tally_counts_words_and_blank_names_like_lines():
+    speakers = story_parser.tally_speakers("Bob: one　two\n[ ]: three\n *four* \n((Al: x))\n  five six  \n", {})
+    # "[ ]:" is no speaker, so its whole line stays part of Bob's turn
+    assert speakers["Bob"] == {"messages": 1, "words": 6, "actions": 1, "ooc": 0}
+    assert speakers["Al"]["ooc"] == 1
+    assert speakers[""]["words"] == 2
@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+import storage
+
+@pytest.fixture
+def backend(tmp_path):
+    return storage.SqliteBackend(str(tmp_path / "test.db"))
+
+@pytest.fixture(params=["sqlite", "json"])
+def documents(request, tmp_path, backend):
+    if request.param == "json": return storage.JsonDocumentStore(str(tmp_path / "docs.json"))
+    return storage._make_store(backend, "story_meta")
+
+@pytest.fixture(params=["sqlite", "json"])
+def mappings(request, tmp_path, backend):
+    if request.param == "json": return storage.JsonMappingStore(str(tmp_path / "map.json"))
+    return storage._make_store(backend, "story_map")
+
+def test_document_store_operations(documents):
+    documents.put("a", {"rating": 1})
+    documents.put_many({"b": {"rating": 2}, "c": {"rating": 3}})
+    assert documents.get("a") == {"rating": 1}
+    assert documents.get("missing") is None
+    assert documents.get_many(["a", "c", "missing"]) == {"a": {"rating": 1}, "c": {"rating": 3}}
+
+    documents.rename("b", "d")
+    documents.delete("a")
+    assert documents.all() == {"c": {"rating": 3}, "d": {"rating": 2}}
+
+    documents.replace_all({"x": {}})
+    assert documents.all() == {"x": {}}
+
+def test_edits_keep_the_listing_order(documents):
+    documents.put_many({"a": {"n": 1}, "b": {"n": 2}, "c": {"n": 3}})
+    documents.put("a", {"n": 10})
+    documents.put_many({"b": {"n": 20}})
+    assert list(documents.all()) == ["a", "b", "c"]
+    assert documents.get("a") == {"n": 10}
+
+def test_mapping_store_operations(mappings):
+    mappings.put("one.txt", {"Alice": "c1", "Bob": "c2"})
+    mappings.set_entry("two.txt", "Alice", "c1")
+    mappings.set_entry("one.txt", "Alice", "c3")
+    assert mappings.get("one.txt") == {"Alice": "c3", "Bob": "c2"}
+    assert list(mappings.get("one.txt")) == ["Alice", "Bob"]
+    assert mappings.get("missing") == {}
+    assert mappings.keys_with_value("c1") == ["two.txt"]
+    assert mappings.values_for_subkey("Alice") == {"c1", "c3"}
+
+    mappings.rename("two.txt", "three.txt")
+    mappings.delete_value("c2")
+    assert mappings.all() == {"one.txt": {"Alice": "c3"}, "three.txt": {"Alice": "c1"}}
+
+    mappings.delete_subkey("Alice")
+    assert mappings.get("one.txt") == mappings.get("three.txt") == {}
+
+def test_json_files_migrate_once(tmp_path, monkeypatch, backend):
+    monkeypatch.setattr(storage, "DATA_DIR", str(tmp_path))
+    (tmp_path / "stories_meta.json").write_text(json.dumps({"a.txt": {"rating": 4}, "b.txt": {}}))
+    (tmp_path / "story_map.json").write_text(json.dumps({"a.txt": {"Alice": "c1"}, "bad.txt": "not a mapping"}))
+    (tmp_path / "prompts.json").write_text("{not json")
+
+    assert storage.migrate_json_to_sqlite(backend)
+    assert storage._make_store(backend, "story_meta").all() == {"a.txt": {"rating": 4}, "b.txt": {}}
+    assert storage._make_store(backend, "story_map").all() == {"a.txt": {"Alice": "c1"}}
+    assert storage._make_store(backend, "prompts").all() == {}
+
+    # Later edits to the JSON files are not copied again unless forced
+    (tmp_path / "stories_meta.json").write_text(json.dumps({"c.txt": {}}))
+    assert not storage.migrate_json_to_sqlite(backend)
+    assert list(storage._make_store(backend, "story_meta").all()) == ["a.txt", "b.txt"]
+    assert storage.migrate_json_to_sqlite(backend, force=True)
+    assert list(storage._make_store(backend, "story_meta").all()) == ["c.txt"]
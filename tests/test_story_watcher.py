@@ -0,0 +1,85 @@
+import os
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import story_watcher
+
+@pytest.fixture
+def stories(tmp_path, monkeypatch):
+    """A stories folder the watcher has snapshotted; yields the list its handler was called with."""
+    (tmp_path / "Camp").mkdir()
+    (tmp_path / "a.txt").write_text("one")
+    (tmp_path / "Camp" / "b.txt").write_text("two")
+    calls = []
+    monkeypatch.setattr(story_watcher, "STORY_DIR", str(tmp_path))
+    monkeypatch.setattr(story_watcher, "_owned", {})
+    monkeypatch.setattr(story_watcher, "_handler", lambda *changes: calls.append(changes))
+    monkeypatch.setattr(story_watcher, "_tree", story_watcher._scan_all())
+    return tmp_path, calls
+
+def test_changes_are_reported(stories):
+    root, calls = stories
+    (root / "new.txt").write_text("new")
+    (root / "a.txt").write_text("changed")
+    (root / "Camp" / "b.txt").unlink()
+    (root / "notes.md").write_text("not a story")
+    story_watcher._rescan()
+    assert calls == [(["new.txt"], ["a.txt"], [os.path.join("Camp", "b.txt")], [])]
+
+    story_watcher._rescan()
+    assert len(calls) == 1
+
+def test_renames_are_reported_as_moves(stories):
+    root, calls = stories
+    os.rename(root / "a.txt", root / "Camp" / "c.txt")
+    story_watcher._rescan()
+    assert calls == [([], [], [], [("a.txt", os.path.join("Camp", "c.txt"))])]
+
+def test_rescan_of_some_folders(stories):
+    root, calls = stories
+    (root / "a.txt").write_text("changed")
+    (root / "Camp" / "b.txt").write_text("changed")
+    story_watcher._rescan({"Camp"})
+    assert calls == [([], [os.path.join("Camp", "b.txt")], [], [])]
+
+    # New campaign folders turn up with the root
+    (root / "Camp2").mkdir()
+    (root / "Camp2" / "d.txt").write_text("new")
+    story_watcher._rescan({""})
+    assert calls[1] == ([os.path.join("Camp2", "d.txt")], ["a.txt"], [], [])
+
+def test_changes_made_by_the_app_are_not_reported(stories):
+    root, calls = stories
+    version = story_watcher.version()
+    with story_watcher.owned("a.txt", "mine.txt"):
+        (root / "a.txt").write_text("written by the app")
+        (root / "mine.txt").write_text("created by the app")
+        story_watcher._rescan()
+    story_watcher._rescan()
+    assert calls == []
+    assert "mine.txt" in story_watcher.snapshot()[""]
+    assert story_watcher.version() > version
+
+def test_events_mark_their_folder(stories, monkeypatch):
+    root, _ = stories
+    monkeypatch.setattr(story_watcher, "_dirty", set())
+    handler = story_watcher._EventHandler()
+    for event_type, path in [("modified", "Camp/b.txt"), ("created", "top.txt"), ("opened", "Camp2/x.txt"),
+                             ("modified", "Camp/deep/x.txt"), ("modified", "../outside.txt")]:
+        handler.on_any_event(SimpleNamespace(event_type=event_type, src_path=os.path.join(str(root), path)))
+    assert story_watcher._dirty == {"Camp", ""}
+
+def test_polling_picks_up_changes(tmp_path, monkeypatch):
+    monkeypatch.setattr(story_watcher, "STORY_DIR", str(tmp_path))
+    monkeypatch.setattr(story_watcher, "POLL_SECONDS", 0.05)
+    calls = []
+    assert story_watcher.start(lambda *changes: calls.append(changes), "poll") == "poll"
+    try:
+        (tmp_path / "late.txt").write_text("hello")
+        deadline = time.time() + 5
+        while not calls and time.time() < deadline: time.sleep(0.05)
+    finally: story_watcher.stop()
+    assert calls == [(["late.txt"], [], [], [])]
+    assert not story_watcher.is_running()
@@ -0,0 +1,62 @@
+import pytest
+
+import storage
+import tag_index
+import story_manager
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """A fresh story_meta collection behind the "stories" kind."""
+    store = storage.SqliteDocumentStore(storage.SqliteBackend(str(tmp_path / "tags.db")), "story_meta", "path")
+    store.put_many({
+        "a.txt": {"tags": ["Fantasy", "Drama"]},
+        "b.txt": {"tags": ["fantasy ", "Horror"]},
+        "c.txt": {"tags": []},
+        "d.txt": {},
+    })
+    monkeypatch.setattr(storage, "get_store", lambda name: store)
+    for table in ("_index", "_labels", "_tags_of"): monkeypatch.setattr(tag_index, table, {})
+    return store
+
+def test_built_from_the_store_ignoring_case(store):
+    assert tag_index.ids_with_all("stories", ["FANTASY"]) == {"a.txt", "b.txt"}
+    assert tag_index.ids_with_all("stories", ["fantasy", "horror"]) == {"b.txt"}
+    assert tag_index.ids_with_all("stories", ["fantasy", "missing"]) == set()
+    assert tag_index.ids_with_all("stories", []) == set()
+    # Shown as first written, most used first, then by name
+    assert tag_index.counts("stories") == [("Fantasy", 2), ("Drama", 1), ("Horror", 1)]
+
+def test_counts_within_some_ids(store):
+    assert tag_index.counts("stories", within={"b.txt", "c.txt"}) == [("Fantasy", 1), ("Horror", 1)]
+    assert tag_index.counts("stories", within=set()) == []
+
+def test_updates(store):
+    tag_index.set_tags("stories", "c.txt", ["Horror", " ", "horror"])
+    tag_index.set_tags("stories", "a.txt", ["Comedy"])
+    assert tag_index.counts("stories") == [("Horror", 2), ("Comedy", 1), ("Fantasy", 1)]
+
+    tag_index.rename("stories", "b.txt", "e.txt")
+    assert tag_index.ids_with_all("stories", ["horror"]) == {"c.txt", "e.txt"}
+    tag_index.remove("stories", "e.txt")
+    tag_index.set_tags_many("stories", {"c.txt": [], "f.txt": ["fantasy"]})
+    # A tag nobody carries any more is forgotten, so its new spelling wins
+    assert tag_index.counts("stories") == [("Comedy", 1), ("fantasy", 1)]
+
+def test_reset_rebuilds_from_the_store(store):
+    assert tag_index.ids_with_all("stories", ["drama"]) == {"a.txt"}
+    store.put("c.txt", {"tags": ["Drama"]})
+    assert tag_index.ids_with_all("stories", ["drama"]) == {"a.txt"}
+    tag_index.reset("stories")
+    assert tag_index.ids_with_all("stories", ["drama"]) == {"a.txt", "c.txt"}
+
+def test_story_manager_keeps_the_index_current():
+    rel_path = story_manager.save_story_from_text("Tag Probe", "Alice: hi\n")
+    story_manager.update_story_meta(rel_path, "Tag Probe", "", ["Probe Tag"])
+    assert rel_path in tag_index.ids_with_all("stories", ["probe tag"])
+    assert rel_path in story_manager.browse_stories(["Probe Tag"])["stories"]
+
+    story_manager.create_campaign("Tag Camp")
+    moved = story_manager.move_story_to_campaign(rel_path, "Tag Camp")
+    assert tag_index.ids_with_all("stories", ["probe tag"]) == {moved}
+    story_manager.update_story_meta(moved, "Tag Probe", "", [])
+    assert tag_index.ids_with_all("stories", ["probe tag"]) == set()